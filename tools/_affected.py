@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+"""Affected-test selection: which shards and test files a git diff touches.
+
+Changed paths (git diff against a ref, plus untracked files) are mapped to
+shards (see _shards.py) in three ways:
+  - root-level config files (package.json, lockfiles, tsconfig*, vite/vitest
+    configs) invalidate everything;
+  - source files are followed through the import graph of .ts/.tsx/.js/.mjs
+    sources (relative imports, and imports of other workspaces by package
+    name) to the test files that depend on them;
+  - anything else inside a workspace (its package.json, configs) selects the
+    whole workspace shard, and anything else outside the workspaces selects
+    the whole root shard.
+Root tests that reference a workspace by path or name (build/setup checks)
+also run when that workspace changes, and a workspace whose tests the root
+suite runs (no shard of its own) selects those root tests. Test files with a current coverage
+record (see _impact.py) are selected by the files they actually executed
+instead of by the import graph, which is only built while some test has no
+record.
+"""
+import fnmatch
+import posixpath
+import re
+from pathlib import Path
+
+from _utils import ProjectContext, TREE_EXCLUDES, run
+from _shards import ROOT_SHARD, discover_shards
+import _impact
+
+
+ROOT_CONFIGS = (
+    "package.json",
+    "package-lock.json",
+    "npm-shrinkwrap.json",
+    "yarn.lock",
+    "pnpm-lock.yaml",
+    "pnpm-workspace.yaml",
+    "tsconfig*.json",
+    "vite.config.*",
+    "vitest.config.*",
+    "vitest.workspace.*",
+    "jest.config.*",
+    "babel.config.*",
+    ".npmrc",
+    ".nvmrc",
+)
+# Paths no test can observe
+INERT_SUFFIXES = (".md", ".txt")
+SOURCE_SUFFIXES = (".ts", ".tsx", ".mts", ".cts", ".js", ".jsx", ".mjs", ".cjs")
+_TEST_FILE_RE = re.compile(r"(\.(test|spec)\.[cm]?[jt]sx?$)|(^|/)__tests__/")
+_IMPORT_RE = re.compile(
+    r"""(?:\bfrom\s*|\bimport\s*\(\s*|\brequire\s*\(\s*|\bimport\s+)['"]([^'"\n]+)['"]"""
+)
+
+# path -> ((mtime_ns, size), specifiers)
+_import_cache: dict[str, tuple[tuple, list[str]]] = {}
+
+
+def is_test_file(rel: str) -> bool:
+    return bool(_TEST_FILE_RE.search(rel))
+
+
+def _git_lines(root: Path, args: list[str]) -> list[str] | None:
+    code, out, _ = run(["git", *args], cwd=root)
+    if code != 0:
+        return None
+    return [line for line in out.splitlines() if line]
+
+
+def _excluded(rel: str) -> bool:
+    return any(part in TREE_EXCLUDES for part in rel.split("/"))
+
+
+def changed_paths(root: Path, since: str | None = None) -> list[str] | None:
+    """Root-relative paths changed since `since` (default HEAD) plus untracked files; None if git can't tell."""
+    diff = _git_lines(root, ["diff", "--name-only", "--no-renames", since or "HEAD", "--"])
+    untracked = _git_lines(root, ["ls-files", "--others", "--exclude-standard"])
+    if diff is None or untracked is None:
+        return None
+    return sorted({p for p in diff + untracked if not _excluded(p)})
+
+
+def _imports(path: Path) -> list[str]:
+    try:
+        st = path.stat()
+    except OSError:
+        return []
+    stamp = (st.st_mtime_ns, st.st_size)
+    key = str(path)
+    hit = _import_cache.get(key)
+    if hit and hit[0] == stamp:
+        return hit[1]
+    try:
+        specs = _IMPORT_RE.findall(path.read_text(encoding="utf-8", errors="replace"))
+    except OSError:
+        specs = []
+    _import_cache[key] = (stamp, specs)
+    return specs
+
+
+def _resolve(spec: str, importer: str, files: set[str]) -> str | None:
+    base = posixpath.normpath(posixpath.join(posixpath.dirname(importer), spec))
+    stem, ext = posixpath.splitext(base)
+    candidates = [base]
+    # TS ESM imports name the emitted .js file
+    if ext in (".js", ".jsx", ".mjs", ".cjs"):
+        candidates += [stem + s for s in (".ts", ".tsx", ".mts", ".cts")]
+    candidates += [base + s for s in SOURCE_SUFFIXES]
+    candidates += [f"{base}/index{s}" for s in SOURCE_SUFFIXES]
+    return next((c for c in candidates if c in files), None)
+
+
+def _owner(ctx: ProjectContext, rel: str) -> dict | None:
+    return ctx.workspace_for(Path(rel))
+
+
+def build_reverse_graph(root: Path, files: set[str]) -> dict[str, set[str]]:
+    """node -> importers; "pkg:<name>" nodes link a workspace's files to importers of the package."""
+    ctx = ProjectContext.get(root)
+    names = sorted((ws["name"] for ws in ctx.workspaces), key=len, reverse=True)
+    rdeps: dict[str, set[str]] = {}
+    for rel in files:
+        if not rel.endswith(SOURCE_SUFFIXES):
+            continue
+        ws = _owner(ctx, rel)
+        if ws is not None:
+            rdeps.setdefault(rel, set()).add(f"pkg:{ws['name']}")
+        for spec in _imports(root / rel):
+            if spec.startswith("."):
+                target = _resolve(spec, rel, files)
+            else:
+                name = next((n for n in names if spec == n or spec.startswith(n + "/")), None)
+                target = f"pkg:{name}" if name else None
+            if target is not None:
+                rdeps.setdefault(target, set()).add(rel)
+    return rdeps
+
+
+def _dependents(seeds: set[str], rdeps: dict[str, set[str]]) -> set[str]:
+    seen = set(seeds)
+    stack = list(seeds)
+    while stack:
+        for importer in rdeps.get(stack.pop(), ()):
+            if importer not in seen:
+                seen.add(importer)
+                stack.append(importer)
+    return seen
+
+
+def _references(text: str, ws: dict) -> bool:
+    # path.join(root, 'packages', 'api') reads as packages/api once the joins are collapsed
+    joined = re.sub(r"""['"]\s*,\s*['"]""", "/", text)
+    return ws["rel"] in joined or ws["name"] in text
+
+
+def select(root: Path, since: str | None = None, scripts: tuple[str, ...] | None = None) -> dict:
+    """Affected shards for the working tree's changes since `since` (default HEAD); see select_paths()."""
+    return select_paths(root, changed_paths(root, since), scripts, since=since or "HEAD")
+
+
+def select_paths(root: Path, paths: list[str] | None, scripts: tuple[str, ...] | None = None, since: str | None = None) -> dict:
+    """Affected shards for the given changed root-relative paths.
+
+    Returns {"since", "changed": [paths] | None, "full": bool, "shards": {name: [test files] | None}}
+    where None means the whole shard and file lists are relative to the shard's cwd. Shards
+    missing from "shards" are unaffected. If the changes aren't known (paths is None), every
+    shard runs.
+    """
+    ctx = ProjectContext.get(root)
+    shards = {s["name"]: s for s in discover_shards(root, scripts)}
+    plan = {"since": since, "changed": paths, "full": False, "shards": {}, "impact": None}
+
+    def everything() -> dict:
+        plan["full"] = True
+        plan["shards"] = {name: None for name in shards}
+        return plan
+
+    if paths is None:
+        return everything()
+    whole: set[str] = set()
+    seeds: set[str] = set()
+    touched: dict[str, dict] = {}
+    for rel in paths:
+        if rel.endswith(INERT_SUFFIXES):
+            continue
+        ws = _owner(ctx, rel)
+        if not (root / rel).exists():
+            # Importers of a deleted file can't be found by resolving imports
+            whole.add(ws["name"] if ws else ROOT_SHARD)
+        if ws is None:
+            if "/" not in rel and any(fnmatch.fnmatch(rel, pat) for pat in ROOT_CONFIGS):
+                return everything()
+            if rel.endswith(SOURCE_SUFFIXES) and "/" in rel:
+                seeds.add(rel)
+            else:
+                whole.add(ROOT_SHARD)
+            continue
+        touched[ws["name"]] = ws
+        seeds.add(rel)
+        inner = rel[len(ws["rel"]) + 1:]
+        if "/" not in inner or not rel.endswith(SOURCE_SUFFIXES):
+            whole.add(ws["name"])
+            seeds.add(f"pkg:{ws['name']}")
+
+    files = set(_git_lines(root, ["ls-files", "--cached", "--others", "--exclude-standard"]) or ())
+    files = {f for f in files if not _excluded(f) and (root / f).is_file()}
+    # Tests with a valid coverage record are selected by what they executed, the rest through the import graph
+    known = _impact.known_tests(root, _impact.load(root), set(paths))
+    covered = {t for t in _impact.tests_for(known, paths) if t in files}
+    unknown = {f for f in files if is_test_file(f) and f not in known}
+    affected = _dependents(seeds, build_reverse_graph(root, files)) if seeds and unknown else set()
+    selected: dict[str, set[str]] = {}
+    dropped = 0
+    for rel in affected | covered:
+        if rel.startswith("pkg:"):
+            # A dependent workspace is reached through its importing files; the package node itself selects nothing
+            continue
+        if not is_test_file(rel):
+            continue
+        if rel in known and rel not in covered:
+            dropped += 1
+            continue
+        ws = _owner(ctx, rel)
+        name = ws["name"] if ws else ROOT_SHARD
+        selected.setdefault(name, set()).add(rel[len(ws["rel"]) + 1:] if ws else rel)
+
+    if touched and ROOT_SHARD not in whole:
+        for rel in files:
+            if _owner(ctx, rel) is None and is_test_file(rel):
+                text = (root / rel).read_text(encoding="utf-8", errors="replace")
+                if any(_references(text, ws) for ws in touched.values()):
+                    selected.setdefault(ROOT_SHARD, set()).add(rel)
+
+    # Workspaces without a shard of their own run through the root tests covering them
+    covers = shards[ROOT_SHARD]["covers"] if ROOT_SHARD in shards else {}
+    for name, tests in covers.items():
+        if name in whole or selected.get(name):
+            selected.setdefault(ROOT_SHARD, set()).update(tests)
+
+    for name in shards:
+        if name in whole:
+            plan["shards"][name] = None
+        elif selected.get(name):
+            plan["shards"][name] = sorted(selected[name])
+    plan["impact"] = {"known": len(known), "unknown": len(unknown), "dropped": dropped}
+    return plan
+
+
+def failed_plan(root: Path, failed: list[dict], scripts: tuple[str, ...] | None = None) -> dict:
+    """A select()-shaped plan running just the given failed tests (see _timings.last_failed).
+
+    Tests are assigned to the shard owning their file, narrowed to their files and, under
+    plan["names"], to their names; a file that failed to load runs without a name filter.
+    """
+    ctx = ProjectContext.get(root)
+    found = {s["name"]: s for s in discover_shards(root, scripts)}
+    shards = set(found)
+    covers = found[ROOT_SHARD]["covers"] if ROOT_SHARD in found else {}
+    files: dict[str, set[str]] = {}
+    names: dict[str, set] = {}
+    whole: set[str] = set()
+    for t in failed:
+        file = t.get("file")
+        if not file:
+            whole.add(t.get("shard") if t.get("shard") in shards else ROOT_SHARD)
+            continue
+        if not (root / file).exists():
+            # The test went away with its file
+            continue
+        ws = _owner(ctx, file)
+        if ws is not None and ws["name"] in shards:
+            name, rel = ws["name"], file[len(ws["rel"]) + 1:]
+        elif ws is not None and ws["name"] in covers:
+            # Run by root tests; those rerun whole
+            files.setdefault(ROOT_SHARD, set()).update(covers[ws["name"]])
+            names.setdefault(ROOT_SHARD, set()).add(None)
+            continue
+        else:
+            name, rel = ROOT_SHARD, file
+        files.setdefault(name, set()).add(rel)
+        names.setdefault(name, set()).add(t.get("name") or None)
+    plan = {"since": None, "changed": None, "full": False, "shards": {}, "names": {}}
+    for name in sorted(shards):
+        if name in whole:
+            plan["shards"][name] = None
+        elif name in files:
+            plan["shards"][name] = sorted(files[name])
+            plan["names"][name] = None if None in names[name] else sorted(names[name])
+    return plan
+
+
+def describe(plan: dict) -> str:
+    if plan["changed"] is None:
+        return "changes unknown; running every shard"
+    if plan["full"]:
+        return "root configuration changed; running every shard"
+    changed = f"{len(plan['changed'])} changed path(s)" + (f" since {plan['since']}" if plan["since"] else "")
+    if not plan["shards"]:
+        return f"{changed}; no tests affected"
+    parts = [f"{name} ({'all' if files is None else len(files)})" for name, files in plan["shards"].items()]
+    impact = plan.get("impact")
+    note = f" ({impact['dropped']} test file(s) skipped by the coverage map)" if impact and impact["dropped"] else ""
+    return f"{changed}; running " + ", ".join(parts) + note
@@ -0,0 +1,78 @@
+// V8 coverage for the impact map (see tools/_impact.py), loaded into every
+// node process of a test run through NODE_OPTIONS (--require <this file>).
+// Only test-runner processes record: a node --test file subprocess (its main
+// script is the test file, and node sets NODE_TEST_CONTEXT for it; the
+// `node --test <file>` parent has no inspector to record with) or a
+// vitest/jest/mocha worker. npm, tsc, vite and
+// whatever else the tests spawn return right away, so they neither pay for
+// coverage nor leave dumps to parse. A recording process writes the repo's
+// scripts (CODEX_COVERAGE_ROOT, minus node_modules) in NODE_V8_COVERAGE's
+// format to CODEX_COVERAGE_DIR when it exits, including on SIGTERM, which is
+// how vitest's tinypool ends its fork workers.
+'use strict';
+
+const dir = process.env.CODEX_COVERAGE_DIR;
+const root = process.env.CODEX_COVERAGE_ROOT;
+const TEST_FILE = /\.(test|spec)\.[cm]?[jt]sx?$/;
+const RUNNER_WORKERS = [
+  /\/vitest\/dist\/(workers\/)?(forks|vmForks|child)\.[cm]?js$/,
+  /\/jest-worker\/build\/(workers\/)?processChild\.js$/,
+  /\/mocha\/bin\/(_mocha|mocha(\.js)?)$/,
+];
+
+function isRunner(main) {
+  if (TEST_FILE.test(main)) return Boolean(process.env.NODE_TEST_CONTEXT);
+  return RUNNER_WORKERS.some((re) => re.test(main));
+}
+
+function connect(session) {
+  try {
+    session.connect();
+    return true;
+  } catch {
+    // No inspector in this process; coverage is best effort
+    return false;
+  }
+}
+
+const main = (process.argv[1] || '').replace(/\\/g, '/');
+if (dir && root && isRunner(main)) {
+  const inspector = require('node:inspector');
+  const session = new inspector.Session();
+  if (connect(session)) record(session);
+}
+
+function record(session) {
+  const fs = require('node:fs');
+  const path = require('node:path');
+  const { pathToFileURL } = require('node:url');
+  const rootUrl = pathToFileURL(root).href + '/';
+  const rootPath = root + path.sep;
+  session.post('Profiler.enable');
+  session.post('Profiler.startPreciseCoverage', { callCount: true, detailed: true });
+
+  let written = false;
+  const write = () => {
+    if (written) return;
+    written = true;
+    // Synchronous for an in-process session, so it works in 'exit'
+    session.post('Profiler.takePreciseCoverage', (err, res) => {
+      if (err) return;
+      const result = res.result.filter(
+        (s) => (s.url.startsWith(rootUrl) || s.url.startsWith(rootPath)) && !s.url.includes('/node_modules/'),
+      );
+      try {
+        fs.mkdirSync(dir, { recursive: true });
+        fs.writeFileSync(path.join(dir, `coverage-${process.pid}-${Date.now()}-0.json`), JSON.stringify({ result }));
+      } catch {
+        // Coverage is best effort; never fail the test process over it
+      }
+    });
+  };
+  process.on('exit', write);
+  process.once('SIGTERM', () => {
+    write();
+    // Terminate as SIGTERM would have, unless the runner handles it itself
+    if (process.listenerCount('SIGTERM') === 0) process.kill(process.pid, 'SIGTERM');
+  });
+}
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""In-process dispatch of the tools.
+
+Every dispatchable tool exposes `invoke(argv) -> dict` (what its `main`
+prints, as data, always including "code"). call_tool() imports the tool
+once and calls that directly, so the orchestrator no longer pays Python
+startup, re-imports and a JSON round-trip per sub-tool. Subprocess
+isolation is opt-in via isolated=True or CODEX_TOOL_ISOLATION=1.
+"""
+import importlib.util
+import json
+import sys
+import traceback
+from pathlib import Path
+
+from _utils import _parse_bool_env, find_repo_root, repo_root_override, run
+import _trace
+
+
+TOOLS_DIR = Path(__file__).resolve().parent
+
+_modules: dict[str, object] = {}
+
+
+def load_tool(name: str):
+    """Import tools/<name>.py once (under a private module name; `test` would clash with the stdlib)."""
+    mod = _modules.get(name)
+    if mod is None:
+        path = TOOLS_DIR / f"{name}.py"
+        spec = importlib.util.spec_from_file_location(f"codex_tool_{name}", path)
+        if spec is None or spec.loader is None:
+            raise ImportError(f"Unknown tool: {name}")
+        mod = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(mod)
+        _modules[name] = mod
+    return mod
+
+
+def _call_isolated(name: str, argv: list[str], root: Path) -> dict:
+    code, out, err = run([sys.executable, str(TOOLS_DIR / f"{name}.py"), *argv], cwd=root)
+    res: dict = {"code": code, "stdout": out, "stderr": err}
+    try:
+        parsed = json.loads(out)
+    except (json.JSONDecodeError, ValueError):
+        parsed = None
+    if isinstance(parsed, dict):
+        res.update(parsed)
+        res["code"] = code
+    return res
+
+
+def call_tool(name: str, argv: list[str], *, root: Path | None = None, isolated: bool | None = None) -> dict:
+    """Run a tool with argv and return its structured result (always has "code")."""
+    root = root or find_repo_root()
+    with _trace.span(name, cat="tool", argv=" ".join(argv)[:500]) as attrs:
+        res = _call(name, argv, root, isolated)
+        attrs["code"] = res.get("code")
+    return res
+
+
+def _call(name: str, argv: list[str], root: Path, isolated: bool | None) -> dict:
+    if isolated is None:
+        isolated = _parse_bool_env("CODEX_TOOL_ISOLATION", False)
+    if isolated:
+        return _call_isolated(name, argv, root)
+    with repo_root_override(root):
+        try:
+            # A tool that fails to import fails the call, like one that raises
+            invoke = getattr(load_tool(name), "invoke", None)
+            if invoke is None:
+                return _call_isolated(name, argv, root)
+            res = invoke(argv)
+        except SystemExit as e:
+            # argparse usage errors
+            code = e.code if isinstance(e.code, int) else 2
+            return {"code": code, "stdout": "", "stderr": f"{name}: exited with {e.code}"}
+        except Exception:
+            return {"code": 1, "stdout": "", "stderr": traceback.format_exc()}
+    return res
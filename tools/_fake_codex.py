@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""Offline stand-in for `codex exec`, for benchmarks and orchestrator regression runs (see bench.py).
+
+Put it on PATH as `codex` (bench.py links it into a scratch bin directory).
+It reads the prompt agent.py sends, works out the task ("Task: ...") and
+whether tests or the implementation are asked for, and writes them into
+the --cd directory as a node:test file and an ES module:
+
+  tests/<name>.test.mjs   asserts that src/<name>.mjs exports <name>() returning N
+  src/<name>.mjs          the implementation
+
+A title of the form "... <name> returning <N> ..." picks the name and the
+value; anything else gets a name derived from the title and its length.
+
+FAKE_CODEX_PROFILE sets the timing/behaviour:
+  fast     edits right away (default)
+  slow     FAKE_CODEX_DELAY_SEC (default 2) of "thinking" around each edit
+  hang     implements, then goes silent until killed (what early stopping and budgets are for)
+  failing  the implementation returns the wrong value, so the tests stay red
+
+FAKE_CODEX_SCRIPT names a JSON file {title: {"profile": ..., "tests": {path: content},
+"impl": {path: content}}} ("*" matches any title) whose edits replace the generated ones.
+"""
+import argparse
+import json
+import os
+import re
+import signal
+import sys
+import time
+from pathlib import Path
+
+
+PROFILES = ("fast", "slow", "hang", "failing")
+
+
+def _name_and_value(title: str) -> tuple[str, int]:
+    m = re.search(r"([A-Za-z_][A-Za-z0-9_]*)\s+returning\s+(-?\d+)", title)
+    if m:
+        return m.group(1), int(m.group(2))
+    words = re.findall(r"[A-Za-z0-9]+", title.lower())[:4] or ["task"]
+    name = "_".join(words)
+    if name[0].isdigit():
+        name = f"t_{name}"
+    return name, len(title)
+
+
+def _generated(title: str, wrong: bool) -> dict[str, dict[str, str]]:
+    name, value = _name_and_value(title)
+    test = (
+        "import { test } from 'node:test';\n"
+        "import assert from 'node:assert/strict';\n"
+        f"import {{ {name} }} from '../src/{name}.mjs';\n\n"
+        f"test('{name} returns {value}', () => {{\n"
+        f"  assert.equal({name}(), {value});\n"
+        "});\n"
+    )
+    impl = f"export function {name}() {{\n  return {value + 1 if wrong else value};\n}}\n"
+    return {"tests": {f"tests/{name}.test.mjs": test}, "impl": {f"src/{name}.mjs": impl}}
+
+
+def _script_entry(title: str) -> dict:
+    path = os.getenv("FAKE_CODEX_SCRIPT")
+    if not path:
+        return {}
+    script = json.loads(Path(path).read_text(encoding="utf-8"))
+    return script.get(title) or script.get("*") or {}
+
+
+def _write(cwd: Path, files: dict[str, str]) -> None:
+    for rel, content in files.items():
+        path = cwd / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content, encoding="utf-8")
+        print(f"edited {rel}", flush=True)
+
+
+def exec_prompt(cwd: Path, prompt: str) -> int:
+    m = re.search(r"^Task: (.*)$", prompt, re.M)
+    title = m.group(1).strip() if m else prompt.strip().splitlines()[0]
+    entry = _script_entry(title)
+    profile = entry.get("profile") or os.getenv("FAKE_CODEX_PROFILE") or "fast"
+    if profile not in PROFILES:
+        print(f"unknown FAKE_CODEX_PROFILE {profile!r} (one of {', '.join(PROFILES)})", file=sys.stderr)
+        return 2
+    delay = float(os.getenv("FAKE_CODEX_DELAY_SEC") or 2.0) if profile == "slow" else 0.0
+    stage = "tests" if "Write or update tests ONLY" in prompt else "impl"
+    edits = {**_generated(title, wrong=profile == "failing"), **{k: v for k, v in entry.items() if k in ("tests", "impl")}}
+
+    print(f"[fake-codex] {profile}: {stage} for {title!r}", flush=True)
+    time.sleep(delay)
+    _write(cwd, edits[stage])
+    time.sleep(delay)
+    if profile == "hang" and stage == "impl":
+        # Done, but never says so: only a signal or a timeout ends this
+        signal.signal(signal.SIGTERM, lambda *_: sys.exit(143))
+        while True:
+            time.sleep(3600)
+    print("[fake-codex] done", flush=True)
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="codex", description="Offline codex stand-in (exec only).")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_exec = sub.add_parser("exec")
+    p_exec.add_argument("--cd", type=Path, default=Path.cwd())
+    p_exec.add_argument("--profile")
+    p_exec.add_argument("--model")
+    p_exec.add_argument("--ask-for-approval", action="store_true")
+    p_exec.add_argument("--full-auto", action="store_true")
+    p_exec.add_argument("prompt")
+    args = parser.parse_args(argv)
+    return exec_prompt(args.cd, args.prompt)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""Coverage-based test impact map: which source files each test file executes.
+
+Test runs load _coverage_preload.cjs into their node processes (NODE_OPTIONS),
+which has the test-runner processes among them (node --test's per-file
+subprocesses, vitest/jest workers) dump V8 script coverage of the repo's
+files when they exit; npm, tsc, builds and the like started by tests don't.
+A process that loaded test files is attributed to them: each of those tests
+"touches" every repo file the process executed. The result is
+kept per test file in .codex/cache/impact.json with the mtime/size of every
+touched file, and refreshed for the tests of each run.
+
+tests_for() answers "which known tests execute this file?". An entry only
+counts while none of its touched files has changed since it was recorded
+(or the changed file is part of the change being asked about); stale or
+missing entries are left to the import graph (see _affected.py).
+"""
+import json
+import os
+import shutil
+from pathlib import Path
+from urllib.parse import unquote, urlparse
+
+from _logs import unique_stem
+from _utils import TREE_EXCLUDES, ensure_codex_dir, read_json, timestamp, write_json
+
+
+STORE_FILE = "impact.json"
+STORE_VERSION = 1
+PRELOAD = Path(__file__).with_name("_coverage_preload.cjs")
+
+
+def store_path(root: Path) -> Path:
+    return ensure_codex_dir(root) / "cache" / STORE_FILE
+
+
+def coverage_dir(root: Path) -> Path:
+    """A fresh coverage directory (created on the first dump)."""
+    return ensure_codex_dir(root) / "cache" / "coverage" / unique_stem("v8")
+
+
+def coverage_env(root: Path, cov_dir: Path, node_options: str | None = None) -> dict:
+    """Environment overlay making a test command's runner processes dump coverage into cov_dir.
+
+    node_options is the NODE_OPTIONS the command already gets (else the inherited one).
+    """
+    existing = node_options if node_options is not None else os.environ.get("NODE_OPTIONS")
+    opt = f'--require="{PRELOAD}"'
+    return {
+        "NODE_OPTIONS": f"{existing} {opt}" if existing else opt,
+        "CODEX_COVERAGE_DIR": str(cov_dir),
+        "CODEX_COVERAGE_ROOT": str(root.resolve()),
+    }
+
+
+def load(root: Path) -> dict:
+    """{"version", "tests": {test file: {"shard", "ts", "files": {path: [mtime_ns, size]}}}}, root-relative."""
+    data = read_json(store_path(root), {})
+    if data.get("version") != STORE_VERSION:
+        return {"version": STORE_VERSION, "tests": {}}
+    return data
+
+
+def _stamp(path: Path) -> list[int] | None:
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    return [st.st_mtime_ns, st.st_size]
+
+
+def _repo_path(url: str, root: Path) -> str | None:
+    """Root-relative path of a covered script URL (file:// or a plain path); None outside the repo."""
+    if url.startswith("file://"):
+        path = unquote(urlparse(url).path)
+    elif url.startswith("/"):
+        # vite-node runs transformed sources under their file path (plus a ?query at times)
+        path = url.split("?", 1)[0]
+    else:
+        return None
+    try:
+        rel = Path(path).resolve().relative_to(root.resolve()).as_posix()
+    except (ValueError, OSError):
+        return None
+    if any(part in TREE_EXCLUDES for part in rel.split("/")):
+        return None
+    return rel
+
+
+def _executed(script: dict) -> bool:
+    return any(r.get("count", 0) > 0 for fn in script.get("functions") or () for r in fn.get("ranges") or ())
+
+
+def _processes(root: Path, cov_dir: Path):
+    """Per dumped process: the set of root-relative repo files it executed."""
+    for f in sorted(cov_dir.glob("coverage-*.json")):
+        try:
+            data = json.loads(f.read_text(encoding="utf-8"))
+        except (OSError, json.JSONDecodeError):
+            continue
+        files = set()
+        for script in data.get("result") or ():
+            rel = _repo_path(script.get("url") or "", root)
+            if rel is not None and _executed(script):
+                files.add(rel)
+        yield files
+
+
+def collect(root: Path, dirs: dict[str, Path], is_test_file) -> int:
+    """Fold the coverage dumped into dirs ({shard or None: dir}) into the map; returns how many tests were refreshed.
+
+    is_test_file(rel) tells test files from sources. The dumps are deleted.
+    """
+    touched: dict[str, tuple[str | None, set[str]]] = {}
+    for shard, cov_dir in dirs.items():
+        if not cov_dir.is_dir():
+            continue
+        try:
+            for files in _processes(root, cov_dir):
+                tests = [rel for rel in files if is_test_file(rel)]
+                for test in tests:
+                    # A process running several test files (a reused worker) credits all of them
+                    touched.setdefault(test, (shard, set()))[1].update(files)
+        finally:
+            shutil.rmtree(cov_dir, ignore_errors=True)
+    if not touched:
+        return 0
+    store = load(root)
+    ts = timestamp()
+    for test, (shard, files) in touched.items():
+        stamps = {rel: s for rel in sorted(files) if (s := _stamp(root / rel)) is not None}
+        store["tests"][test] = {"shard": shard, "ts": ts, "files": stamps}
+    # Tests whose file is gone won't run again
+    store["tests"] = {t: e for t, e in store["tests"].items() if (root / t).exists()}
+    write_json(store_path(root), store)
+    return len(touched)
+
+
+def _fresh(entry: dict, root: Path, changed: set[str], stamps: dict[str, list | None]) -> bool:
+    for rel, recorded in entry["files"].items():
+        if rel in changed:
+            continue
+        if rel not in stamps:
+            stamps[rel] = _stamp(root / rel)
+        if stamps[rel] != recorded:
+            return False
+    return True
+
+
+def known_tests(root: Path, store: dict, changed: set[str]) -> dict[str, set[str]]:
+    """{test file: files it executes} for the entries still valid, given the files being changed."""
+    stamps: dict[str, list | None] = {}
+    return {
+        test: set(entry["files"])
+        for test, entry in store["tests"].items()
+        if _fresh(entry, root, changed, stamps)
+    }
+
+
+def tests_for(known: dict[str, set[str]], paths) -> set[str]:
+    """The known tests executing any of paths."""
+    paths = set(paths)
+    return {test for test, files in known.items() if files & paths}
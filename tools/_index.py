@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""Persistent repository index for the context blocks in subagent prompts.
+
+.codex/index/files.json holds, per tracked or unignored file (`git ls-files
+-co --exclude-standard`, minus TREE_EXCLUDES): mtime/size, a content hash,
+its workspace package, whether it is a test, and for TS/JS sources the
+exported symbols. LOG.md files also keep their latest entries. update()
+only reads files whose mtime/size changed, and only re-parses those whose
+hash changed too, so refreshing it costs a `git ls-files` and a stat per
+file.
+
+context_block() ranks the indexed files against a task's words (path
+segments, exported symbols, package name) and renders the best ones, the
+workspaces and recent log entries into a block of at most max_chars.
+"""
+import hashlib
+import re
+from pathlib import Path
+
+from _affected import is_test_file
+from _utils import ProjectContext, TREE_EXCLUDES, ensure_codex_dir, read_json, run, write_json
+
+
+INDEX_DIR = "index"
+INDEX_FILE = "files.json"
+INDEX_VERSION = 1
+SYMBOL_SUFFIXES = (".ts", ".tsx", ".mts", ".cts", ".js", ".jsx", ".mjs", ".cjs")
+LOG_ENTRIES = 5
+CONTEXT_CHARS = 4000
+# Files larger than this are indexed by stamp and hash only
+MAX_PARSE_BYTES = 512 * 1024
+
+_EXPORT_RE = re.compile(
+    r"^\s*export\s+(?:declare\s+)?(?:default\s+)?(?:abstract\s+)?(?:async\s+)?"
+    r"(?:function\*?|class|const|let|var|interface|type|enum|namespace)\s+([A-Za-z_$][\w$]*)",
+    re.M,
+)
+_EXPORT_LIST_RE = re.compile(r"^\s*export\s+(?:type\s+)?\{([^}]*)\}", re.M)
+_WORD_RE = re.compile(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|[0-9]+")
+_STOPWORDS = {
+    "the", "and", "for", "with", "from", "into", "that", "this", "add", "use", "make",
+    "should", "when", "then", "all", "new", "via", "per", "are", "its", "not", "has",
+}
+
+
+def index_path(root: Path) -> Path:
+    return ensure_codex_dir(root) / INDEX_DIR / INDEX_FILE
+
+
+def load(root: Path) -> dict:
+    """{"version", "files": {path: entry}}, root-relative; empty when missing or from another version."""
+    data = read_json(index_path(root), {})
+    if data.get("version") != INDEX_VERSION:
+        return {"version": INDEX_VERSION, "files": {}}
+    return data
+
+
+def _listed(root: Path) -> list[str]:
+    code, out, _ = run(["git", "ls-files", "--cached", "--others", "--exclude-standard", "-z"], cwd=root)
+    if code != 0:
+        return []
+    return sorted({
+        rel for rel in out.split("\0")
+        if rel and not any(part in TREE_EXCLUDES for part in rel.split("/"))
+    })
+
+
+def _symbols(text: str) -> list[str]:
+    names = _EXPORT_RE.findall(text)
+    for group in _EXPORT_LIST_RE.findall(text):
+        for item in group.split(","):
+            # `a as b` exports b
+            name = item.split(" as ")[-1].strip()
+            if re.fullmatch(r"[A-Za-z_$][\w$]*", name):
+                names.append(name)
+    return sorted(set(names))
+
+
+def _log_entries(text: str) -> list[str]:
+    """The last LOG_ENTRIES "## Title" sections of a LOG.md, one line each."""
+    entries = []
+    for block in re.split(r"^## ", text, flags=re.M)[1:]:
+        title, _, body = block.partition("\n")
+        detail = " ".join(line.strip("- ").strip() for line in body.splitlines() if line.strip())
+        entries.append(f"{title.strip()}: {detail}" if detail else title.strip())
+    return entries[-LOG_ENTRIES:]
+
+
+def _parse(rel: str, data: bytes) -> dict:
+    entry: dict = {}
+    if len(data) > MAX_PARSE_BYTES:
+        return entry
+    text = data.decode("utf-8", "replace")
+    if rel.endswith(SYMBOL_SUFFIXES):
+        entry["symbols"] = _symbols(text)
+    if rel.rsplit("/", 1)[-1] == "LOG.md":
+        entry["log"] = _log_entries(text)
+    return entry
+
+
+def update(root: Path) -> dict:
+    """Bring the index up to date with the working tree (incrementally) and return it."""
+    index = load(root)
+    old = index["files"]
+    ctx = ProjectContext.get(root)
+    files: dict[str, dict] = {}
+    changed = False
+    for rel in _listed(root):
+        try:
+            st = (root / rel).stat()
+        except OSError:
+            continue
+        stamp = [st.st_mtime_ns, st.st_size]
+        prev = old.get(rel)
+        if prev is not None and prev["stamp"] == stamp:
+            files[rel] = prev
+            continue
+        changed = True
+        try:
+            data = (root / rel).read_bytes()
+        except OSError:
+            continue
+        digest = hashlib.sha1(data).hexdigest()
+        if prev is not None and prev["sha1"] == digest:
+            # Touched but not changed
+            files[rel] = {**prev, "stamp": stamp}
+            continue
+        ws = ctx.workspace_for(Path(rel))
+        files[rel] = {
+            "stamp": stamp,
+            "sha1": digest,
+            "package": ws["name"] if ws else None,
+            "test": is_test_file(rel),
+            **_parse(rel, data),
+        }
+    if changed or files.keys() != old.keys():
+        index["files"] = files
+        path = index_path(root)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        write_json(path, index)
+    return index
+
+
+def _words(text: str) -> set[str]:
+    """Lower-cased words of text, camelCase and snake_case split, minus short and filler words."""
+    return {w.lower() for w in _WORD_RE.findall(text) if len(w) >= 3 and w.lower() not in _STOPWORDS}
+
+
+def relevant(index: dict, query: str, focus: str | None = None, limit: int = 12) -> list[tuple[str, dict]]:
+    """The indexed files best matching query's words, best first (focus: a root-relative directory to favour)."""
+    wanted = _words(query)
+    if not wanted:
+        return []
+    scored = []
+    for rel, entry in index["files"].items():
+        score = 3 * len(wanted & _words(rel))
+        score += 2 * len(wanted & _words(" ".join(entry.get("symbols") or ())))
+        score += len(wanted & _words(entry.get("package") or ""))
+        if not score:
+            continue
+        if focus and focus not in (".", "") and (rel == focus or rel.startswith(focus.rstrip("/") + "/")):
+            score += 2
+        scored.append((-score, rel.count("/"), rel, entry))
+    scored.sort(key=lambda s: s[:3])
+    return [(rel, entry) for _, _, rel, entry in scored[:limit]]
+
+
+def context_block(root: Path, query: str, focus: str | None = None, max_chars: int = CONTEXT_CHARS) -> str:
+    """A "## Repository context" block for prompts about query; "" when nothing is known."""
+    index = update(root)
+    if not index["files"]:
+        return ""
+    ctx = ProjectContext.get(root)
+    lines = []
+    if ctx.workspaces:
+        lines.append("Packages: " + ", ".join(f"{ws['name']} ({ws['rel']}, {ws['test_runner'] or 'no test runner'})" for ws in ctx.workspaces))
+    files = relevant(index, query, focus)
+    if files:
+        lines.append("Likely relevant files:")
+        for rel, entry in files:
+            tags = [entry["package"]] if entry.get("package") else []
+            if entry.get("test"):
+                tags.append("test")
+            line = f"- {rel}" + (f" [{', '.join(tags)}]" if tags else "")
+            if entry.get("symbols"):
+                line += f" exports: {', '.join(entry['symbols'][:12])}"
+            lines.append(line)
+    # The root log, then those of the packages the files above belong to
+    packages = {entry.get("package") for _, entry in files}
+    for rel, entry in sorted(index["files"].items(), key=lambda item: item[0].count("/")):
+        if entry.get("log") and (rel == "LOG.md" or entry.get("package") in packages - {None}):
+            lines.append(f"Recent {rel}:")
+            lines.extend(f"- {e[:200]}" for e in entry["log"][-3:])
+    if not lines:
+        return ""
+    out = ["## Repository context", ""]
+    used = sum(len(line) + 1 for line in out)
+    for line in lines:
+        if used + len(line) + 1 > max_chars:
+            out.append("- ...")
+            break
+        out.append(line)
+        used += len(line) + 1
+    return "\n".join(out) + "\n"
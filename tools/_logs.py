@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""JSONL logging for the tools: buffered writers, size-based rotation with
+gzip'd segments, unique report names, pruning of one-off files, and a
+reader across segments."""
+import atexit
+import fcntl
+import gzip
+import itertools
+import json
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+from typing import Iterator
+
+
+_name_seq = itertools.count(1)
+
+
+def _env_int(name: str, default: int) -> int:
+    val = os.getenv(name)
+    return int(val) if val else default
+
+
+def _env_float(name: str, default: float) -> float:
+    val = os.getenv(name)
+    return float(val) if val else default
+
+
+def unique_stem(prefix: str) -> str:
+    """`<prefix>_<YYYYmmdd-HHMMSS>_<pid>_<seq>`: unique across processes and calls."""
+    return f"{prefix}_{time.strftime('%Y%m%d-%H%M%S')}_{os.getpid()}_{next(_name_seq)}"
+
+
+def write_report(log_dir: Path, prefix: str, obj: dict) -> Path:
+    """Write a one-off JSON report (e.g. a hang) to a new, never-reused file."""
+    log_dir.mkdir(parents=True, exist_ok=True)
+    while True:
+        path = log_dir / f"{unique_stem(prefix)}.json"
+        try:
+            with path.open("x", encoding="utf-8") as f:
+                f.write(json.dumps(obj, ensure_ascii=False) + "\n")
+            return path
+        except FileExistsError:
+            continue
+
+
+def prune(log_dir: Path, pattern: str, keep: int) -> None:
+    """Delete all but the `keep` most recently modified files in log_dir matching pattern."""
+    found = []
+    for path in log_dir.glob(pattern):
+        try:
+            found.append((path.stat().st_mtime, path))
+        except OSError:
+            continue
+    found.sort(reverse=True)
+    for _, path in found[keep:]:
+        try:
+            path.unlink()
+        except OSError:
+            # Pruned by another process already
+            pass
+
+
+def rotated_segments(path: Path) -> list[Path]:
+    """Existing segments of a rotated log, oldest first, current file last."""
+    segs = []
+    i = 1
+    while True:
+        seg = path.with_name(f"{path.name}.{i}.gz")
+        if not seg.exists():
+            break
+        segs.append(seg)
+        i += 1
+    segs.reverse()
+    if path.exists():
+        segs.append(path)
+    return segs
+
+
+def iter_jsonl(path: Path) -> Iterator[dict]:
+    """Iterate records across rotated (gzip'd) segments and the live file, oldest first."""
+    for seg in rotated_segments(path):
+        opener = gzip.open if seg.suffix == ".gz" else open
+        try:
+            with opener(seg, "rt", encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+        except (FileNotFoundError, EOFError, OSError):
+            # Rotated away or truncated while reading
+            continue
+
+
+class JsonlLog:
+    """Long-lived, buffered JSONL appender with size-based rotation.
+
+    Records are buffered and flushed once `flush_bytes` are pending, after
+    `flush_sec`, and at interpreter exit. When the file passes `max_bytes`
+    it is gzip'd to `<name>.1.gz` (older segments shift up, at most
+    `backups` are kept). Safe to share across threads; rotation is
+    serialized across processes with a lock file.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        *,
+        max_bytes: int | None = None,
+        backups: int | None = None,
+        flush_bytes: int | None = None,
+        flush_sec: float | None = None,
+    ):
+        self.path = path
+        self.max_bytes = _env_int("CODEX_LOG_MAX_BYTES", 10 * 1024 * 1024) if max_bytes is None else max_bytes
+        self.backups = _env_int("CODEX_LOG_BACKUPS", 5) if backups is None else backups
+        self.flush_bytes = _env_int("CODEX_LOG_FLUSH_BYTES", 64 * 1024) if flush_bytes is None else flush_bytes
+        self.flush_sec = _env_float("CODEX_LOG_FLUSH_SEC", 1.0) if flush_sec is None else flush_sec
+        self._lock = threading.Lock()
+        self._buf: list[str] = []
+        self._buf_size = 0
+        self._first_pending = 0.0
+        self._fh = None
+        self._timer: threading.Timer | None = None
+
+    def write(self, obj: dict) -> None:
+        line = json.dumps(obj, ensure_ascii=False) + "\n"
+        with self._lock:
+            if not self._buf:
+                self._first_pending = time.monotonic()
+            self._buf.append(line)
+            self._buf_size += len(line)
+            due = self._buf_size >= self.flush_bytes or (time.monotonic() - self._first_pending) >= self.flush_sec
+            if due:
+                self._flush_locked()
+            elif self._timer is None and self.flush_sec > 0:
+                self._timer = threading.Timer(self.flush_sec, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush_locked()
+
+    def close(self) -> None:
+        with self._lock:
+            self._flush_locked()
+            if self._fh is not None:
+                self._fh.close()
+                self._fh = None
+
+    def _open(self):
+        # Another process may have rotated the file under us
+        if self._fh is not None:
+            try:
+                if os.fstat(self._fh.fileno()).st_ino == os.stat(self.path).st_ino:
+                    return self._fh
+            except FileNotFoundError:
+                pass
+            self._fh.close()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._fh = self.path.open("a", encoding="utf-8")
+        return self._fh
+
+    def _flush_locked(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._buf:
+            return
+        fh = self._open()
+        fh.write("".join(self._buf))
+        fh.flush()
+        self._buf.clear()
+        self._buf_size = 0
+        if self.max_bytes > 0 and fh.tell() >= self.max_bytes:
+            self._rotate()
+
+    def _rotate(self) -> None:
+        lock_path = self.path.with_name(self.path.name + ".lock")
+        with lock_path.open("a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                # Re-check under the lock: someone else may have rotated already
+                if not self.path.exists() or self.path.stat().st_size < self.max_bytes:
+                    return
+                if self._fh is not None:
+                    self._fh.close()
+                    self._fh = None
+                oldest = self.path.with_name(f"{self.path.name}.{self.backups}.gz")
+                if oldest.exists():
+                    oldest.unlink()
+                for i in range(self.backups - 1, 0, -1):
+                    seg = self.path.with_name(f"{self.path.name}.{i}.gz")
+                    if seg.exists():
+                        seg.rename(self.path.with_name(f"{self.path.name}.{i + 1}.gz"))
+                staged = self.path.with_name(f"{self.path.name}.rotating")
+                self.path.rename(staged)
+                if self.backups > 0:
+                    with staged.open("rb") as src, gzip.open(self.path.with_name(f"{self.path.name}.1.gz"), "wb") as dst:
+                        shutil.copyfileobj(src, dst)
+                staged.unlink()
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+_logs: dict[Path, JsonlLog] = {}
+_logs_lock = threading.Lock()
+
+
+def get_log(path: Path) -> JsonlLog:
+    """Process-wide JsonlLog for a path (created on first use, flushed at exit)."""
+    key = Path(os.path.abspath(path))
+    with _logs_lock:
+        log = _logs.get(key)
+        if log is None:
+            log = _logs[key] = JsonlLog(key)
+        return log
+
+
+@atexit.register
+def _close_all() -> None:
+    for log in list(_logs.values()):
+        try:
+            log.close()
+        except Exception:
+            pass
@@ -0,0 +1,27 @@
+// node --test reporter used by tools/test.py: one JSON line per finished test.
+// Loaded through NODE_OPTIONS (--test-reporter=<this file>) next to the
+// tap reporter on stdout, so the human-readable output is unchanged.
+export default async function* reporter(source) {
+  const stack = [];
+  for await (const { type, data } of source) {
+    if (type === 'test:start') {
+      stack.length = data.nesting;
+      stack.push(data.name);
+      continue;
+    }
+    if (type !== 'test:pass' && type !== 'test:fail') continue;
+    // Suites aggregate their children; the per-file wrapper only reports when
+    // the file itself failed to run (syntax error, missing import, ...)
+    if (data.details?.type === 'suite') continue;
+    const wrapper = data.name === data.file;
+    if (wrapper && type === 'test:pass') continue;
+    const error = data.details?.error;
+    yield JSON.stringify({
+      file: data.file ?? null,
+      name: wrapper ? '' : [...stack.slice(0, data.nesting), data.name].join(' > '),
+      status: data.skip || data.todo ? 'skipped' : type === 'test:pass' ? 'passed' : 'failed',
+      duration_ms: data.details?.duration_ms ?? null,
+      message: error ? String(error.cause?.message ?? error.message ?? error) : null,
+    }) + '\n';
+  }
+}
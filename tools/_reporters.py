@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""Machine-readable test reports: per-test outcomes and durations.
+
+Each supported runner is asked for a structured report next to its usual
+output:
+  vitest  --reporter=json --outputFile.json=<file> (plus the default reporter
+          unless the script already picks one)
+  jest    --json --outputFile=<file>
+  mocha   --reporter=json --reporter-option=output=<file> (mocha has a single
+          reporter, so this replaces the spec output)
+  node    NODE_OPTIONS: the tap reporter to stdout and _node_reporter.mjs to <file>
+parse() turns any of them into [{"id", "file", "name", "status", "duration_ms", "message"}].
+"""
+import json
+import os
+import re
+import shutil
+from pathlib import Path
+
+from _logs import unique_stem
+from _utils import ensure_codex_dir, run
+
+
+NODE_REPORTER = Path(__file__).with_name("_node_reporter.mjs")
+# --test-reporter is accepted in NODE_OPTIONS from node 20 on
+MIN_NODE_MAJOR = 20
+MESSAGE_CHARS = 500
+_SCRIPT_RUNNERS = ("npm", "pnpm", "yarn")
+
+_node_majors: dict[str, int | None] = {}
+
+
+def report_path(root: Path) -> Path:
+    d = ensure_codex_dir(root) / "cache" / "reports"
+    d.mkdir(parents=True, exist_ok=True)
+    return d / f"{unique_stem('tests')}.json"
+
+
+def _node_major() -> int | None:
+    path = shutil.which("node")
+    if not path:
+        return None
+    if path not in _node_majors:
+        code, out, _ = run([path, "--version"])
+        m = re.match(r"v(\d+)", out.strip()) if code == 0 else None
+        _node_majors[path] = int(m.group(1)) if m else None
+    return _node_majors[path]
+
+
+def instrument(cmd: list[str], runner: str | None, report: Path, script_text: str | None = None) -> tuple[list[str], dict] | None:
+    """(cmd, env overlay) that also writes a report to `report`; None if the runner isn't supported.
+
+    script_text is the npm script cmd runs, if any (to keep its own --reporter choice).
+    """
+    if runner == "node-test-runner":
+        major = _node_major()
+        if major is None or major < MIN_NODE_MAJOR:
+            return None
+        # Options after the file globs would be taken for files, so they go through the environment
+        opts = (
+            "--test-reporter=tap --test-reporter-destination=stdout "
+            f'--test-reporter="{NODE_REPORTER}" --test-reporter-destination="{report}"'
+        )
+        existing = os.environ.get("NODE_OPTIONS")
+        return cmd, {"NODE_OPTIONS": f"{existing} {opts}" if existing else opts}
+    if runner == "vitest":
+        args = ["--reporter=json", f"--outputFile.json={report}"]
+        if not (script_text and "--reporter" in script_text):
+            args.insert(0, "--reporter=default")
+    elif runner == "jest":
+        args = ["--json", f"--outputFile={report}"]
+    elif runner == "mocha":
+        args = ["--reporter=json", f"--reporter-option=output={report}"]
+    else:
+        return None
+    if cmd[0] in _SCRIPT_RUNNERS and "--" not in cmd:
+        cmd = [*cmd, "--"]
+    return [*cmd, *args], {}
+
+
+def _status(raw: str | None) -> str:
+    if raw in ("passed", "failed"):
+        return raw
+    return "skipped"
+
+
+def _jest_like(data: dict) -> list[dict]:
+    """vitest's json reporter writes jest's format."""
+    tests = []
+    for tr in data.get("testResults") or []:
+        file = tr.get("name") or tr.get("testFilePath")
+        assertions = tr.get("assertionResults") or []
+        if not assertions and tr.get("status") == "failed":
+            # The file itself failed (syntax error, failing hook, ...)
+            tests.append({"file": file, "name": "", "status": "failed", "duration_ms": None, "message": tr.get("message")})
+        for a in assertions:
+            titles = [*(a.get("ancestorTitles") or []), a.get("title") or ""]
+            tests.append({
+                "file": file,
+                "name": " > ".join(t for t in titles if t) or a.get("fullName") or "",
+                "status": _status(a.get("status")),
+                "duration_ms": a.get("duration"),
+                "message": "\n".join(a.get("failureMessages") or []) or None,
+            })
+    return tests
+
+
+def _mocha(data: dict) -> list[dict]:
+    pending = {t.get("fullTitle") for t in data.get("pending") or []}
+    tests = []
+    for t in data.get("tests") or []:
+        err = t.get("err") or {}
+        if err:
+            status = "failed"
+        elif t.get("fullTitle") in pending:
+            status = "skipped"
+        else:
+            status = "passed"
+        tests.append({
+            "file": t.get("file"),
+            "name": t.get("fullTitle") or t.get("title") or "",
+            "status": status,
+            "duration_ms": t.get("duration"),
+            "message": err.get("message"),
+        })
+    return tests
+
+
+def _normalize(test: dict, root: Path) -> dict:
+    file = test.get("file")
+    if file:
+        try:
+            file = Path(file).resolve().relative_to(root.resolve()).as_posix()
+        except ValueError:
+            pass
+    name = test.get("name") or ""
+    message = test.get("message")
+    return {
+        "id": f"{file}::{name}" if file and name else (file or name),
+        "file": file,
+        "name": name,
+        "status": test["status"],
+        "duration_ms": round(test["duration_ms"], 3) if isinstance(test.get("duration_ms"), (int, float)) else None,
+        "message": message[:MESSAGE_CHARS] if message else None,
+    }
+
+
+def parse(runner: str | None, report: Path, root: Path) -> list[dict] | None:
+    """Per-test results from a report written by an instrument()ed command; None if there is none."""
+    try:
+        text = report.read_text(encoding="utf-8", errors="replace")
+    except OSError:
+        return None
+    finally:
+        report.unlink(missing_ok=True)
+    try:
+        if runner == "node-test-runner":
+            raw = [json.loads(line) for line in text.splitlines() if line.strip()]
+        elif runner in ("vitest", "jest"):
+            raw = _jest_like(json.loads(text))
+        elif runner == "mocha":
+            raw = _mocha(json.loads(text))
+        else:
+            return None
+    except (json.JSONDecodeError, AttributeError, TypeError):
+        return None
+    return [_normalize(t, root) for t in raw]
+
+
+def counts(tests: list[dict]) -> dict:
+    out = {"passed": 0, "failed": 0, "skipped": 0}
+    for t in tests:
+        out[t["status"]] += 1
+    return out
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""Test shards for npm workspaces.
+
+Each workspace with a test script is one shard, plus a "root" shard for the
+root test script (tests/**/*.mjs here). Shards run concurrently, bounded by
+the CPU count, so total time tracks the slowest shard instead of the sum.
+
+A workspace whose tests the root suite already runs (a root test spawning
+`npm run -w <workspace> test:unit`, like tests/vitest.setup.test.mjs) gets
+no shard of its own, or its suite would run twice; the root shard lists
+those test files per workspace under "covers". When the root suite drives
+every workspace's tests, as this repo's does, --workspaces therefore runs a
+single shard and gains nothing over the root script: those workspace suites
+run one after another inside that root test.
+"""
+import os
+import re
+from pathlib import Path
+
+from _utils import ProjectContext, TREE_EXCLUDES, package_script_cmd, run
+
+
+# Workspace scripts tried in order for a shard
+WORKSPACE_TEST_SCRIPTS = ("test", "test:unit")
+ROOT_SHARD = "root"
+_ROOT_TEST_RE = re.compile(r"\.(test|spec)\.[cm]?[jt]sx?$")
+
+
+def _runs_workspace_script(text: str, ws: dict, script: str) -> bool:
+    """Whether a root test runs ws's script itself (`npm run -w <name|path> ... <script>`, as a string or an argv array)."""
+    flat = re.sub(r"""['"]\s*,\s*['"]""", " ", text)
+    target = "|".join(re.escape(t) for t in (ws["name"], ws["rel"], f"./{ws['rel']}"))
+    return re.search(
+        rf"(?:-w|--workspace)[\s=]+['\"]?(?:{target})['\"]?\s[^\n]*?(?<![\w:-]){re.escape(script)}(?![\w:-])",
+        flat,
+    ) is not None
+
+
+def _root_covers(root: Path, ctx: ProjectContext, scripts: dict[str, str]) -> dict[str, list[str]]:
+    """{workspace name: root test files running its script scripts[name]}."""
+    code, out, _ = run(["git", "ls-files", "--cached", "--others", "--exclude-standard"], cwd=root)
+    if code != 0:
+        return {}
+    covers: dict[str, list[str]] = {}
+    for rel in out.splitlines():
+        if not _ROOT_TEST_RE.search(rel) or any(part in TREE_EXCLUDES for part in rel.split("/")):
+            continue
+        if ctx.workspace_for(Path(rel)) is not None:
+            continue
+        try:
+            text = (root / rel).read_text(encoding="utf-8", errors="replace")
+        except OSError:
+            continue
+        for ws in ctx.workspaces:
+            if ws["name"] in scripts and _runs_workspace_script(text, ws, scripts[ws["name"]]):
+                covers.setdefault(ws["name"], []).append(rel)
+    return covers
+
+
+def discover_shards(root: Path, scripts: tuple[str, ...] | None = None) -> list[dict]:
+    """[{"name", "kind", "cwd", "rel", "script", "command", "runner"}] for the root and every workspace with tests.
+
+    scripts overrides the script names tried (e.g. ("test:unit",) for a category). The root
+    shard also has "covers": {workspace name: [root test files]} for the workspaces it runs
+    the tests of, which get no shard.
+    """
+    ctx = ProjectContext.get(root)
+    root_script = next((s for s in (scripts or ("test",)) if s in ctx.scripts), None)
+    ws_scripts = {}
+    for ws in ctx.workspaces:
+        script = next((s for s in (scripts or WORKSPACE_TEST_SCRIPTS) if s in ws["scripts"]), None)
+        if script is not None:
+            ws_scripts[ws["name"]] = script
+    covers = _root_covers(root, ctx, ws_scripts) if root_script and ws_scripts else {}
+    shards = []
+    if root_script:
+        shards.append({
+            "name": ROOT_SHARD,
+            "kind": "root",
+            "cwd": root,
+            "rel": ".",
+            "script": root_script,
+            "command": ctx.scripts[root_script],
+            "runner": ctx.test_runner,
+            "covers": covers,
+        })
+    for ws in ctx.workspaces:
+        script = ws_scripts.get(ws["name"])
+        if script is None or ws["name"] in covers:
+            continue
+        shards.append({
+            "name": ws["name"],
+            "kind": "workspace",
+            "cwd": ws["dir"],
+            "rel": ws["rel"],
+            "script": script,
+            "command": ws["scripts"][script],
+            "runner": ws["test_runner"],
+        })
+    return shards
+
+
+# Runners whose CLI takes test file filters after the script's own arguments
+FILTERING_RUNNERS = ("vitest", "jest")
+
+
+def _anchored(alternatives) -> str:
+    return "^(?:" + "|".join(re.escape(a) for a in alternatives) + ")$"
+
+
+def _name_filter(runner: str | None, names: list[str]) -> list[str]:
+    """Runner flags selecting tests by their " > "-joined full names."""
+    # vitest/jest -t and mocha --grep match the full name joined by spaces
+    spaced = [n.replace(" > ", " ") for n in names]
+    if runner in FILTERING_RUNNERS:
+        return ["-t", _anchored(spaced)]
+    if runner == "mocha":
+        return ["--grep", _anchored(spaced)]
+    if runner == "node-test-runner":
+        # node matches each level separately and skips the children of a non-matching test
+        parts = sorted({p for n in names for p in n.split(" > ")})
+        return [f"--test-name-pattern={_anchored(parts)}"]
+    return []
+
+
+def shard_cmd(root: Path, shard: dict, extra_args: list[str] | None = None) -> list[str]:
+    """The shard's script, narrowed to shard["files"] (and shard["names"]) when set and the runner allows it."""
+    files = shard.get("files")
+    names = shard.get("names")
+    if files and shard["runner"] == "node-test-runner":
+        # The script's own glob would still match everything; call the runner directly
+        name_args = _name_filter(shard["runner"], names) if names else []
+        return ["node", "--test", *(extra_args or []), *name_args, *files]
+    if files and shard["runner"] in FILTERING_RUNNERS:
+        extra_args = [*(extra_args or []), *files]
+    if names and shard["runner"] in (*FILTERING_RUNNERS, "mocha"):
+        extra_args = [*(extra_args or []), *_name_filter(shard["runner"], names)]
+    manager = ProjectContext.get(root).package_manager
+    return package_script_cmd(root, shard["script"], extra_args, manager=manager)
+
+
+def narrow(shard: dict, files: list[str] | None, names: list[str] | None = None) -> dict:
+    """Copy of shard limited to files (relative to its cwd) and test names; None keeps the whole shard."""
+    return {**shard, "files": files, "names": names}
+
+
+def default_jobs() -> int:
+    return os.cpu_count() or 2
+
+
+def shard_job(root: Path, shard: dict, opts: dict, extra_args: list[str] | None = None) -> dict:
+    """arun_ex() keyword arguments for one shard."""
+    return {"cmd": shard_cmd(root, shard, extra_args), "cwd": shard["cwd"], **opts}
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""Per-test history: every structured test run appends its results to
+.codex/timings/tests.jsonl (rotated like the tool logs), and slowest()
+ranks tests by their mean duration across that history. The tests still
+failing as of the latest runs are kept in .codex/timings/last_failed.json
+for --failed-first/--only-failed.
+
+Tests that failed and then passed on a --rerun-failed rerun are flaky; their
+history lives in .codex/timings/flaky.json. QUARANTINE_AFTER flaky runs put a
+test in quarantine, RELEASE_AFTER consecutive clean runs take it out again.
+"""
+from pathlib import Path
+
+from _logs import get_log, iter_jsonl
+from _utils import ensure_codex_dir, read_json, timestamp, write_json
+
+
+STORE_FILE = "tests.jsonl"
+LAST_FAILED_FILE = "last_failed.json"
+FLAKY_FILE = "flaky.json"
+QUARANTINE_AFTER = 2
+RELEASE_AFTER = 20
+
+
+def store_path(root: Path) -> Path:
+    return ensure_codex_dir(root) / "timings" / STORE_FILE
+
+
+def record(root: Path, tests: list[dict]) -> None:
+    """Append one record per test ({"ts", "id", "shard", "status", "duration_ms"})."""
+    log = get_log(store_path(root))
+    ts = timestamp()
+    for t in tests:
+        log.write({"ts": ts, "id": t["id"], "shard": t.get("shard"), "status": t["status"], "duration_ms": t["duration_ms"]})
+    log.flush()
+
+
+def _last_failed_path(root: Path) -> Path:
+    return ensure_codex_dir(root) / "timings" / LAST_FAILED_FILE
+
+
+def last_failed(root: Path) -> list[dict]:
+    """[{"id", "file", "name", "shard", "ts"}] of the tests that failed and haven't passed since."""
+    return read_json(_last_failed_path(root), {}).get("tests", [])
+
+
+def update_last_failed(root: Path, tests: list[dict]) -> None:
+    """Remember this run's failures; forget those that passed. Tests this run didn't execute keep their state."""
+    current = {t["id"]: t for t in last_failed(root)}
+    ts = timestamp()
+    for t in tests:
+        if t["status"] == "failed":
+            current[t["id"]] = {"id": t["id"], "file": t["file"], "name": t["name"], "shard": t.get("shard"), "ts": ts}
+        elif t["status"] == "passed":
+            current.pop(t["id"], None)
+            # A passing test proves its file loads again
+            if t["file"] and current.get(t["file"], {}).get("name") == "":
+                current.pop(t["file"])
+    write_json(_last_failed_path(root), {"updated": ts, "tests": list(current.values())})
+
+
+def _flaky_path(root: Path) -> Path:
+    return ensure_codex_dir(root) / "timings" / FLAKY_FILE
+
+
+def flaky_state(root: Path) -> dict[str, dict]:
+    """{id: {"id", "file", "name", "shard", "flaky", "clean", "quarantined", "last_flaky"}}."""
+    return read_json(_flaky_path(root), {}).get("tests", {})
+
+
+def quarantined(root: Path) -> list[str]:
+    return sorted(i for i, e in flaky_state(root).items() if e["quarantined"])
+
+
+def update_flaky(root: Path, tests: list[dict], flaky: set[str]) -> None:
+    """Fold one run into the flaky history: flaky holds the ids that failed and then passed on a rerun.
+
+    A clean pass (first attempt) counts towards release; a test with no flaky
+    history left once it is released (or never quarantined) is dropped.
+    """
+    state = flaky_state(root)
+    ts = timestamp()
+    for t in tests:
+        entry = state.get(t["id"])
+        if t["id"] in flaky:
+            if entry is None:
+                entry = state[t["id"]] = {
+                    "id": t["id"], "file": t["file"], "name": t["name"], "shard": t.get("shard"),
+                    "flaky": 0, "clean": 0, "quarantined": False,
+                }
+            entry["flaky"] += 1
+            entry["clean"] = 0
+            entry["last_flaky"] = ts
+            entry["quarantined"] = entry["quarantined"] or entry["flaky"] >= QUARANTINE_AFTER
+        elif entry is None:
+            continue
+        elif t["status"] == "passed":
+            entry["clean"] += 1
+            if entry["clean"] >= RELEASE_AFTER:
+                state.pop(t["id"])
+        elif t["status"] == "failed":
+            entry["clean"] = 0
+    write_json(_flaky_path(root), {"updated": ts, "tests": state})
+
+
+def slowest(root: Path, n: int) -> list[dict]:
+    """The n tests with the highest mean duration: [{"id", "shard", "runs", "failures", "mean_ms", "max_ms", "last_ms", "last_ts"}]."""
+    stats: dict[str, dict] = {}
+    for rec in iter_jsonl(store_path(root)):
+        dur = rec.get("duration_ms")
+        if rec.get("status") == "skipped" or not isinstance(dur, (int, float)):
+            continue
+        s = stats.setdefault(rec["id"], {"id": rec["id"], "shard": rec.get("shard"), "runs": 0, "failures": 0, "total_ms": 0.0, "max_ms": 0.0})
+        s["runs"] += 1
+        s["failures"] += rec.get("status") == "failed"
+        s["total_ms"] += dur
+        s["max_ms"] = max(s["max_ms"], dur)
+        s["last_ms"] = dur
+        s["last_ts"] = rec.get("ts")
+    ranked = []
+    for s in stats.values():
+        s["mean_ms"] = round(s.pop("total_ms") / s["runs"], 3)
+        ranked.append(s)
+    ranked.sort(key=lambda s: s["mean_ms"], reverse=True)
+    return ranked[:n]
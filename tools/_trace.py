@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""Span tracing for the orchestrator, exported as Chrome trace-event JSON.
+
+span() times a block and records it as a complete ("X") event with its
+attributes; spans nest through a context variable, so they follow threads
+started with a copied context and asyncio tasks. Chrome/Perfetto nest
+events by time within a track (tid), so a span starting while a sibling is
+still open (parallel tasks, concurrent processes) gets a track of its own,
+named after it.
+
+Tracing is off unless start() was called (agent.py --trace) or CODEX_TRACE
+is set for the process; the events are written when the process exits to
+.codex/traces/trace_<stamp>.json (CODEX_TRACE_DIR overrides the directory),
+which opens in https://ui.perfetto.dev or chrome://tracing.
+"""
+import atexit
+import contextlib
+import contextvars
+import functools
+import inspect
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+from _logs import unique_stem
+
+
+TRACES_DIR = "traces"
+
+_current: contextvars.ContextVar["_Span | None"] = contextvars.ContextVar("codex_trace_span", default=None)
+_lock = threading.Lock()
+_tracer: "_Tracer | None" = None
+_env_checked = False
+
+
+class _Span:
+    __slots__ = ("id", "name", "track", "start_us")
+
+    def __init__(self, id: int, name: str, track: int, start_us: int):
+        self.id = id
+        self.name = name
+        self.track = track
+        self.start_us = start_us
+
+
+class _Tracer:
+    def __init__(self, out_dir: Path | None):
+        self.out_dir = out_dir
+        self.origin = time.perf_counter_ns()
+        self.events: list[dict] = []
+        # Open spans per track, innermost last
+        self.tracks: dict[int, list[int]] = {}
+        self.ids = itertools.count(1)
+        self.track_ids = itertools.count(1)
+
+    def now_us(self) -> int:
+        return (time.perf_counter_ns() - self.origin) // 1000
+
+
+def _enabled_by_env() -> bool:
+    return (os.getenv("CODEX_TRACE") or "").strip().lower() in ("1", "true", "yes", "on")
+
+
+def start(out_dir: Path | None = None) -> None:
+    """Record spans from now on and write them at exit (to out_dir, else the repo's .codex/traces)."""
+    global _tracer
+    with _lock:
+        if _tracer is None:
+            _tracer = _Tracer(out_dir)
+            atexit.register(write)
+
+
+def enabled() -> bool:
+    global _env_checked
+    if _tracer is None and not _env_checked:
+        _env_checked = True
+        if _enabled_by_env():
+            start()
+    return _tracer is not None
+
+
+@contextlib.contextmanager
+def span(name: str, cat: str = "agent", **attrs):
+    """Time the block as a span; yields its attribute dict, which can be added to until it ends."""
+    if not enabled():
+        yield attrs
+        return
+    tracer = _tracer
+    parent = _current.get()
+    with _lock:
+        sp = _Span(next(tracer.ids), name, 0, tracer.now_us())
+        stack = tracer.tracks.get(parent.track) if parent is not None else None
+        if stack and stack[-1] == parent.id:
+            sp.track = parent.track
+        else:
+            sp.track = next(tracer.track_ids)
+            tracer.tracks[sp.track] = []
+            tracer.events.append({"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": sp.track, "args": {"name": name}})
+        tracer.tracks[sp.track].append(sp.id)
+    token = _current.set(sp)
+    try:
+        yield attrs
+    except BaseException as e:
+        attrs.setdefault("error", repr(e))
+        raise
+    finally:
+        _current.reset(token)
+        with _lock:
+            stack = tracer.tracks[sp.track]
+            if sp.id in stack:
+                stack.remove(sp.id)
+            end = tracer.now_us()
+            tracer.events.append({
+                "name": name,
+                "cat": cat,
+                "ph": "X",
+                "ts": sp.start_us,
+                "dur": max(end - sp.start_us, 1),
+                "pid": os.getpid(),
+                "tid": sp.track,
+                "args": {k: v if isinstance(v, (str, int, float, bool)) or v is None else str(v) for k, v in attrs.items()},
+            })
+
+
+def traced(name: str | None = None, cat: str = "agent", args: tuple[str, ...] = ()):
+    """Decorator form of span(): the named arguments and the return value ("result") become attributes."""
+    def wrap(fn):
+        sig = inspect.signature(fn)
+
+        @functools.wraps(fn)
+        def inner(*a, **kw):
+            if not enabled():
+                return fn(*a, **kw)
+            bound = sig.bind(*a, **kw)
+            bound.apply_defaults()
+            with span(name or fn.__name__, cat, **{k: bound.arguments[k] for k in args}) as attrs:
+                res = fn(*a, **kw)
+                attrs["result"] = res
+                return res
+        return inner
+    return wrap
+
+
+def _out_dir() -> Path:
+    if os.getenv("CODEX_TRACE_DIR"):
+        return Path(os.environ["CODEX_TRACE_DIR"])
+    if _tracer is not None and _tracer.out_dir is not None:
+        return _tracer.out_dir
+    from _utils import ensure_codex_dir, find_repo_root
+    return ensure_codex_dir(find_repo_root()) / TRACES_DIR
+
+
+def write() -> Path | None:
+    """Write the spans recorded so far to a new trace file; its path, or None if there is nothing."""
+    with _lock:
+        if _tracer is None or not _tracer.events:
+            return None
+        events = list(_tracer.events)
+        _tracer.events.clear()
+    events.insert(0, {"name": "process_name", "ph": "M", "pid": os.getpid(), "args": {"name": " ".join(Path(a).name for a in sys.argv[:2])}})
+    out = _out_dir()
+    out.mkdir(parents=True, exist_ok=True)
+    path = out / f"{unique_stem('trace')}.json"
+    path.write_text(json.dumps({"traceEvents": events, "displayTimeUnit": "ms"}), encoding="utf-8")
+    print(f"[trace] {len(events)} events written to {path}", file=sys.stderr)
+    return path
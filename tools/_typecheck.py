@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+"""Incremental, per-package TypeScript checking.
+
+Every workspace with a tsconfig.json is checked as its own project with
+`tsc -p <tsconfig> --noEmit --incremental`, keeping its build info in
+.codex/cache/tsc/<package>.tsbuildinfo, so a small edit costs tsc only the
+files it invalidates. Packages are grouped into levels by their workspace
+dependencies (package.json dependencies and tsconfig references) and each
+level runs in parallel; a dependency's errors surface before its
+dependents'. Files of the root project (the `typecheck` script's -p, or
+tsconfig.json) that no package covers - build configs and the like - are
+checked as one more project through a generated tsconfig listing just them.
+
+plan() returns None when the root `typecheck` script is more than a plain
+tsc call; test.py then runs the script as before.
+"""
+import asyncio
+import json
+import os
+import re
+import shlex
+import time
+from pathlib import Path
+
+from _utils import ProjectContext, TREE_EXCLUDES, arun_ex, ensure_codex_dir, run
+
+
+ROOT_UNIT = "root"
+TS_SUFFIXES = (".ts", ".tsx", ".mts", ".cts")
+_DEP_FIELDS = ("dependencies", "devDependencies", "peerDependencies", "optionalDependencies")
+# Flags the units set themselves
+_OWN_FLAGS = ("--noEmit", "--incremental", "-b", "--build")
+_OWN_VALUE_FLAGS = ("-p", "--project", "--tsBuildInfoFile")
+
+
+def cache_dir(root: Path) -> Path:
+    d = ensure_codex_dir(root) / "cache" / "tsc"
+    d.mkdir(parents=True, exist_ok=True)
+    return d
+
+
+def _strip_jsonc(text: str) -> str:
+    """tsconfig files allow comments and trailing commas."""
+    out = []
+    i, n = 0, len(text)
+    while i < n:
+        c = text[i]
+        if c == '"':
+            j = i + 1
+            while j < n and text[j] != '"':
+                j += 2 if text[j] == "\\" else 1
+            out.append(text[i:j + 1])
+            i = j + 1
+        elif text.startswith("//", i):
+            i = text.find("\n", i)
+            i = n if i < 0 else i
+        elif text.startswith("/*", i):
+            i = text.find("*/", i + 2)
+            i = n if i < 0 else i + 2
+        else:
+            out.append(c)
+            i += 1
+    return re.sub(r",(\s*[}\]])", r"\1", "".join(out))
+
+
+def _load(path: Path) -> dict:
+    try:
+        data = json.loads(_strip_jsonc(path.read_text(encoding="utf-8")))
+    except (OSError, json.JSONDecodeError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def read_tsconfig(path: Path, root: Path) -> dict:
+    """{"path", "compilerOptions", "include", "files", "exclude", "references"} with relative extends applied.
+
+    include/files/exclude come back root-relative, resolved against the config that set them;
+    references are absolute tsconfig paths.
+    """
+    merged = {"path": path, "compilerOptions": {}, "include": None, "files": None, "exclude": None, "references": []}
+    seen: set[Path] = set()
+    cur: Path | None = path
+    while cur is not None and cur not in seen and cur.is_file():
+        seen.add(cur)
+        data = _load(cur)
+        merged["compilerOptions"] = {**(data.get("compilerOptions") or {}), **merged["compilerOptions"]}
+        for key in ("include", "files", "exclude"):
+            if merged[key] is None and isinstance(data.get(key), list):
+                merged[key] = [_root_rel(cur.parent / p, root) for p in data[key] if isinstance(p, str)]
+        if cur == path:
+            for ref in data.get("references") or []:
+                target = cur.parent / (ref.get("path") or "") if isinstance(ref, dict) else None
+                if target is not None:
+                    merged["references"].append(target / "tsconfig.json" if target.is_dir() else target)
+        ext = data.get("extends")
+        # Configs extended by package name (e.g. @tsconfig/node20) only carry compiler options
+        cur = (cur.parent / ext).resolve() if isinstance(ext, str) and ext.startswith(".") else None
+        if cur is not None and cur.suffix != ".json":
+            cur = cur.with_name(cur.name + ".json")
+    return merged
+
+
+def _root_rel(path: Path, root: Path) -> str:
+    return os.path.relpath(os.path.normpath(path), root).replace(os.sep, "/")
+
+
+def _pattern_re(pattern: str) -> re.Pattern:
+    last = pattern.rsplit("/", 1)[-1]
+    if not any(c in last for c in "*?") and "." not in last:
+        # A directory means everything below it
+        pattern = pattern.rstrip("/") + "/**/*"
+    out = ""
+    for part in re.split(r"(\*\*/|\*|\?)", pattern):
+        if part == "**/":
+            out += "(?:[^/]+/)*"
+        elif part == "*":
+            out += "[^/]*"
+        elif part == "?":
+            out += "[^/]"
+        else:
+            out += re.escape(part)
+    return re.compile(out + "$")
+
+
+def _covers(cfg: dict, root: Path):
+    """Predicate: does the project include this root-relative TypeScript file?"""
+    cfg_dir = _root_rel(cfg["path"].parent, root)
+    files = set(cfg["files"] or ())
+    include = cfg["include"]
+    if include is None:
+        include = [] if files else [f"{cfg_dir}/**/*" if cfg_dir != "." else "**/*"]
+    inc = [_pattern_re(p) for p in include]
+    exc = [_pattern_re(p) for p in cfg["exclude"] or ()]
+    return lambda rel: rel in files or (any(r.match(rel) for r in inc) and not any(r.match(rel) for r in exc))
+
+
+def _ts_files(root: Path) -> list[str]:
+    code, out, _ = run(["git", "ls-files", "--cached", "--others", "--exclude-standard", "-z"], cwd=root)
+    if code != 0:
+        return []
+    return [
+        rel for rel in out.split("\0")
+        if rel.endswith(TS_SUFFIXES) and not any(p in TREE_EXCLUDES for p in rel.split("/")) and (root / rel).is_file()
+    ]
+
+
+def _script_project(root: Path) -> tuple[Path | None, list[str]] | None:
+    """(root project, extra tsc flags) from the `typecheck` script; None if it isn't a plain tsc call."""
+    ctx = ProjectContext.get(root)
+    script = ctx.scripts.get("typecheck")
+    if script is None:
+        return (root / "tsconfig.json" if (root / "tsconfig.json").is_file() else None), []
+    if any(op in script for op in ("&&", "||", ";", "|", ">")):
+        return None
+    try:
+        words = shlex.split(script)
+    except ValueError:
+        return None
+    if words[:1] == ["npx"]:
+        words = words[1:]
+    if not words or words[0] != "tsc":
+        return None
+    project, extra = root / "tsconfig.json", []
+    it = iter(words[1:])
+    for word in it:
+        if word in _OWN_VALUE_FLAGS:
+            value = next(it, "")
+            if word != "--tsBuildInfoFile":
+                project = root / value
+        elif word.startswith(("--project=", "-p=")):
+            project = root / word.split("=", 1)[1]
+        elif word not in _OWN_FLAGS:
+            extra.append(word)
+    if project.is_dir():
+        project = project / "tsconfig.json"
+    return (project if project.is_file() else None), extra
+
+
+def tsc_cmd(root: Path) -> list[str]:
+    local = root / "node_modules" / ".bin" / "tsc"
+    return [str(local)] if local.exists() else ["npx", "tsc"]
+
+
+def _slug(name: str) -> str:
+    return re.sub(r"[^A-Za-z0-9._-]+", "_", name.lstrip("@")) or "package"
+
+
+def _levels(units: list[dict]) -> None:
+    """Set unit["level"]: 0 without workspace dependencies, else one past its deepest dependency."""
+    by_name = {u["name"]: u for u in units}
+    done: dict[str, int] = {}
+    remaining = list(units)
+    while remaining:
+        ready = [u for u in remaining if all(d in done or d not in by_name for d in u["deps"])]
+        if not ready:
+            # A dependency cycle: check the rest together
+            ready = remaining
+        for u in ready:
+            u["level"] = max((done[d] + 1 for d in u["deps"] if d in done), default=0)
+        for u in ready:
+            done[u["name"]] = u["level"]
+        remaining = [u for u in remaining if u not in ready]
+
+
+def _write_if_changed(path: Path, text: str) -> None:
+    try:
+        if path.read_text(encoding="utf-8") == text:
+            return
+    except OSError:
+        pass
+    path.write_text(text, encoding="utf-8")
+
+
+def plan(root: Path) -> list[dict] | None:
+    """[{"name", "tsconfig", "deps", "level", "buildinfo", "cmd", "cwd"}] in level order; None to use the script.
+
+    The root unit (name ROOT_UNIT) depends on every package and only exists when the root
+    project holds files no package does.
+    """
+    found = _script_project(root)
+    if found is None:
+        return None
+    root_cfg_path, extra = found
+    ctx = ProjectContext.get(root)
+    names = {ws["name"] for ws in ctx.workspaces}
+    by_dir = {(ws["dir"] / "tsconfig.json").resolve(): ws["name"] for ws in ctx.workspaces}
+    units: list[dict] = []
+    covered = []
+    for ws in ctx.workspaces:
+        tsconfig = ws["dir"] / "tsconfig.json"
+        if not tsconfig.is_file():
+            continue
+        cfg = read_tsconfig(tsconfig, root)
+        pkg = ws["package_json"]
+        deps = {d for f in _DEP_FIELDS for d in (pkg.get(f) or {}) if d in names and d != ws["name"]}
+        deps |= {by_dir[r.resolve()] for r in cfg["references"] if r.resolve() in by_dir}
+        units.append({"name": ws["name"], "tsconfig": tsconfig, "cwd": ws["dir"], "deps": sorted(deps), "options": cfg["compilerOptions"]})
+        covered.append(_covers(cfg, root))
+    if root_cfg_path is not None:
+        root_cfg = read_tsconfig(root_cfg_path, root)
+        if not units:
+            units.append({"name": ROOT_UNIT, "tsconfig": root_cfg_path, "cwd": root, "deps": [], "options": root_cfg["compilerOptions"]})
+        else:
+            in_root = _covers(root_cfg, root)
+            rest = [rel for rel in _ts_files(root) if in_root(rel) and not any(c(rel) for c in covered)]
+            if rest:
+                generated = cache_dir(root) / f"{ROOT_UNIT}.tsconfig.json"
+                _write_if_changed(generated, json.dumps({
+                    "extends": str(root_cfg_path.resolve()),
+                    "files": [str((root / rel).resolve()) for rel in sorted(rest)],
+                    "include": [],
+                }, indent=2) + "\n")
+                units.append({
+                    "name": ROOT_UNIT, "tsconfig": generated, "cwd": root,
+                    "deps": sorted(u["name"] for u in units), "options": root_cfg["compilerOptions"],
+                })
+    if not units:
+        return None
+    _levels(units)
+    base = tsc_cmd(root)
+    for u in units:
+        u["buildinfo"] = cache_dir(root) / f"{_slug(u['name'])}.tsbuildinfo"
+        cmd = [*base, "-p", str(u["tsconfig"]), "--noEmit", "--incremental", "--tsBuildInfoFile", str(u["buildinfo"])]
+        if u.pop("options").get("composite"):
+            # composite requires emitting declarations
+            cmd += ["--composite", "false"]
+        u["cmd"] = [*cmd, *extra]
+    units.sort(key=lambda u: (u["level"], u["name"]))
+    return units
+
+
+async def arun(units: list[dict], opts: dict, max_parallel: int | None = None, fail_fast: bool = False) -> dict:
+    """Check the units level by level, each level's units concurrently; one combined arun_ex()-shaped result.
+
+    result["units"] holds per-unit {"name", "level", "code", "duration_sec"} (code None: not run).
+    With fail_fast, levels after a failing one are not started.
+    """
+    sem = asyncio.Semaphore(max_parallel) if max_parallel else None
+    started = time.monotonic()
+    results: dict[str, dict] = {}
+
+    async def one(u: dict) -> dict:
+        if sem is None:
+            return await arun_ex(u["cmd"], cwd=u["cwd"], **opts)
+        async with sem:
+            return await arun_ex(u["cmd"], cwd=u["cwd"], **opts)
+
+    levels = sorted({u["level"] for u in units})
+    for level in levels:
+        batch = [u for u in units if u["level"] == level]
+        for u, res in zip(batch, await asyncio.gather(*(one(u) for u in batch))):
+            results[u["name"]] = res
+        if fail_fast and any(r["code"] != 0 for r in results.values()):
+            break
+
+    out, err = [], []
+    for u in units:
+        r = results.get(u["name"])
+        if r is None:
+            continue
+        header = f"==> {u['name']} (exit {r['code']}) <==\n"
+        if r.get("stdout"):
+            out.append(header + r["stdout"])
+        if r.get("stderr"):
+            err.append(header + r["stderr"])
+    codes = [r["code"] for r in results.values()]
+    return {
+        "cmd": [u["cmd"] for u in units],
+        "code": next((c for c in codes if c != 0), 0),
+        "stdout": "".join(out),
+        "stderr": "".join(err),
+        "duration_sec": round(time.monotonic() - started, 3),
+        "stdout_truncated": any(r.get("stdout_truncated") for r in results.values()),
+        "stderr_truncated": any(r.get("stderr_truncated") for r in results.values()),
+        "units": [
+            {
+                "name": u["name"],
+                "level": u["level"],
+                "code": results[u["name"]]["code"] if u["name"] in results else None,
+                "duration_sec": results[u["name"]].get("duration_sec") if u["name"] in results else None,
+            }
+            for u in units
+        ],
+    }
@@ -1,15 +1,24 @@
 #!/usr/bin/env python3
 import argparse
+import asyncio
+import codecs
+import contextlib
+import contextvars
+import io
 import json
 import os
 import re
 import shutil
 import subprocess
 import sys
+import threading
 import time
+from collections import deque
 from pathlib import Path
-from threading import Thread
-from queue import Queue, Empty
+from typing import Iterator
+
+from _logs import get_log, prune, unique_stem, write_report
+import _trace
 
 
 def timestamp() -> str:
@@ -24,15 +33,49 @@ def _parse_bool_env(name: str, default: bool = False) -> bool:
     return val in ("1", "true", "yes", "on")
 
 
+# Set by in-process tool dispatch so a tool's find_repo_root() sees the caller's repo
+_root_override: contextvars.ContextVar[Path | None] = contextvars.ContextVar("codex_root_override", default=None)
+
+
+@contextlib.contextmanager
+def repo_root_override(root: Path):
+    token = _root_override.set(root)
+    try:
+        yield root
+    finally:
+        _root_override.reset(token)
+
+
+_root_cache: dict[str, Path] = {}
+
+
+def _is_repo_root(path: Path) -> bool:
+    return (path / ".git").exists() or (path / "package.json").exists()
+
+
 def find_repo_root(start: Path | None = None) -> Path:
-    """Ascend from start to locate repo root by .git or package.json; fallback to cwd."""
+    """Ascend from start to locate repo root by .git or package.json; fallback to cwd.
+
+    Memoized per resolved start path (a relative one means something else after a
+    chdir); a cached answer is reused while its marker still exists.
+    """
     if start is None:
+        override = _root_override.get()
+        if override is not None:
+            return override
         start = Path.cwd()
     cur = start.resolve()
+    key = str(cur)
+    cached = _root_cache.get(key)
+    if cached is not None and _is_repo_root(cached):
+        return cached
+    root = cur
     for parent in [cur] + list(cur.parents):
-        if (parent / ".git").exists() or (parent / "package.json").exists():
-            return parent
-    return cur
+        if _is_repo_root(parent):
+            root = parent
+            break
+    _root_cache[key] = root
+    return root
 
 
 def ensure_codex_dir(root: Path) -> Path:
@@ -48,23 +91,269 @@ def _log_dir(root: Path) -> Path:
 
 
 def _jsonl_write(path: Path, obj: dict) -> None:
-    path.parent.mkdir(parents=True, exist_ok=True)
-    with path.open("a", encoding="utf-8") as f:
-        f.write(json.dumps(obj, ensure_ascii=False) + "\n")
+    # Buffered and rotated; see _logs.JsonlLog
+    get_log(path).write(obj)
+
+
+_READ_CHUNK = 65536
+_POLL_MAX_SEC = 0.05
+
+
+class _Pipe:
+    """Non-blocking reader for one child pipe that yields complete lines."""
+
+    def __init__(self, tag: str, fd: int, capture: "_Capture"):
+        self.tag = tag
+        self.fd = fd
+        self.eof = False
+        self.capture = capture
+        # Same newline translation as text-mode pipes (\r\n and \r -> \n)
+        self._decoder = io.IncrementalNewlineDecoder(
+            codecs.getincrementaldecoder("utf-8")(errors="replace"), translate=True
+        )
+        self._pending = ""
+
+    def read(self) -> list[str] | None:
+        """Read what is available; returns new lines, or None if nothing was ready."""
+        try:
+            data = os.read(self.fd, _READ_CHUNK)
+        except BlockingIOError:
+            return None
+        except OSError:
+            data = b""
+        if not data:
+            self.eof = True
+            return self._split(self._decoder.decode(b"", final=True), final=True)
+        return self._split(self._decoder.decode(data), final=False)
+
+    def _split(self, text: str, final: bool) -> list[str]:
+        *lines, rest = (self._pending + text).split("\n")
+        lines = [line + "\n" for line in lines]
+        limit = self.capture.limit
+        if rest and (final or (limit is not None and len(rest) > limit)):
+            # A line never ending (\r progress bars, minified bundles) mustn't grow unbounded
+            lines.append(rest)
+            rest = ""
+        self._pending = rest
+        return lines
+
+
+class _Capture:
+    """Output sink for one stream.
+
+    Unlimited (limit=None) keeps every line in memory. With a limit, only a
+    ring-buffer tail of about `limit` characters stays in memory; once the
+    output outgrows it, the full stream is written to `spill_path` instead.
+    """
+
+    def __init__(self, limit: int | None, spill_path: Path | None):
+        self.limit = limit
+        self.spill_path = spill_path
+        self.total = 0
+        self.truncated = False
+        self.spilled = False
+        self._lines: deque[str] = deque()
+        self._size = 0
+        self._fh = None
+
+    def add(self, lines: list[str]) -> None:
+        for line in lines:
+            self.total += len(line)
+            self._lines.append(line)
+            self._size += len(line)
+            if self._fh is not None:
+                self._fh.write(line)
+        if self.limit is None or self._size <= self.limit:
+            return
+        if self._fh is None and self.spill_path is not None:
+            # First overflow: everything so far is still buffered, so the file gets it all
+            self.spill_path.parent.mkdir(parents=True, exist_ok=True)
+            self._fh = self.spill_path.open("w", encoding="utf-8")
+            self._fh.writelines(self._lines)
+            self.spilled = True
+        self.truncated = True
+        while self._size > self.limit and len(self._lines) > 1:
+            self._size -= len(self._lines.popleft())
+        if self._size > self.limit:
+            line = self._lines.pop()[-self.limit:]
+            self._lines.append(line)
+            self._size = len(line)
 
+    def text(self) -> str:
+        return "".join(self._lines)
 
-def _reader_thread(stream, q: Queue, tag: str):
+    def close(self) -> None:
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+
+
+def _resolve_capture_limit(capture_limit: int | None) -> int | None:
+    if capture_limit is None:
+        c_env = os.getenv("CODEX_CAPTURE_LIMIT")
+        capture_limit = int(c_env) if c_env else None
+    if capture_limit is not None and capture_limit <= 0:
+        return None
+    return capture_limit
+
+
+def _resolve_timeouts(timeout_sec: float | None, idle_timeout_sec: float | None) -> tuple[float | None, float | None]:
+    if timeout_sec is None:
+        t_env = os.getenv("CODEX_CMD_TIMEOUT_SEC")
+        timeout_sec = float(t_env) if t_env else None
+    if idle_timeout_sec is None:
+        it_env = os.getenv("CODEX_IDLE_TIMEOUT_SEC")
+        idle_timeout_sec = float(it_env) if it_env else None
+    return timeout_sec, idle_timeout_sec
+
+
+def _try_reap(proc: subprocess.Popen) -> bool:
+    """Non-blocking reap of the child; sets proc.returncode (and proc.rusage) when it has exited."""
+    if proc.returncode is not None:
+        return True
     try:
-        for line in iter(stream.readline, ""):
-            q.put((tag, line))
-    finally:
+        pid, status, usage = os.wait4(proc.pid, os.WNOHANG)
+    except ChildProcessError:
+        # Already reaped elsewhere; the exit status is lost
+        proc.returncode = -1
+        return True
+    if pid == 0:
+        return False
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    # wait4 usage covers the child plus every descendant it reaped (npm -> node -> tsc)
+    proc.rusage = usage
+    return True
+
+
+_PAGE_KB = os.sysconf("SC_PAGE_SIZE") // 1024 if hasattr(os, "sysconf") else 4
+# Last /proc scan (monotonic time, ppid -> children, pid -> rss pages), shared by all running samplers
+_proc_table_lock = threading.Lock()
+_proc_table_last: tuple[float, dict[int, list[int]], dict[int, int]] | None = None
+
+
+def _scan_proc() -> tuple[dict[int, list[int]], dict[int, int]] | None:
+    children: dict[int, list[int]] = {}
+    rss: dict[int, int] = {}
+    try:
+        entries = os.listdir("/proc")
+    except OSError:
+        return None
+    for name in entries:
+        if not name.isdigit():
+            continue
         try:
-            stream.close()
-        except Exception:
-            pass
+            with open(f"/proc/{name}/stat", "rb") as f:
+                data = f.read()
+        except OSError:
+            continue
+        # Fields after "(comm)": state ppid ... rss is field 24 overall
+        fields = data[data.rindex(b")") + 2:].split()
+        pid = int(name)
+        children.setdefault(int(fields[1]), []).append(pid)
+        rss[pid] = int(fields[21])
+    return children, rss
 
 
-def run(
+def _proc_table(root_pid: int, max_age: float) -> tuple[dict[int, list[int]], dict[int, int]] | None:
+    """The /proc process table, reusing a scan younger than max_age that already has root_pid."""
+    global _proc_table_last
+    with _proc_table_lock:
+        last = _proc_table_last
+        if last is not None and time.monotonic() - last[0] < max_age and root_pid in last[2]:
+            return last[1], last[2]
+        scanned = _scan_proc()
+        if scanned is not None:
+            _proc_table_last = (time.monotonic(), *scanned)
+        return scanned
+
+
+def _proc_tree_sample(root_pid: int, max_age: float = 0.0) -> tuple[int, int] | None:
+    """Current (rss_kb, process_count) of root_pid and its live descendants, from /proc.
+
+    Concurrent runs share a scan up to max_age seconds old instead of each listing /proc.
+    """
+    table = _proc_table(root_pid, max_age)
+    if table is None:
+        return None
+    children, rss = table
+    if root_pid not in rss:
+        return None
+    total = 0
+    count = 0
+    stack = [root_pid]
+    while stack:
+        pid = stack.pop()
+        total += rss.get(pid, 0)
+        count += 1
+        stack.extend(children.get(pid, ()))
+    return total * _PAGE_KB, count
+
+
+async def _sample_tree(proc: subprocess.Popen, peak: dict, interval: float) -> None:
+    """Track the peak RSS / process count of the child's tree until cancelled."""
+    if not os.path.isdir("/proc"):
+        return
+    while True:
+        await asyncio.sleep(interval)
+        # Off the loop: a /proc walk on a busy host would hold up the pipes and heartbeats
+        sample = await asyncio.to_thread(_proc_tree_sample, proc.pid, interval)
+        if sample is None:
+            return
+        peak["tree_peak_rss_kb"] = max(peak.get("tree_peak_rss_kb", 0), sample[0])
+        peak["tree_peak_procs"] = max(peak.get("tree_peak_procs", 0), sample[1])
+
+
+def _resource_summary(proc: subprocess.Popen, peak: dict, duration: float) -> dict | None:
+    usage = getattr(proc, "rusage", None)
+    if usage is None:
+        return None
+    # ru_maxrss (largest single process; floored by our own RSS at fork) is KiB on Linux, bytes on macOS
+    max_rss_kb = usage.ru_maxrss // 1024 if sys.platform == "darwin" else usage.ru_maxrss
+    cpu = usage.ru_utime + usage.ru_stime
+    return {
+        "user_cpu_sec": round(usage.ru_utime, 3),
+        "sys_cpu_sec": round(usage.ru_stime, 3),
+        "cpu_util": round(cpu / duration, 3) if duration > 0 else None,
+        "max_rss_kb": max_rss_kb,
+        "tree_peak_rss_kb": peak.get("tree_peak_rss_kb"),
+        "tree_peak_procs": peak.get("tree_peak_procs"),
+        "major_faults": usage.ru_majflt,
+        "vol_ctx_switches": usage.ru_nvcsw,
+        "invol_ctx_switches": usage.ru_nivcsw,
+        "in_blocks": usage.ru_inblock,
+        "out_blocks": usage.ru_oublock,
+    }
+
+
+async def _wait_exit(proc: subprocess.Popen) -> None:
+    """Wait for the child to exit without a helper thread (pidfd, else backoff polling)."""
+    if _try_reap(proc):
+        return
+    loop = asyncio.get_running_loop()
+    pidfd = None
+    if hasattr(os, "pidfd_open"):
+        try:
+            pidfd = os.pidfd_open(proc.pid)
+        except OSError:
+            pidfd = None
+    if pidfd is not None:
+        exited = loop.create_future()
+        loop.add_reader(pidfd, lambda: exited.done() or exited.set_result(None))
+        try:
+            while not _try_reap(proc):
+                await exited
+                exited = loop.create_future()
+        finally:
+            loop.remove_reader(pidfd)
+            os.close(pidfd)
+        return
+    delay = 0.001
+    while not _try_reap(proc):
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, _POLL_MAX_SEC)
+
+
+async def arun_ex(
     cmd: list[str],
     cwd: Path | None = None,
     *,
@@ -72,39 +361,80 @@ def run(
     idle_timeout_sec: float | None = None,
     verbose: bool | None = None,
     env: dict | None = None,
-) -> tuple[int, str, str]:
-    """Run a subprocess with logging, optional timeouts, and captured output.
+    capture_limit: int | None = None,
+    on_event=None,
+    heartbeat_sec: float | None = None,
+) -> dict:
+    """Event-driven subprocess runner; the core behind run()/run_ex()/arun().
 
-    Backward-compatible return: (code, stdout, stderr).
-    Environment configuration (defaults if args not provided):
-    - CODEX_VERBOSE: enable live echo and command banners.
-    - CODEX_CMD_TIMEOUT_SEC: overall timeout (seconds).
-    - CODEX_IDLE_TIMEOUT_SEC: no-output idle timeout (seconds).
-    - CODEX_LOG_DIR: custom log directory; defaults to .codex/logs.
+    Child pipes are registered on the running event loop's selector and the
+    exit is observed through a pidfd, so one thread can supervise many
+    children. Cancelling the coroutine kills and reaps the child.
+
+    capture_limit (or CODEX_CAPTURE_LIMIT) bounds the in-memory output per
+    stream: stdout/stderr then hold only the tail, and the full output is
+    spilled to .codex/logs/run_*.{stdout,stderr}.log (see *_path keys). Only
+    the newest CODEX_SPILL_KEEP (default 40) of those files are kept.
+
+    on_event(event) is called as things happen with dicts whose "event" is
+    "start", "line" (one per output line, with "stream"), "heartbeat"
+    (every heartbeat_sec without other events) or "end" (the result minus
+    stdout/stderr). Every event carries "t", seconds since start.
+
+    With tracing on (see _trace.py) every call is a "proc" span.
     """
+    with _trace.span(Path(cmd[0]).name if cmd else "run", cat="proc", cmd=" ".join(cmd)[:500], cwd=str(cwd or Path.cwd())) as attrs:
+        res = await _arun_ex(
+            cmd,
+            cwd=cwd,
+            timeout_sec=timeout_sec,
+            idle_timeout_sec=idle_timeout_sec,
+            verbose=verbose,
+            env=env,
+            capture_limit=capture_limit,
+            on_event=on_event,
+            heartbeat_sec=heartbeat_sec,
+        )
+        attrs["code"] = res["code"]
+        if res.get("timed_out") or res.get("idle_timed_out"):
+            attrs["timed_out"] = True
+        return res
+
+
+async def _arun_ex(
+    cmd: list[str],
+    cwd: Path | None = None,
+    *,
+    timeout_sec: float | None = None,
+    idle_timeout_sec: float | None = None,
+    verbose: bool | None = None,
+    env: dict | None = None,
+    capture_limit: int | None = None,
+    on_event=None,
+    heartbeat_sec: float | None = None,
+) -> dict:
+    """arun_ex() minus its trace span."""
     root = find_repo_root(cwd)
     log_dir = Path(os.getenv("CODEX_LOG_DIR") or _log_dir(root))
     tools_log = log_dir / "tools.log"
     started = time.time()
+    started_mono = time.monotonic()
     verbose = _parse_bool_env("CODEX_VERBOSE", False) if verbose is None else verbose
-    if timeout_sec is None:
-        t_env = os.getenv("CODEX_CMD_TIMEOUT_SEC")
-        timeout_sec = float(t_env) if t_env else None
-    if idle_timeout_sec is None:
-        it_env = os.getenv("CODEX_IDLE_TIMEOUT_SEC")
-        idle_timeout_sec = float(it_env) if it_env else None
+    timeout_sec, idle_timeout_sec = _resolve_timeouts(timeout_sec, idle_timeout_sec)
+    capture_limit = _resolve_capture_limit(capture_limit)
+    cwd_str = str(cwd or Path.cwd())
 
     banner = {
         "event": "proc_start",
         "ts": timestamp(),
         "cmd": cmd,
-        "cwd": str(cwd or Path.cwd()),
+        "cwd": cwd_str,
         "timeout_sec": timeout_sec,
         "idle_timeout_sec": idle_timeout_sec,
     }
     _jsonl_write(tools_log, banner)
     if verbose:
-        print(f"[tools.run] $ {' '.join(cmd)} (cwd={banner['cwd']})", file=sys.stderr)
+        print(f"[tools.run] $ {' '.join(cmd)} (cwd={cwd_str})", file=sys.stderr)
 
     try:
         proc = subprocess.Popen(
@@ -112,9 +442,6 @@ def run(
             cwd=str(cwd) if cwd else None,
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
-            text=True,
-            bufsize=1,
-            universal_newlines=True,
             env={**os.environ, **(env or {})},
         )
     except FileNotFoundError as e:
@@ -123,92 +450,153 @@ def run(
             "event": "proc_error",
             "ts": timestamp(),
             "cmd": cmd,
-            "cwd": str(cwd or Path.cwd()),
+            "cwd": cwd_str,
             "error": err,
         })
         if verbose:
             print(f"[tools.run] {err}", file=sys.stderr)
-        return 127, "", err
+        res = {"cmd": cmd, "cwd": cwd_str, "code": 127, "stdout": "", "stderr": err}
+        if on_event is not None:
+            on_event({"event": "start", "t": 0.0, "cmd": cmd, "cwd": cwd_str, "pid": None})
+            on_event({"event": "line", "t": 0.0, "stream": "stderr", "line": err})
+            on_event({"event": "end", "t": 0.0, "cmd": cmd, "cwd": cwd_str, "code": 127})
+        return res
 
-    q: Queue = Queue()
-    t_out = Thread(target=_reader_thread, args=(proc.stdout, q, "stdout"), daemon=True)
-    t_err = Thread(target=_reader_thread, args=(proc.stderr, q, "stderr"), daemon=True)
-    t_out.start(); t_err.start()
-
-    out_parts: list[str] = []
-    err_parts: list[str] = []
-    last_output = time.time()
+    loop = asyncio.get_running_loop()
+    spill_base = unique_stem("run")
+    pipes = [
+        _Pipe(tag, stream.fileno(), _Capture(capture_limit, log_dir / f"{spill_base}.{tag}.log"))
+        for tag, stream in (("stdout", proc.stdout), ("stderr", proc.stderr))
+    ]
+    last_output = time.monotonic()
+    last_event = last_output
     timed_out = False
     idle_timed_out = False
+    cancelled = False
 
-    while True:
-        if proc.poll() is not None:
-            # Drain remaining lines
-            try:
-                while True:
-                    tag, line = q.get_nowait()
-                    if tag == "stdout":
-                        out_parts.append(line)
-                    else:
-                        err_parts.append(line)
-                    last_output = time.time()
-                    if verbose:
-                        stream = sys.stdout if tag == "stdout" else sys.stderr
-                        print(line, end="", file=stream)
-            except Empty:
-                pass
-            break
-        # Read any available lines without blocking too long
-        try:
-            tag, line = q.get(timeout=0.05)
-            if tag == "stdout":
-                out_parts.append(line)
-            else:
-                err_parts.append(line)
-            last_output = time.time()
-            if verbose:
-                stream = sys.stdout if tag == "stdout" else sys.stderr
+    def emit(event: dict) -> None:
+        nonlocal last_event
+        last_event = time.monotonic()
+        on_event({**event, "t": round(last_event - started_mono, 3)})
+
+    def deliver(pipe: _Pipe, lines: list[str]) -> None:
+        pipe.capture.add(lines)
+        if verbose:
+            stream = sys.stdout if pipe.tag == "stdout" else sys.stderr
+            for line in lines:
                 print(line, end="", file=stream)
-        except Empty:
-            pass
+        if on_event is not None:
+            for line in lines:
+                emit({"event": "line", "stream": pipe.tag, "line": line.rstrip("\n")})
 
-        now = time.time()
-        if timeout_sec is not None and (now - started) > timeout_sec:
-            timed_out = True
-            try:
-                proc.kill()
-            except Exception:
-                pass
-            break
-        if idle_timeout_sec is not None and (now - last_output) > idle_timeout_sec:
-            idle_timed_out = True
-            try:
-                proc.kill()
-            except Exception:
-                pass
-            break
+    def consume(pipe: _Pipe) -> None:
+        nonlocal last_output
+        lines = pipe.read()
+        if pipe.eof:
+            loop.remove_reader(pipe.fd)
+        if not lines:
+            return
+        last_output = time.monotonic()
+        deliver(pipe, lines)
 
-    t_out.join(timeout=1)
-    t_err.join(timeout=1)
+    if on_event is not None:
+        emit({"event": "start", "cmd": cmd, "cwd": cwd_str, "pid": proc.pid})
+
+    for p in pipes:
+        os.set_blocking(p.fd, False)
+        loop.add_reader(p.fd, consume, p)
+
+    exit_task = asyncio.ensure_future(_wait_exit(proc))
+    peak: dict = {}
+    sample_sec = float(os.getenv("CODEX_PROC_SAMPLE_SEC") or 0.5)
+    sampler = asyncio.ensure_future(_sample_tree(proc, peak, sample_sec)) if sample_sec > 0 else None
+    try:
+        while not exit_task.done():
+            now = time.monotonic()
+            deadlines = []
+            if timeout_sec is not None:
+                deadlines.append(started_mono + timeout_sec)
+            if idle_timeout_sec is not None:
+                deadlines.append(last_output + idle_timeout_sec)
+            if on_event is not None and heartbeat_sec:
+                if now - last_event >= heartbeat_sec:
+                    emit({"event": "heartbeat", "idle_sec": round(now - last_output, 3), "pid": proc.pid})
+                deadlines.append(last_event + heartbeat_sec)
+            wait = (min(deadlines) - now) if deadlines else None
+            if wait is not None and wait <= 0 and (
+                (timeout_sec is not None and (now - started_mono) > timeout_sec)
+                or (idle_timeout_sec is not None and (now - last_output) > idle_timeout_sec)
+            ):
+                if timeout_sec is not None and (now - started_mono) > timeout_sec:
+                    timed_out = True
+                else:
+                    idle_timed_out = True
+                try:
+                    proc.kill()
+                except Exception:
+                    pass
+                break
+            await asyncio.wait({exit_task}, timeout=max(wait, 0) if wait is not None else None)
+        # Drain whatever the child wrote before exiting; grandchildren that
+        # inherited the pipes must not keep us waiting (same as before).
+        for p in pipes:
+            while not p.eof:
+                lines = p.read()
+                if lines is None:
+                    break
+                deliver(p, lines)
+        if not exit_task.done():
+            await exit_task
+    except BaseException:
+        # Cancelled, or an on_event callback failed: don't leave the child behind
+        cancelled = True
+        try:
+            proc.kill()
+        except Exception:
+            pass
+        _try_reap(proc)
+        raise
+    finally:
+        if not exit_task.done():
+            exit_task.cancel()
+        if sampler is not None:
+            sampler.cancel()
+        for p in pipes:
+            loop.remove_reader(p.fd)
+            p.capture.close()
+        proc.stdout.close()
+        proc.stderr.close()
+        if any(p.capture.spilled for p in pipes):
+            prune(log_dir, "run_*.log", int(os.getenv("CODEX_SPILL_KEEP") or 40))
+        if cancelled:
+            _jsonl_write(tools_log, {
+                "event": "proc_end",
+                "ts": timestamp(),
+                "cmd": cmd,
+                "cwd": cwd_str,
+                "code": None,
+                "duration_sec": time.time() - started,
+                "cancelled": True,
+            })
 
     code = proc.returncode if not (timed_out or idle_timed_out) else 124
-    out = "".join(out_parts)
-    err = "".join(err_parts)
+    out = pipes[0].capture.text()
+    err = pipes[1].capture.text()
     duration = time.time() - started
+    resources = _resource_summary(proc, peak, duration)
 
     hang_info = None
     if timed_out or idle_timed_out:
         hang_info = {
             "type": "timeout" if timed_out else "idle_timeout",
             "duration_sec": duration,
-            "last_output_age_sec": time.time() - last_output,
+            "last_output_age_sec": time.monotonic() - last_output,
             "stdout_tail": out[-2000:],
             "stderr_tail": err[-2000:],
         }
-        hang_path = log_dir / f"hang_{int(started)}.json"
-        _jsonl_write(hang_path, {
+        hang_path = write_report(log_dir, "hang", {
             "cmd": cmd,
-            "cwd": str(cwd or Path.cwd()),
+            "cwd": cwd_str,
             "started": timestamp(),
             "timeout_sec": timeout_sec,
             "idle_timeout_sec": idle_timeout_sec,
@@ -221,14 +609,107 @@ def run(
         "event": "proc_end",
         "ts": timestamp(),
         "cmd": cmd,
-        "cwd": str(cwd or Path.cwd()),
+        "cwd": cwd_str,
         "code": code,
         "duration_sec": duration,
         "timed_out": timed_out,
         "idle_timed_out": idle_timed_out,
+        "resources": resources,
     })
 
-    return code, out, err
+    res = {
+        "cmd": cmd,
+        "cwd": cwd_str,
+        "code": code,
+        "stdout": out,
+        "stderr": err,
+        "duration_sec": duration,
+        "timed_out": timed_out,
+        "idle_timed_out": idle_timed_out,
+        "resources": resources,
+        **{f"{p.tag}_truncated": p.capture.truncated for p in pipes},
+        **{f"{p.tag}_chars": p.capture.total for p in pipes},
+        **{f"{p.tag}_path": str(p.capture.spill_path) if p.capture.spilled else None for p in pipes},
+    }
+    if on_event is not None:
+        emit({"event": "end", **{k: v for k, v in res.items() if k not in ("stdout", "stderr")}})
+    return res
+
+
+async def arun(
+    cmd: list[str],
+    cwd: Path | None = None,
+    *,
+    timeout_sec: float | None = None,
+    idle_timeout_sec: float | None = None,
+    verbose: bool | None = None,
+    env: dict | None = None,
+    capture_limit: int | None = None,
+    on_event=None,
+    heartbeat_sec: float | None = None,
+) -> tuple[int, str, str]:
+    """Coroutine form of run(): (code, stdout, stderr)."""
+    res = await arun_ex(
+        cmd,
+        cwd=cwd,
+        timeout_sec=timeout_sec,
+        idle_timeout_sec=idle_timeout_sec,
+        verbose=verbose,
+        env=env,
+        capture_limit=capture_limit,
+        on_event=on_event,
+        heartbeat_sec=heartbeat_sec,
+    )
+    return res["code"], res["stdout"], res["stderr"]
+
+
+def _run_sync(coro):
+    """Drive a runner coroutine to completion from synchronous code."""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    coro.close()
+    raise RuntimeError("run() called inside a running event loop; await arun() instead")
+
+
+def run(
+    cmd: list[str],
+    cwd: Path | None = None,
+    *,
+    timeout_sec: float | None = None,
+    idle_timeout_sec: float | None = None,
+    verbose: bool | None = None,
+    env: dict | None = None,
+    capture_limit: int | None = None,
+    on_event=None,
+    heartbeat_sec: float | None = None,
+) -> tuple[int, str, str]:
+    """Run a subprocess with logging, optional timeouts, and captured output.
+
+    Backward-compatible return: (code, stdout, stderr).
+    Environment configuration (defaults if args not provided):
+    - CODEX_VERBOSE: enable live echo and command banners.
+    - CODEX_CMD_TIMEOUT_SEC: overall timeout (seconds).
+    - CODEX_IDLE_TIMEOUT_SEC: no-output idle timeout (seconds).
+    - CODEX_LOG_DIR: custom log directory; defaults to .codex/logs.
+      tools.log is buffered and rotated (CODEX_LOG_MAX_BYTES, CODEX_LOG_BACKUPS).
+    - CODEX_PROC_SAMPLE_SEC: /proc sampling interval for the process-tree
+      peak RSS in proc_end "resources" (default 0.5; 0 disables).
+    - CODEX_CAPTURE_LIMIT: keep only this many characters of output tail in
+      memory per stream and spill the full output to the log directory.
+    """
+    return _run_sync(arun(
+        cmd,
+        cwd=cwd,
+        timeout_sec=timeout_sec,
+        idle_timeout_sec=idle_timeout_sec,
+        verbose=verbose,
+        env=env,
+        capture_limit=capture_limit,
+        on_event=on_event,
+        heartbeat_sec=heartbeat_sec,
+    ))
 
 
 def run_ex(
@@ -239,23 +720,136 @@ def run_ex(
     idle_timeout_sec: float | None = None,
     verbose: bool | None = None,
     env: dict | None = None,
+    capture_limit: int | None = None,
+    on_event=None,
+    heartbeat_sec: float | None = None,
 ) -> dict:
     """Extended runner returning a structured dict for JSON outputs."""
-    code, out, err = run(
+    return _run_sync(arun_ex(
         cmd,
         cwd=cwd,
         timeout_sec=timeout_sec,
         idle_timeout_sec=idle_timeout_sec,
         verbose=verbose,
         env=env,
-    )
-    return {
-        "cmd": cmd,
-        "cwd": str(cwd or Path.cwd()),
-        "code": code,
-        "stdout": out,
-        "stderr": err,
-    }
+        capture_limit=capture_limit,
+        on_event=on_event,
+        heartbeat_sec=heartbeat_sec,
+    ))
+
+
+async def arun_many(jobs: list[dict], *, max_parallel: int | None = None) -> list[dict]:
+    """Run many commands concurrently on one event loop.
+
+    Each job is a dict of arun_ex() keyword arguments (must include "cmd").
+    Results come back in job order.
+    """
+    sem = asyncio.Semaphore(max_parallel) if max_parallel else None
+
+    async def one(job: dict) -> dict:
+        if sem is None:
+            return await arun_ex(**job)
+        async with sem:
+            return await arun_ex(**job)
+
+    return list(await asyncio.gather(*(one(j) for j in jobs)))
+
+
+def iter_run(cmd: list[str], cwd: Path | None = None, **kwargs) -> Iterator[dict]:
+    """Generator form of run_ex(): yields start/line/heartbeat/end events as they arrive.
+
+    Keyword arguments are those of arun_ex() (except on_event). Closing the
+    generator early kills the child.
+    """
+    loop = asyncio.new_event_loop()
+    events: deque[dict] = deque()
+    wake = None
+
+    def on_event(event: dict) -> None:
+        events.append(event)
+        if wake is not None and not wake.done():
+            wake.set_result(None)
+
+    task = loop.create_task(arun_ex(cmd, cwd, on_event=on_event, **kwargs))
+    try:
+        while True:
+            while events:
+                yield events.popleft()
+            if task.done():
+                task.result()
+                return
+            wake = loop.create_future()
+            loop.run_until_complete(asyncio.wait({wake, task}, return_when=asyncio.FIRST_COMPLETED))
+    finally:
+        if not task.done():
+            task.cancel()
+            loop.run_until_complete(asyncio.gather(task, return_exceptions=True))
+        loop.close()
+
+
+def emit_ndjson(event: dict, **extra) -> None:
+    """Print one NDJSON event line and flush (for --stream CLIs)."""
+    print(json.dumps({**event, **extra}, ensure_ascii=False), flush=True)
+
+
+def run_many(jobs: list[dict], *, max_parallel: int | None = None) -> list[dict]:
+    """Synchronous wrapper for arun_many()."""
+    return _run_sync(arun_many(jobs, max_parallel=max_parallel))
+
+
+# Generated/installed content that never counts as a change to the working tree
+TREE_EXCLUDES = (".codex", "node_modules", "dist")
+
+
+def tree_exclude_pathspecs() -> list[str]:
+    specs = []
+    for name in TREE_EXCLUDES:
+        specs.extend([f":(exclude){name}/*", f":(exclude)*/{name}/*"])
+    return specs
+
+
+def working_tree_hash(root: Path) -> str | None:
+    """Git tree id of the working tree as it would be committed (index + untracked, minus ignores).
+
+    Stages into a scratch index under .codex/cache (persisted, so git's stat
+    cache keeps repeat calls cheap); the real index is untouched. None when
+    the tree can't be hashed (not a git repo, concurrent use, ...).
+    """
+    cache_dir = ensure_codex_dir(root) / "cache"
+    cache_dir.mkdir(exist_ok=True)
+    scratch = cache_dir / "tree.index"
+    if not scratch.exists():
+        code, git_dir, _ = run(["git", "rev-parse", "--git-dir"], cwd=root)
+        if code != 0:
+            return None
+        real_index = (root / git_dir.strip()) / "index"
+        if real_index.exists():
+            shutil.copyfile(real_index, scratch)
+    env = {"GIT_INDEX_FILE": str(scratch)}
+    code, _, err = run(["git", "add", "-A", "--", ".", *tree_exclude_pathspecs()], cwd=root, env=env)
+    # An exclude naming an already ignored directory (.codex in info/exclude) makes git
+    # complain and exit 1, with everything else staged all the same
+    if code != 0 and "ignored by one of your .gitignore files" not in err:
+        return None
+    code, out, _ = run(["git", "write-tree"], cwd=root, env=env)
+    return out.strip() if code == 0 else None
+
+
+def toolchain_fingerprint(root: Path) -> dict:
+    """Identity of node and the package manager binaries (path, size, mtime) without spawning them."""
+    fp = {}
+    for tool in ("node", detect_package_manager(root)):
+        path = shutil.which(tool)
+        if not path:
+            fp[tool] = None
+            continue
+        real = os.path.realpath(path)
+        try:
+            st = os.stat(real)
+            fp[tool] = f"{real}:{st.st_size}:{int(st.st_mtime)}"
+        except OSError:
+            fp[tool] = real
+    return fp
 
 
 def read_json(path: Path, default):
@@ -274,20 +868,10 @@ def write_json(path: Path, data) -> None:
         json.dump(data, f, indent=2)
 
 
-def detect_package_manager(root: Path) -> str:
-    if (root / "pnpm-lock.yaml").exists():
-        return "pnpm"
-    if (root / "yarn.lock").exists():
-        return "yarn"
-    return "npm"
-
-
-def read_package_json(root: Path) -> dict:
-    return read_json(root / "package.json", {})
+_LOCKFILES = (("pnpm-lock.yaml", "pnpm"), ("yarn.lock", "yarn"), ("package-lock.json", "npm"))
 
 
-def detect_test_runner(root: Path) -> str | None:
-    pkg = read_package_json(root)
+def _runner_from_package(pkg: dict) -> str | None:
     scripts = (pkg.get("scripts") or {})
     script_str = " ".join(scripts.values()).lower()
     # Prefer explicit config
@@ -312,22 +896,118 @@ def detect_test_runner(root: Path) -> str | None:
     return None
 
 
+def _mtime_stamp(paths: list[Path]) -> tuple:
+    stamp = []
+    for p in paths:
+        try:
+            st = p.stat()
+            stamp.append((str(p), st.st_mtime_ns, st.st_size))
+        except OSError:
+            stamp.append((str(p), None, None))
+    return tuple(stamp)
+
+
+class ProjectContext:
+    """Everything the tools derive from a project's manifests, computed once per process.
+
+    Holds the root and workspace package.json files, scripts, lockfile /
+    package manager, TypeScript detection and test runner. get() returns a
+    cached instance per root and rebuilds it when any file it was derived
+    from (or a workspace parent directory) changes mtime/size.
+    """
+
+    _cache: dict[Path, "ProjectContext"] = {}
+
+    def __init__(self, root: Path):
+        self.root = root
+        self.package_json: dict = read_json(root / "package.json", {})
+        self.scripts: dict = self.package_json.get("scripts") or {}
+        self.lockfile: str | None = None
+        self.package_manager = "npm"
+        for name, mgr in _LOCKFILES:
+            if (root / name).exists():
+                self.lockfile, self.package_manager = name, mgr
+                break
+        deps = (self.package_json.get("devDependencies") or {}) | (self.package_json.get("dependencies") or {})
+        self.typescript = (root / "tsconfig.json").exists() or "typescript" in {k.lower() for k in deps}
+        self.test_runner = _runner_from_package(self.package_json)
+        self.workspaces, ws_dirs = self._load_workspaces()
+        self._sources = [
+            root / "package.json",
+            root / "tsconfig.json",
+            *(root / name for name, _ in _LOCKFILES),
+            *ws_dirs,
+            *(root / ws["rel"] / "package.json" for ws in self.workspaces),
+        ]
+        self._stamp = _mtime_stamp(self._sources)
+
+    def _load_workspaces(self) -> tuple[list[dict], list[Path]]:
+        spec = self.package_json.get("workspaces") or []
+        if isinstance(spec, dict):
+            # yarn classic: {"packages": [...]}
+            spec = spec.get("packages") or []
+        workspaces: list[dict] = []
+        parents: list[Path] = []
+        for pattern in spec:
+            if any(ch in pattern for ch in "*?["):
+                parents.append(self.root / pattern.split("*")[0].rstrip("/"))
+            for d in sorted(self.root.glob(pattern)):
+                pkg_path = d / "package.json"
+                if not pkg_path.is_file():
+                    continue
+                pkg = read_json(pkg_path, {})
+                workspaces.append({
+                    "name": pkg.get("name") or d.name,
+                    "dir": d,
+                    "rel": d.relative_to(self.root).as_posix(),
+                    "package_json": pkg,
+                    "scripts": pkg.get("scripts") or {},
+                    "test_runner": _runner_from_package(pkg),
+                })
+        return workspaces, parents
+
+    def is_fresh(self) -> bool:
+        return _mtime_stamp(self._sources) == self._stamp
+
+    @classmethod
+    def get(cls, root: Path) -> "ProjectContext":
+        ctx = cls._cache.get(root)
+        if ctx is None or not ctx.is_fresh():
+            ctx = cls._cache[root] = cls(root)
+        return ctx
+
+    def workspace_for(self, path: Path) -> dict | None:
+        """The workspace containing path (absolute or root-relative), if any."""
+        rel = path.relative_to(self.root).as_posix() if path.is_absolute() else path.as_posix()
+        for ws in self.workspaces:
+            if rel == ws["rel"] or rel.startswith(ws["rel"] + "/"):
+                return ws
+        return None
+
+
+def detect_package_manager(root: Path) -> str:
+    return ProjectContext.get(root).package_manager
+
+
+def read_package_json(root: Path) -> dict:
+    return ProjectContext.get(root).package_json
+
+
+def detect_test_runner(root: Path) -> str | None:
+    return ProjectContext.get(root).test_runner
+
+
 def detect_typescript(root: Path) -> bool:
-    if (root / "tsconfig.json").exists():
-        return True
-    pkg = read_package_json(root)
-    deps = (pkg.get("devDependencies") or {}) | (pkg.get("dependencies") or {})
-    return "typescript" in {k.lower() for k in deps.keys()}
+    return ProjectContext.get(root).typescript
 
 
 def package_script_exists(root: Path, name: str) -> bool:
-    pkg = read_package_json(root)
-    scripts = (pkg.get("scripts") or {})
-    return name in scripts
+    return name in ProjectContext.get(root).scripts
 
 
-def run_package_script(root: Path, script: str, extra_args: list[str] | None = None) -> tuple[int, str, str]:
-    mgr = detect_package_manager(root)
+def package_script_cmd(root: Path, script: str, extra_args: list[str] | None = None, manager: str | None = None) -> list[str]:
+    """Command running an npm script; run it with cwd=root (or a workspace dir, passing the root's manager)."""
+    mgr = manager or detect_package_manager(root)
     cmd = []
     if mgr == "pnpm":
         cmd = ["pnpm", "run", script]
@@ -338,7 +1018,15 @@ def run_package_script(root: Path, script: str, extra_args: list[str] | None = N
         cmd = ["npm", "run", script]
     if extra_args:
         cmd.extend(["--", *extra_args])
-    return run(cmd, cwd=root)
+    return cmd
+
+
+def run_package_script(root: Path, script: str, extra_args: list[str] | None = None, **run_kwargs) -> tuple[int, str, str]:
+    return run(package_script_cmd(root, script, extra_args), cwd=root, **run_kwargs)
+
+
+def run_package_script_ex(root: Path, script: str, extra_args: list[str] | None = None, **run_kwargs) -> dict:
+    return run_ex(package_script_cmd(root, script, extra_args), cwd=root, **run_kwargs)
 
 
 def safe_append_file(path: Path, content: str) -> None:
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""Verification ledger: test.py results keyed by (working tree, toolchain, command).
+
+A no-op retry (the subagent changed nothing) hits the ledger and skips the
+typecheck/test cycle entirely. Entries live in .codex/verify_cache.json.
+"""
+import hashlib
+import json
+from pathlib import Path
+
+from _utils import ensure_codex_dir, read_json, timestamp, toolchain_fingerprint, working_tree_hash, write_json
+
+
+LEDGER_FILE = "verify_cache.json"
+MAX_ENTRIES = 64
+# Output kept per cached result; full logs stay in .codex/logs
+TAIL_CHARS = 4000
+# Results that say nothing about the code under test
+UNCACHEABLE_CODES = (124, 127)
+
+
+def _ledger_path(root: Path) -> Path:
+    return ensure_codex_dir(root) / LEDGER_FILE
+
+
+def cache_key(root: Path, command: dict) -> tuple[str, str] | None:
+    """(key, tree) for a normalized command description, or None if the tree can't be hashed."""
+    tree = working_tree_hash(root)
+    if tree is None:
+        return None
+    material = json.dumps({"tree": tree, "toolchain": toolchain_fingerprint(root), "command": command}, sort_keys=True)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest(), tree
+
+
+def lookup(root: Path, key: str) -> dict | None:
+    entry = read_json(_ledger_path(root), {}).get(key)
+    if not entry:
+        return None
+    payload = dict(entry["payload"])
+    payload["cache"] = {"hit": True, "key": key, "tree": entry.get("tree"), "recorded": entry.get("ts")}
+    return payload
+
+
+def _trim(payload: dict) -> dict:
+    out = dict(payload)
+    for k in ("stdout", "stderr"):
+        if isinstance(out.get(k), str) and len(out[k]) > TAIL_CHARS:
+            out[k] = out[k][-TAIL_CHARS:]
+            out["truncated"] = True
+    if isinstance(out.get("typecheck"), dict):
+        out["typecheck"] = _trim(out["typecheck"])
+    return out
+
+
+def record(root: Path, key: str, tree: str, payload: dict) -> None:
+    if payload.get("code") in UNCACHEABLE_CODES:
+        return
+    path = _ledger_path(root)
+    ledger = read_json(path, {})
+    ledger[key] = {
+        "ts": timestamp(),
+        "tree": tree,
+        "ok": payload.get("ok"),
+        "code": payload.get("code"),
+        "summary": {
+            "typecheck_code": (payload.get("typecheck") or {}).get("code"),
+            "runner": payload.get("runner"),
+        },
+        "payload": _trim({k: v for k, v in payload.items() if k != "cache"}),
+    }
+    # Oldest first (insertion order); keep the ledger bounded
+    while len(ledger) > MAX_ENTRIES:
+        ledger.pop(next(iter(ledger)))
+    write_json(path, ledger)
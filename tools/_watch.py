@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""File watching for test.py --watch.
+
+InotifyWatcher uses inotify(7) through ctypes: one watch per directory that
+holds a tracked or unignored file (`git ls-files -co --exclude-standard`), so
+node_modules, .codex and everything else .gitignore'd is never walked or
+watched, and an idle watcher costs nothing but a blocked fd. Where inotify
+isn't available (or runs out of watches) PollingWatcher stats the same
+directories every CODEX_WATCH_POLL_SEC (default 1.0). CODEX_WATCH_POLL=1
+forces polling.
+
+batches() turns either into debounced sets of changed root-relative paths;
+OVERFLOW in a batch means events were lost and everything may have changed.
+"""
+import asyncio
+import ctypes
+import ctypes.util
+import errno
+import os
+import struct
+from pathlib import Path
+from typing import AsyncIterator
+
+from _utils import TREE_EXCLUDES, run
+
+
+OVERFLOW = "*"
+DEBOUNCE_SEC = 0.2
+# A steady stream of changes still yields a batch this often
+MAX_BATCH_WAIT_SEC = 2.0
+
+_IN_MODIFY = 0x00000002
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_DELETE_SELF = 0x00000400
+_IN_Q_OVERFLOW = 0x00004000
+_IN_IGNORED = 0x00008000
+_IN_ONLYDIR = 0x01000000
+_IN_ISDIR = 0x40000000
+_IN_NONBLOCK = os.O_NONBLOCK
+_IN_CLOEXEC = 0o2000000
+_WATCH_MASK = (
+    _IN_MODIFY | _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO
+    | _IN_CREATE | _IN_DELETE | _IN_DELETE_SELF | _IN_ONLYDIR
+)
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+def _excluded_name(name: str) -> bool:
+    return name in TREE_EXCLUDES or name == ".git"
+
+
+def watched_dirs(root: Path) -> set[str]:
+    """Root-relative directories (root is "") holding tracked or unignored files."""
+    code, out, _ = run(["git", "ls-files", "--cached", "--others", "--exclude-standard", "-z"], cwd=root)
+    if code != 0:
+        return _walk_dirs(root, "")
+    dirs = {""}
+    for rel in out.split("\0"):
+        parts = rel.split("/")[:-1]
+        if any(_excluded_name(p) for p in parts):
+            continue
+        for i in range(1, len(parts) + 1):
+            dirs.add("/".join(parts[:i]))
+    return dirs
+
+
+def _walk_dirs(root: Path, rel: str) -> set[str]:
+    """rel and its subdirectories, pruning TREE_EXCLUDES (for new directories and non-git trees)."""
+    dirs = set()
+    stack = [rel]
+    while stack:
+        cur = stack.pop()
+        dirs.add(cur)
+        try:
+            with os.scandir(root / cur) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False) and not _excluded_name(entry.name):
+                        stack.append(f"{cur}/{entry.name}" if cur else entry.name)
+        except OSError:
+            continue
+    return dirs
+
+
+def drop_ignored(root: Path, paths: set[str]) -> set[str]:
+    """paths minus the .gitignore'd ones (events come per directory, not per file)."""
+    candidates = sorted(p for p in paths if p != OVERFLOW)
+    if not candidates:
+        return set(paths)
+    code, out, _ = run(["git", "check-ignore", "--", *candidates], cwd=root)
+    # 1 means nothing is ignored; anything else but 0 means git couldn't tell
+    ignored = set(out.splitlines()) if code == 0 else set()
+    return {p for p in paths if p not in ignored}
+
+
+class InotifyWatcher:
+    """Recursive inotify watch over watched_dirs(); changes() drains pending events without blocking."""
+
+    def __init__(self, root: Path, libc: ctypes.CDLL):
+        self.root = root
+        self._libc = libc
+        self._fd = libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._wds: dict[int, str] = {}
+        try:
+            for rel in sorted(watched_dirs(root)):
+                self._add(rel)
+        except OSError:
+            self.close()
+            raise
+
+    def fileno(self) -> int:
+        return self._fd
+
+    def _add(self, rel: str) -> None:
+        path = os.fsencode(str(self.root / rel) if rel else str(self.root))
+        wd = self._libc.inotify_add_watch(self._fd, path, _WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            if err in (errno.ENOENT, errno.ENOTDIR, errno.EACCES):
+                # Gone (or unreadable) before we got to it
+                return
+            raise OSError(err, f"inotify_add_watch failed for {rel or '.'}")
+        self._wds[wd] = rel
+
+    def changes(self) -> set[str]:
+        out: set[str] = set()
+        while True:
+            try:
+                buf = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                return out
+            if not buf:
+                return out
+            offset = 0
+            while offset < len(buf):
+                wd, mask, _cookie, length = _EVENT_HEADER.unpack_from(buf, offset)
+                offset += _EVENT_HEADER.size
+                name = buf[offset:offset + length].rstrip(b"\0").decode("utf-8", "surrogateescape")
+                offset += length
+                if mask & _IN_Q_OVERFLOW:
+                    out.add(OVERFLOW)
+                    continue
+                if mask & _IN_IGNORED:
+                    self._wds.pop(wd, None)
+                    continue
+                parent = self._wds.get(wd)
+                if parent is None or not name or _excluded_name(name):
+                    continue
+                rel = f"{parent}/{name}" if parent else name
+                if mask & _IN_ISDIR:
+                    if mask & (_IN_CREATE | _IN_MOVED_TO):
+                        # A new directory may already have files in it
+                        for sub in sorted(_walk_dirs(self.root, rel)):
+                            self._add(sub)
+                            out.update(self._files_in(sub))
+                    continue
+                out.add(rel)
+
+    def _files_in(self, rel: str) -> set[str]:
+        try:
+            with os.scandir(self.root / rel) as it:
+                return {f"{rel}/{e.name}" for e in it if e.is_file(follow_symlinks=False)}
+        except OSError:
+            return set()
+
+    def close(self) -> None:
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+class PollingWatcher:
+    """Stat-polling fallback over the same directories; changes() compares against the last scan."""
+
+    def __init__(self, root: Path, interval: float | None = None):
+        self.root = root
+        self.interval = interval or float(os.getenv("CODEX_WATCH_POLL_SEC") or 1.0)
+        self._dirs = watched_dirs(root)
+        # Subdirectories present at start but not watched hold only ignored files
+        self._skip: set[str] | None = None
+        self._snapshot = self._scan()
+
+    def fileno(self) -> None:
+        return None
+
+    def _scan(self) -> dict[str, tuple]:
+        snap: dict[str, tuple] = {}
+        new_dirs = set()
+        for rel in sorted(self._dirs):
+            try:
+                with os.scandir(self.root / rel if rel else self.root) as it:
+                    for entry in it:
+                        if _excluded_name(entry.name):
+                            continue
+                        path = f"{rel}/{entry.name}" if rel else entry.name
+                        if entry.is_dir(follow_symlinks=False):
+                            if path not in self._dirs and (self._skip is None or path not in self._skip):
+                                new_dirs.add(path)
+                            continue
+                        try:
+                            st = entry.stat(follow_symlinks=False)
+                        except OSError:
+                            continue
+                        snap[path] = (st.st_mtime_ns, st.st_size)
+            except OSError:
+                continue
+        if self._skip is None:
+            self._skip = new_dirs
+        else:
+            # Files in new directories show up (as new) on the next scan
+            for rel in new_dirs:
+                self._dirs |= _walk_dirs(self.root, rel)
+        return snap
+
+    def changes(self) -> set[str]:
+        snap = self._scan()
+        old = self._snapshot
+        self._snapshot = snap
+        return {p for p in snap.keys() | old.keys() if snap.get(p) != old.get(p)}
+
+    def close(self) -> None:
+        pass
+
+
+def open_watcher(root: Path):
+    """An InotifyWatcher where possible, else a PollingWatcher."""
+    if (os.getenv("CODEX_WATCH_POLL") or "").strip().lower() not in ("1", "true", "yes", "on"):
+        name = ctypes.util.find_library("c")
+        try:
+            libc = ctypes.CDLL(name, use_errno=True)
+            if hasattr(libc, "inotify_init1"):
+                return InotifyWatcher(root, libc)
+        except OSError:
+            # No inotify (not Linux) or out of watches (fs.inotify.max_user_watches)
+            pass
+    return PollingWatcher(root)
+
+
+async def batches(root: Path, watcher, debounce_sec: float = DEBOUNCE_SEC) -> AsyncIterator[set[str]]:
+    """Yield sets of changed, unignored paths once the tree has been quiet for debounce_sec."""
+    loop = asyncio.get_running_loop()
+    pending: set[str] = set()
+    wake = asyncio.Event()
+
+    def drain() -> None:
+        found = watcher.changes()
+        if found:
+            pending.update(found)
+            wake.set()
+
+    async def poll() -> None:
+        while True:
+            await asyncio.sleep(watcher.interval)
+            drain()
+
+    fd = watcher.fileno()
+    poller = None
+    if fd is not None:
+        loop.add_reader(fd, drain)
+    else:
+        poller = asyncio.ensure_future(poll())
+    try:
+        while True:
+            await wake.wait()
+            wake.clear()
+            first = loop.time()
+            while loop.time() - first < MAX_BATCH_WAIT_SEC:
+                try:
+                    await asyncio.wait_for(wake.wait(), debounce_sec)
+                except asyncio.TimeoutError:
+                    break
+                wake.clear()
+            batch, pending = pending, set()
+            batch = await asyncio.to_thread(drop_ignored, root, batch)
+            if batch:
+                yield batch
+    finally:
+        if fd is not None:
+            loop.remove_reader(fd)
+        if poller is not None:
+            poller.cancel()
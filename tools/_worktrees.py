@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+"""A recycled pool of git worktrees for running tasks side by side (agent.py run-phase -j N).
+
+Checkouts live under .codex/worktrees/slot-<n>. acquire() leases a free slot
+(an flock on slot-<n>.lock, so other orchestrations skip it too; it is
+released when the process dies), resets it to the main checkout's HEAD on
+branch codex/task-<name> and cleans it, keeping its .codex caches and its
+node_modules (root and per workspace): real directories of links to the
+main checkout's installed packages, except that workspace packages link to
+the slot's own packages/ and tool caches (.vite, .vitest) stay per slot.
+New slots are only added when every free one is taken. A slot left on a
+task's branch with work on it (the task failed or was interrupted) is kept
+for that task: handed back as it is when it asks again, so it can resume,
+and never reset for another one.
+
+snapshot() keeps one more checkout per tree, .codex/worktrees/snapshot, set
+to a given working-tree id on top of the tree's HEAD: checks can test the
+subagent's changes there without touching the tree it is still editing.
+
+land() is the merge queue: under checkout_lock() a finished branch is rebased
+onto the main checkout's current HEAD, re-verified if that changed anything,
+and fast-forwarded in, so every landing is tested on top of the one before.
+"""
+import contextlib
+import fcntl
+import itertools
+import os
+from pathlib import Path
+
+from _utils import ProjectContext, ensure_codex_dir, run
+
+
+WORKTREES_DIR = "worktrees"
+SLOT_PREFIX = "slot-"
+SNAPSHOT = "snapshot"
+BRANCH_PREFIX = "codex/task-"
+# Kept out of `git add -A`, in the main checkout and in the worktrees (tools state, the pool, the links)
+_EXCLUDES = ("/.codex/", "node_modules")
+# node_modules entries each slot keeps its own of instead of linking (vite/vitest caches)
+_NODE_MODULES_LOCAL = (".vite", ".vitest", ".cache")
+
+
+def _git(cwd: Path, *args: str) -> tuple[int, str, str]:
+    return run(["git", *args], cwd=cwd)
+
+
+def _ensure_excludes(root: Path) -> None:
+    code, out, _ = _git(root, "rev-parse", "--git-common-dir")
+    if code != 0:
+        return
+    common = Path(out.strip())
+    path = (common if common.is_absolute() else root / common) / "info" / "exclude"
+    try:
+        lines = path.read_text(encoding="utf-8").splitlines()
+    except OSError:
+        lines = []
+    missing = [p for p in _EXCLUDES if p not in lines]
+    if missing:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with path.open("a", encoding="utf-8") as f:
+            f.write("".join(f"{p}\n" for p in missing))
+
+
+def _link_target(entry: Path, root: Path, tree: Path) -> Path:
+    """What tree's copy of a node_modules entry of root links to."""
+    if entry.is_symlink():
+        target = entry.resolve()
+        try:
+            rel = target.relative_to(root.resolve())
+        except ValueError:
+            rel = None
+        if rel is not None and "node_modules" not in rel.parts:
+            # A workspace link (node_modules/@scope/pkg -> packages/pkg): the tree's own package
+            return tree / rel
+        return target
+    return entry.resolve()
+
+
+def _mirror(src: Path, dst: Path, root: Path, tree: Path, depth: int = 0) -> None:
+    """Fill dst with links to src's entries (see _link_target), scope directories one level down."""
+    if dst.is_symlink():
+        # A slot from before per-package links: the whole directory pointed at root's
+        dst.unlink()
+    dst.mkdir(exist_ok=True)
+    for entry in src.iterdir():
+        if depth == 0 and entry.name in _NODE_MODULES_LOCAL:
+            continue
+        link = dst / entry.name
+        if depth == 0 and entry.name.startswith("@") and entry.is_dir() and not entry.is_symlink():
+            _mirror(entry, link, root, tree, depth + 1)
+            continue
+        target = _link_target(entry, root, tree)
+        if os.path.lexists(link):
+            if not link.is_symlink() or Path(os.readlink(link)) == target:
+                continue
+            link.unlink()
+        link.symlink_to(target, target_is_directory=entry.is_dir())
+    for link in dst.iterdir():
+        # Packages uninstalled from root since
+        if link.is_symlink() and not os.path.lexists(src / link.name):
+            link.unlink()
+
+
+def _link_node_modules(root: Path, tree: Path) -> None:
+    ctx = ProjectContext.get(root)
+    for rel in (".", *(ws["rel"] for ws in ctx.workspaces)):
+        src = root / rel / "node_modules"
+        dst = tree / rel / "node_modules"
+        if src.is_dir() and dst.parent.is_dir():
+            _mirror(src, dst, root, tree)
+
+
+def pool_dir(root: Path) -> Path:
+    d = ensure_codex_dir(root) / WORKTREES_DIR
+    d.mkdir(parents=True, exist_ok=True)
+    return d
+
+
+@contextlib.contextmanager
+def checkout_lock(root: Path):
+    """Exclusive access to the main checkout and its worktree list (not reentrant)."""
+    path = ensure_codex_dir(root) / "locks" / "checkout.lock"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("a") as fh:
+        fcntl.flock(fh, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(fh, fcntl.LOCK_UN)
+
+
+class Lease:
+    """A pool slot checked out on a task branch; release() hands it back."""
+
+    def __init__(self, root: Path, tree: Path, branch: str, lock_fh, resumed: bool = False):
+        self.root = root
+        self.tree = tree
+        self.branch = branch
+        # The slot was already on branch, with whatever an earlier run left in it
+        self.resumed = resumed
+        self._lock_fh = lock_fh
+
+    def reset(self) -> bool:
+        """Start the branch over from the main checkout's HEAD, dropping the slot's changes."""
+        with checkout_lock(self.root):
+            code, out, _ = _git(self.root, "rev-parse", "HEAD")
+            ok = code == 0 and _reset(self.tree, self.branch, out.strip())[0] == 0
+        self.resumed = False
+        return ok
+
+    def release(self, delete_branch: bool = True) -> None:
+        """Unlock the slot; with delete_branch it is detached and the branch deleted.
+
+        Otherwise the slot stays on the branch, changes and all, for the task's next run.
+        """
+        if self._lock_fh is None:
+            return
+        if delete_branch:
+            with checkout_lock(self.root):
+                _git(self.tree, "checkout", "--detach", "--quiet")
+                _git(self.root, "branch", "-D", self.branch)
+        fcntl.flock(self._lock_fh, fcntl.LOCK_UN)
+        self._lock_fh.close()
+        self._lock_fh = None
+
+
+def _claim(path: Path):
+    fh = path.open("a")
+    try:
+        fcntl.flock(fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        fh.close()
+        return None
+    return fh
+
+
+def _reset(tree: Path, branch: str, base: str) -> tuple[int, str, str]:
+    code, out, err = _git(tree, "checkout", "--force", "-B", branch, base)
+    if code == 0:
+        # Build output and other ignored files go too; the node_modules links and
+        # the slot's .codex caches (incremental typecheck, impact map) stay
+        code, out, err = _git(tree, "clean", "-fdx", "-e", "node_modules", "-e", "/.codex/")
+    return code, out, err
+
+
+def _has_work(tree: Path, base: str) -> bool:
+    """Whether a slot sits on a task branch with changes or commits that aren't in base."""
+    code, out, _ = _git(tree, "symbolic-ref", "--quiet", "--short", "HEAD")
+    if code != 0 or not out.strip().startswith(BRANCH_PREFIX):
+        return False
+    code, out, _ = _git(tree, "status", "--porcelain")
+    if code != 0 or out.strip():
+        return True
+    code, out, _ = _git(tree, "rev-list", "--count", f"{base}..HEAD")
+    return code != 0 or out.strip() != "0"
+
+
+def _slot_on(pool: Path, branch: str):
+    """(slot, claimed lock) for a free slot checked out on branch, or None."""
+    for lock in sorted(pool.glob(f"{SLOT_PREFIX}*.lock")):
+        tree = lock.with_suffix("")
+        if not (tree / ".git").exists():
+            continue
+        code, out, _ = _git(tree, "symbolic-ref", "--quiet", "--short", "HEAD")
+        if code != 0 or out.strip() != branch:
+            continue
+        fh = _claim(lock)
+        if fh is not None:
+            return tree, fh
+    return None
+
+
+def acquire(root: Path, name: str) -> Lease | None:
+    """Lease a slot on branch codex/task-<name> at the main checkout's HEAD; None if git refuses.
+
+    A free slot still on that branch is leased untouched instead (Lease.resumed). Free slots
+    holding another task's unfinished work are skipped.
+    """
+    pool = pool_dir(root)
+    branch = BRANCH_PREFIX + name
+    with checkout_lock(root):
+        _ensure_excludes(root)
+        kept = _slot_on(pool, branch)
+        if kept is not None:
+            tree, fh = kept
+            _link_node_modules(root, tree)
+            return Lease(root, tree, branch, fh, resumed=True)
+        code, out, err = _git(root, "rev-parse", "HEAD")
+        if code != 0:
+            print(f"[worktree] no HEAD to branch from: {err.strip()}")
+            return None
+        base = out.strip()
+        for n in itertools.count():
+            fh = _claim(pool / f"{SLOT_PREFIX}{n}.lock")
+            if fh is None:
+                continue
+            tree = pool / f"{SLOT_PREFIX}{n}"
+            if (tree / ".git").exists():
+                if _has_work(tree, base):
+                    # Kept for the task it belongs to (inspection, checkpoint resume)
+                    fcntl.flock(fh, fcntl.LOCK_UN)
+                    fh.close()
+                    continue
+                code, _, err = _reset(tree, branch, base)
+            else:
+                _git(root, "worktree", "prune")
+                code, _, err = _git(root, "worktree", "add", "-B", branch, str(tree), base)
+            if code != 0:
+                fcntl.flock(fh, fcntl.LOCK_UN)
+                fh.close()
+                print(f"[worktree] could not prepare {tree}: {err.strip()}")
+                return None
+            _link_node_modules(root, tree)
+            return Lease(root, tree, branch, fh)
+
+
+@contextlib.contextmanager
+def snapshot(tree: Path, tree_id: str):
+    """Yield a scratch checkout of tree's HEAD with tree_id (see working_tree_hash) as its uncommitted changes.
+
+    Yields None when another check holds it or git refuses. It has its own .codex, so what
+    runs there (test history, caches, build info) stays apart from tree's.
+    """
+    pool = pool_dir(tree)
+    fh = _claim(pool / f"{SNAPSHOT}.lock")
+    if fh is None:
+        yield None
+        return
+    try:
+        snap = pool / SNAPSHOT
+        code, out, err = _git(tree, "rev-parse", "HEAD")
+        if code == 0:
+            if (snap / ".git").exists():
+                code, out, err = _git(snap, "checkout", "--force", "--quiet", "--detach", out.strip())
+            else:
+                code, out, err = _git(tree, "worktree", "add", "--force", "--detach", str(snap), out.strip())
+        if code == 0:
+            # Index and files become the snapshot, so `git diff HEAD` shows exactly its changes
+            code, out, err = _git(snap, "read-tree", "-u", "--reset", tree_id)
+        if code == 0:
+            code, out, err = _git(snap, "clean", "-fdx", "-e", "node_modules", "-e", "/.codex/")
+        if code != 0:
+            print(f"[worktree] could not prepare the snapshot {snap}: {err.strip()}")
+            yield None
+            return
+        _link_node_modules(tree, snap)
+        yield snap
+    finally:
+        fcntl.flock(fh, fcntl.LOCK_UN)
+        fh.close()
+
+
+def land(root: Path, lease: Lease, verify=None) -> tuple[bool, str]:
+    """Bring lease.branch onto the main checkout's branch (call under checkout_lock()); (ok, detail).
+
+    The branch is rebased onto the current HEAD first; when that replays it onto new commits,
+    verify() (if given) must pass again before the fast-forward.
+    """
+    code, out, err = _git(root, "rev-parse", "HEAD")
+    if code != 0:
+        return False, err
+    head = out.strip()
+    if _git(lease.tree, "merge-base", "--is-ancestor", head, "HEAD")[0] != 0:
+        code, out, err = _git(lease.tree, "rebase", head)
+        if code != 0:
+            _git(lease.tree, "rebase", "--abort")
+            return False, f"rebase onto {head[:12]} failed:\n{out}{err}"
+        if verify is not None and not verify():
+            return False, f"verification failed after rebasing onto {head[:12]}"
+    code, out, err = _git(root, "merge", "--ff-only", lease.branch)
+    if code != 0:
+        return False, out + err
+    return True, out
@@ -1,14 +1,68 @@
 #!/usr/bin/env python3
 import argparse
-import json
+import asyncio
+import contextlib
+import contextvars
 import os
+import signal
 import sys
 import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from pathlib import Path
 
-from _utils import find_repo_root, run, read_file, write_file, timestamp
-from task import load_tasks, save_tasks, add_phase, add_task, set_current_phase, find_task
+from _utils import _parse_bool_env, arun_ex, find_repo_root, run, read_file, write_file, timestamp, working_tree_hash, ProjectContext
+from _dispatch import call_tool
+from _affected import changed_paths
+from task import load_tasks, locked_tasks, add_phase, add_task, set_current_phase, find_task, task_deps, set_checkpoint, CHECKPOINT_STAGES
 from plan import split_into_steps
+import _index
+import _trace
+import _watch
+import _worktrees
+
+
+# Output tail kept per stream in test.py's JSON; the rest is spilled to .codex/logs
+TEST_CAPTURE_LIMIT = 64 * 1024
+# Reruns a failing test gets in verify() before it counts as a real failure
+TEST_RERUNS = 2
+# While an implementation subagent works, the affected tests run once the tree has been quiet this long
+EARLY_CHECK_SETTLE_SEC = 5.0
+# Time a subagent gets to exit on SIGTERM after its tests passed, before it is killed
+EARLY_STOP_GRACE_SEC = 10.0
+
+# Tree ids (working_tree_hash) the typecheck passed on; test runs on them skip it
+_typechecked: set[str] = set()
+
+
+class Budget:
+    """Wall-clock allowance of one task run: its own seconds, cut short by the phase's deadline (monotonic)."""
+
+    def __init__(self, seconds: float | None = None, deadline: float | None = None):
+        self.started = time.monotonic()
+        ends = [d for d in (deadline, self.started + seconds if seconds else None) if d is not None]
+        self.deadline = min(ends) if ends else None
+
+    def remaining(self) -> float | None:
+        """Seconds left (None without a limit); what subagent and test runs get as their timeout."""
+        return None if self.deadline is None else max(self.deadline - time.monotonic(), 0.0)
+
+    def exhausted(self) -> bool:
+        return self.deadline is not None and time.monotonic() >= self.deadline
+
+    def status(self) -> dict:
+        used = time.monotonic() - self.started
+        return {
+            "limit_sec": None if self.deadline is None else round(self.deadline - self.started, 1),
+            "used_sec": round(used, 1),
+            "exhausted": self.exhausted(),
+        }
+
+
+def _attempt_label(tries: int, max_retries: int) -> str:
+    """The "n/m" of the attempt after tries; past max_retries (budgeted runs still cutting the failures), m is n."""
+    if tries <= max_retries:
+        return f"{tries + 1}/{max_retries + 1}"
+    return f"{tries + 1}/{tries + 1}, past --max-retries while the failures drop"
 
 
 def detect_codex(root: Path) -> bool:
@@ -16,44 +70,109 @@ def detect_codex(root: Path) -> bool:
     return code == 0
 
 
-def run_tests(root: Path) -> bool:
-    code, out, err = run([sys.executable, str(root / "tools" / "test.py"), "--json"], cwd=root)
-    if out:
-        # When --json, print compact summary
-        try:
-            payload = json.loads(out)
-            runner = payload.get("runner")
-            tstatus = payload.get("typecheck", {}).get("code")
-            ok = payload.get("ok")
-            print(f"[tests] runner={runner} typecheck_code={tstatus} ok={ok}")
-        except Exception:
-            print(out, end="")
-    if err:
-        print(err, end="")
+@_trace.traced(args=("changed", "failed_first", "reruns"))
+def run_tests(root: Path, changed: bool = False, failed_first: bool = False, timeout_sec: float | None = None, stats: dict | None = None, reruns: int = 0, base: str | None = None) -> bool:
+    """Typecheck + tests; with changed, only the tests affected by the uncommitted changes.
+
+    With failed_first, the tests that failed last time run alone first and a
+    still-failing result ends the run there. reruns gives failing tests that
+    many reruns (flaky ones then pass). Failures of tests quarantined as flaky
+    don't count, unless their file was changed since base (default HEAD) or
+    is uncommitted: those are the task's own tests. timeout_sec bounds each
+    test process. stats, if given, gets "failing": the
+    failing tests plus one for a failed typecheck (None if the runner doesn't
+    report tests). A tree that already typechecked clean isn't typechecked again.
+    """
+    argv = ["--json", "--parallel", "--capture-limit", str(TEST_CAPTURE_LIMIT)]
+    if reruns:
+        argv.extend(["--rerun-failed", str(reruns)])
+    tree = working_tree_hash(root)
+    if tree is not None and tree in _typechecked:
+        argv.append("--no-typecheck")
+    if timeout_sec is not None:
+        argv.extend(["--timeout", f"{max(timeout_sec, 1.0):.0f}"])
+    if failed_first:
+        argv.append("--failed-first")
+    if changed:
+        argv.append("--changed")
+    elif ProjectContext.get(root).workspaces:
+        argv.append("--workspaces")
+    payload = call_tool("test", argv, root=root)
+    code = payload["code"]
+    tc = payload.get("typecheck") or {}
+    if tree is not None and tc.get("ran") and tc.get("code") == 0 and working_tree_hash(root) == tree:
+        _typechecked.add(tree)
+    if "runner" in payload:
+        # Compact summary of the structured result
+        runner = payload.get("runner")
+        tstatus = payload.get("typecheck", {}).get("code")
+        ok = payload.get("ok")
+        cached = " (cached)" if (payload.get("cache") or {}).get("hit") else ""
+        print(f"[tests] runner={runner} typecheck_code={tstatus} ok={ok}{cached}")
+        if payload.get("failed_first"):
+            ff = payload["failed_first"]
+            state = "still failing; stopped" if ff["stopped"] else "now passing"
+            print(f"[tests] {len(ff['tests'])} previously failed test(s) {state} ({ff['wall_sec']:.1f}s)")
+        if payload.get("affected"):
+            print(f"[tests] {payload['affected']['summary']}")
+        for shard in payload.get("shards") or []:
+            print(f"[tests]   {shard['name']}: code={shard['code']} {shard['duration_sec']:.1f}s")
+        failed = [t["id"] for t in payload.get("tests") or [] if t["status"] == "failed"]
+        if failed:
+            more = f" (+{len(failed) - 10} more)" if len(failed) > 10 else ""
+            print(f"[tests] failing: {', '.join(failed[:10])}{more}")
+        flaky = (payload.get("reruns") or {}).get("flaky")
+        if flaky:
+            print(f"[tests] flaky (passed on a rerun): {', '.join(flaky)}")
+        quarantined = (payload.get("quarantine") or {}).get("failed") or []
+        if quarantined:
+            own = set(changed_paths(root, base) or ())
+            files = {t["id"]: t.get("file") for t in payload.get("tests") or []}
+            # A quarantined test the task is working on isn't excused
+            quarantined = [i for i in quarantined if files.get(i) not in own]
+        if failed and set(failed) <= set(quarantined) and tstatus in (0, None):
+            # Only known-flaky tests fail; not worth another implementation attempt
+            print(f"[tests] only quarantined tests fail: {', '.join(quarantined)}")
+            code = 0
+        if stats is not None:
+            if code == 0:
+                stats["failing"] = 0
+            elif payload.get("tests") is not None:
+                stats["failing"] = len(failed) + (tstatus not in (0, None))
+            else:
+                stats["failing"] = None
+        if not ok and payload.get("truncated"):
+            print(f"[tests] full output: {payload.get('stdout_path')} {payload.get('stderr_path')}")
+    else:
+        # The tool itself failed (usage error / crash)
+        print(payload.get("stdout", ""), end="")
+        print(payload.get("stderr", ""), end="")
     # If tests failed to invoke due to env, try doctor
-    if code == 127 or ("No test script/runner detected" in (out + err)):
+    if code == 127 or "No test script/runner detected" in payload.get("stderr", ""):
         print("[agent] Test runner not detected. Running tools/doctor.py --self-fix ...")
-        _c, _o, _e = run([sys.executable, str(root / "tools" / "doctor.py"), "--self-fix"], cwd=root)
-        if _o:
-            print(_o, end="")
-        if _e:
-            print(_e, end="")
+        fix = (call_tool("doctor", ["--self-fix"], root=root).get("self_fix") or {})
+        if fix.get("stdout"):
+            print(fix["stdout"], end="")
+        if fix.get("stderr"):
+            print(fix["stderr"], end="")
     return code == 0
 
 
+@_trace.traced()
 def git_commit(root: Path, message: str) -> bool:
     # Stage all and commit
-    code1, out1, err1 = run([sys.executable, str(root / "tools" / "git.py"), "--", "add", "-A"], cwd=root)
-    if out1:
-        print(out1, end="")
-    if err1:
-        print(err1, end="")
-    code2, out2, err2 = run([sys.executable, str(root / "tools" / "git.py"), "--", "commit", "-m", message], cwd=root)
+    res1 = call_tool("git", ["--", "add", "-A"], root=root)
+    if res1["stdout"]:
+        print(res1["stdout"], end="")
+    if res1["stderr"]:
+        print(res1["stderr"], end="")
+    res2 = call_tool("git", ["--", "commit", "-m", message], root=root)
+    out2, err2 = res2["stdout"], res2["stderr"]
     if out2:
         print(out2, end="")
     if err2:
         print(err2, end="")
-    if code2 == 0:
+    if res2["code"] == 0:
         return True
     # tolerate no-op commits
     joined = (out2 or "") + (err2 or "")
@@ -62,13 +181,7 @@ def git_commit(root: Path, message: str) -> bool:
     return False
 
 
-def subagent_exec(root: Path, prompt: str, workdir: Path | None, profile: str | None, model: str | None, ask: bool, full_auto: bool) -> int:
-    # If codex is not available, print the prompt and return non-zero
-    if not detect_codex(root):
-        print("Codex CLI not found. Please install @openai/codex and re-run.")
-        print("Prompt:")
-        print(prompt)
-        return 127
+def _codex_cmd(root: Path, prompt: str, workdir: Path | None, profile: str | None, model: str | None, ask: bool, full_auto: bool) -> list[str]:
     base = ["codex", "exec", "--cd", str(workdir or root)]
     if profile:
         base.extend(["--profile", profile])
@@ -79,7 +192,18 @@ def subagent_exec(root: Path, prompt: str, workdir: Path | None, profile: str |
     if full_auto:
         base.append("--full-auto")
     base.append(prompt)
-    code, out, err = run(base, cwd=root)
+    return base
+
+
+@_trace.traced("subagent")
+def subagent_exec(root: Path, prompt: str, workdir: Path | None, profile: str | None, model: str | None, ask: bool, full_auto: bool, timeout_sec: float | None = None) -> int:
+    # If codex is not available, print the prompt and return non-zero
+    if not detect_codex(root):
+        print("Codex CLI not found. Please install @openai/codex and re-run.")
+        print("Prompt:")
+        print(prompt)
+        return 127
+    code, out, err = run(_codex_cmd(root, prompt, workdir, profile, model, ask, full_auto), cwd=root, timeout_sec=timeout_sec)
     if out:
         print(out, end="")
     if err:
@@ -87,7 +211,185 @@ def subagent_exec(root: Path, prompt: str, workdir: Path | None, profile: str |
     return code
 
 
-def orchestrate_task(root: Path, task_id: str, workdir: Path | None, profile: str | None, model: str | None, ask: bool, full_auto: bool, max_retries: int) -> bool:
+@_trace.traced("early_check")
+def _early_check(root: Path, timeout_sec: float | None) -> str | None:
+    """The tree id of root's working tree if the tests affected by its uncommitted changes pass on it.
+
+    They run in a snapshot checkout of that tree (see _worktrees.snapshot()): the subagent
+    runs test.py in root meanwhile, and the two mustn't share test history, caches or build info.
+    """
+    tree = working_tree_hash(root)
+    code, head, _ = run(["git", "rev-parse", "HEAD^{tree}"], cwd=root)
+    if tree is None or (code == 0 and head.strip() == tree):
+        # Nothing changed yet, so nothing was selected: that's no evidence either way
+        return None
+    print("[agent] Tree settled; checking the affected tests while the subagent works")
+    with _worktrees.snapshot(root, tree) as snap:
+        if snap is None:
+            return None
+        return tree if run_tests(snap, changed=True, failed_first=True, timeout_sec=timeout_sec) else None
+
+
+async def _exec_watching(root: Path, cmd: list[str], timeout_sec: float | None) -> tuple[dict, str | None]:
+    """Run the subagent while checking the affected tests on every settled change.
+
+    It is stopped once they pass on a tree that hasn't moved since: no batch arrived during
+    the check and root's working tree is still the one checked.
+    """
+    pid = None
+
+    def on_event(event: dict) -> None:
+        nonlocal pid
+        if event["event"] == "start":
+            pid = event["pid"]
+
+    agent = asyncio.ensure_future(arun_ex(cmd, cwd=root, timeout_sec=timeout_sec, on_event=on_event))
+    watcher = await asyncio.to_thread(_watch.open_watcher, root)
+    changes = _watch.batches(root, watcher, debounce_sec=EARLY_CHECK_SETTLE_SEC)
+    next_batch = asyncio.ensure_future(anext(changes))
+    check = None
+    stale = False
+    green = None
+    try:
+        while not agent.done() and green is None:
+            waits = {agent, next_batch} | ({check} if check is not None else set())
+            done, _ = await asyncio.wait(waits, return_when=asyncio.FIRST_COMPLETED)
+            if next_batch in done:
+                next_batch = asyncio.ensure_future(anext(changes))
+                # One check at a time (it can't be interrupted); a batch during it means another
+                stale = check is not None
+                if check is None:
+                    check = asyncio.ensure_future(asyncio.to_thread(_early_check, root, timeout_sec))
+            if check is not None and check.done():
+                passed = check.result()
+                check = None
+                if passed is not None and not stale and await asyncio.to_thread(working_tree_hash, root) == passed:
+                    green = passed
+                elif stale or passed is not None:
+                    # Green on a tree the subagent has since moved on from: check where it is now
+                    stale = False
+                    check = asyncio.ensure_future(asyncio.to_thread(_early_check, root, timeout_sec))
+        if check is not None:
+            # The subagent finished first; the check in flight still tells verification something
+            green = await check
+        if not agent.done():
+            print("[agent] Affected tests pass on a stable tree; stopping the subagent")
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except (ProcessLookupError, TypeError):
+                pass
+            try:
+                await asyncio.wait_for(asyncio.shield(agent), EARLY_STOP_GRACE_SEC)
+            except asyncio.TimeoutError:
+                # Killed rather than cancelled, so what it printed is still returned
+                try:
+                    os.kill(pid, signal.SIGKILL)
+                except (ProcessLookupError, TypeError):
+                    pass
+                await agent
+        return agent.result(), green
+    finally:
+        next_batch.cancel()
+        await asyncio.gather(next_batch, return_exceptions=True)
+        await changes.aclose()
+        watcher.close()
+
+
+@_trace.traced("subagent")
+def subagent_exec_until_green(root: Path, prompt: str, workdir: Path | None, profile: str | None, model: str | None, ask: bool, full_auto: bool, timeout_sec: float | None = None) -> tuple[int, str | None]:
+    """subagent_exec() with speculative verification: (code, tree id the affected tests passed on, or None).
+
+    While the subagent runs, every settled batch of changes to root gets the affected tests
+    run against a snapshot of it; once they pass and the tree is still that snapshot, the
+    subagent is asked to stop (SIGTERM, then killed after EARLY_STOP_GRACE_SEC). CODEX_EARLY_STOP=0 turns this off.
+    """
+    if not detect_codex(root) or not _parse_bool_env("CODEX_EARLY_STOP", True):
+        return subagent_exec(root, prompt, workdir, profile, model, ask, full_auto, timeout_sec), None
+    res, green = asyncio.run(_exec_watching(root, _codex_cmd(root, prompt, workdir, profile, model, ask, full_auto), timeout_sec))
+    if res["stdout"]:
+        print(res["stdout"], end="")
+    if res["stderr"]:
+        print(res["stderr"], end="")
+    return res["code"], green
+
+
+def _in_tree(root: Path, tree: Path, workdir: Path | None) -> Path | None:
+    """workdir (relative to root, or under it) as the same directory of tree."""
+    if workdir is None or tree == root:
+        return workdir
+    rel = workdir.resolve().relative_to(root.resolve()) if workdir.is_absolute() else workdir
+    return tree / rel
+
+
+def _task_base(root: Path, tree: Path) -> str | None:
+    """Commit the task's changes in tree start from: None (HEAD) in place, else where its branch left root's HEAD."""
+    if tree == root:
+        return None
+    code, head, _ = run(["git", "rev-parse", "HEAD"], cwd=root)
+    if code != 0:
+        return None
+    code, out, _ = run(["git", "merge-base", "HEAD", head.strip()], cwd=tree)
+    return out.strip() if code == 0 else None
+
+
+def _checkpoint(root: Path, task_id: str, stage: str, tree: Path, **extra) -> None:
+    with locked_tasks(root) as data:
+        set_checkpoint(data, task_id, stage, working_tree_hash(tree), **extra)
+
+
+def _resume_point(root: Path, task_id: str, t: dict, tree: Path, worktree: _worktrees.Lease | None) -> dict:
+    """The task's checkpoint if the tree is still the one it was taken on; otherwise it is dropped ({})."""
+    cp = t.get("checkpoint") or {}
+    if cp.get("stage") not in CHECKPOINT_STAGES:
+        return {}
+    if worktree is not None and not worktree.resumed:
+        # A fresh checkout: whatever the checkpoint covered is gone with the old slot
+        current = None
+    else:
+        current = working_tree_hash(tree)
+    if current is not None and current == cp.get("tree"):
+        print(f"[agent] Resuming task {task_id} after stage '{cp['stage']}'.")
+        return cp
+    print(f"[agent] Working tree changed since task {task_id} reached '{cp['stage']}'; starting it over.")
+    if worktree is not None and worktree.resumed:
+        worktree.reset()
+    with locked_tasks(root) as data:
+        loc = find_task(data, task_id)
+        if loc:
+            data["phases"][loc[0]]["tasks"][loc[1]].pop("checkpoint", None)
+    return {}
+
+
+@_trace.traced("task", args=("task_id",))
+def orchestrate_task(root: Path, task_id: str, workdir: Path | None, profile: str | None, model: str | None, ask: bool, full_auto: bool, max_retries: int, worktree: _worktrees.Lease | None = None, budget: Budget | None = None) -> bool:
+    """Tests, implementation and commit for one task (TDD), then document and mark it done.
+
+    With worktree (a leased checkout; see _worktrees.py) the work happens in that checkout
+    and its branch goes through the merge queue before the task counts as done.
+
+    Each stage reached is checkpointed in the task record with the tree's hash; a later run
+    of the task carries on after the last one as long as the tree still has that hash.
+
+    budget bounds the subagent and test runs up to the commit (landing and documenting a
+    committed task always finish). Implementation attempts stop early once one fails with
+    no fewer failing tests than the one before; with a time limit, attempts that keep
+    reducing the failures go on past max_retries until it runs out. How the run went is
+    kept in the task record's "budget".
+    """
+    budget = budget or Budget()
+    report: dict = {"attempts": [], "stopped": None}
+    try:
+        return _orchestrate_task(root, task_id, workdir, profile, model, ask, full_auto, max_retries, worktree, budget, report)
+    finally:
+        with locked_tasks(root) as data:
+            loc = find_task(data, task_id)
+            if loc:
+                data["phases"][loc[0]]["tasks"][loc[1]]["budget"] = {**budget.status(), **report}
+
+
+def _orchestrate_task(root: Path, task_id: str, workdir: Path | None, profile: str | None, model: str | None, ask: bool, full_auto: bool, max_retries: int, worktree: _worktrees.Lease | None, budget: Budget, report: dict) -> bool:
+    tree = worktree.tree if worktree else root
+    focus = _in_tree(root, tree, workdir)
     data = load_tasks(root)
     loc = find_task(data, task_id)
     if not loc:
@@ -96,6 +398,20 @@ def orchestrate_task(root: Path, task_id: str, workdir: Path | None, profile: st
     pi, ti = loc
     t = data["phases"][pi]["tasks"][ti]
     title = t["title"]
+    cp = _resume_point(root, task_id, t, tree, worktree)
+    reached = CHECKPOINT_STAGES.index(cp["stage"]) if cp else -1
+
+    def past(stage: str) -> bool:
+        return reached >= CHECKPOINT_STAGES.index(stage)
+
+    # Where the task likely lives, so the subagent doesn't start by exploring
+    focus_rel = None
+    if workdir is not None:
+        try:
+            focus_rel = (workdir.resolve().relative_to(root.resolve()) if workdir.is_absolute() else workdir).as_posix()
+        except ValueError:
+            pass
+    context = _index.context_block(tree, title, focus_rel)
 
     # 1) Write failing tests
     test_prompt = (
@@ -106,37 +422,102 @@ def orchestrate_task(root: Path, task_id: str, workdir: Path | None, profile: st
         "Use Node.js conventions and existing test framework.\n"
         "After writing tests, run `python3 tools/test.py` to verify they FAIL (red).\n"
         "When tests fail as expected, stop.\n"
+        f"\n{context}"
     )
-    print(f"[agent] Writing tests for task {task_id}: {title}")
-    rc = subagent_exec(root, test_prompt, workdir, profile, model, ask, full_auto)
-    if rc != 0:
-        print(f"Subagent returned {rc} while writing tests.")
-    # Verify tests fail
-    ok = run_tests(root)
-    if ok:
-        print("Tests passed unexpectedly after test-writing phase. Strengthening tests...")
-        # One retry to strengthen tests
-        rc2 = subagent_exec(root, test_prompt + "\nStrengthen tests to ensure they fail before implementation.", workdir, profile, model, ask, full_auto)
-        ok2 = run_tests(root)
-        if ok2:
-            print("Tests still pass; proceeding, but this may indicate weak tests.")
+    def out_of_time() -> bool:
+        if not budget.exhausted():
+            return False
+        print(f"[agent] Task {task_id} is out of time ({budget.status()['used_sec']:.0f}s used); stopping.", file=sys.stderr)
+        report["stopped"] = "budget"
+        return True
+
+    # Only a test-writing run that finished cleanly is checkpointed (one killed mid-write is redone)
+    written = past("tests_written")
+    if not written:
+        if out_of_time():
+            return False
+        print(f"[agent] Writing tests for task {task_id}: {title}")
+        with _trace.span("write_tests", task=task_id):
+            rc = subagent_exec(tree, test_prompt, focus, profile, model, ask, full_auto, budget.remaining())
+        if rc != 0:
+            print(f"Subagent returned {rc} while writing tests.")
+        else:
+            written = True
+            _checkpoint(root, task_id, "tests_written", tree)
+    if not past("red"):
+        if out_of_time():
+            return False
+        with _trace.span("confirm_red", task=task_id) as attrs:
+            # Verify tests fail
+            ok = run_tests(tree, timeout_sec=budget.remaining())
+            if ok and not out_of_time():
+                print("Tests passed unexpectedly after test-writing phase. Strengthening tests...")
+                # One retry to strengthen tests
+                rc2 = subagent_exec(tree, test_prompt + "\nStrengthen tests to ensure they fail before implementation.", focus, profile, model, ask, full_auto, budget.remaining())
+                ok = run_tests(tree, timeout_sec=budget.remaining())
+                if ok:
+                    print("Tests still pass; proceeding, but this may indicate weak tests.")
+            attrs["red"] = not ok
+        if written:
+            _checkpoint(root, task_id, "red", tree)
 
     # 2) Implement feature until tests pass
+    def verify(early: str | None = None, stats: dict | None = None) -> bool:
+        # Retries check the last failures, then the affected tests; the full suite is the gate before committing
+        base = _task_base(root, tree)
+
+        def gate(**kw) -> bool:
+            return run_tests(tree, timeout_sec=budget.remaining(), stats=stats, reruns=TEST_RERUNS, base=base, **kw)
+
+        if early is not None and early == working_tree_hash(tree):
+            # The affected tests already passed on exactly this tree while the subagent worked
+            green = gate()
+        else:
+            green = gate(changed=True, failed_first=True) and gate()
+        if green:
+            _checkpoint(root, task_id, "green", tree)
+        return green
+
+    ok = past("green")
+    earlier = 0
+    if cp.get("stage") == "implemented":
+        # The interrupted run's last attempt is checked first; this run still gets all of its own
+        earlier = int(cp.get("attempt") or 0)
+        ok = verify(cp.get("early_green"))
     tries = 0
-    while tries <= max_retries:
+    previous = None
+    while not ok and (tries <= max_retries or budget.deadline is not None):
+        if out_of_time():
+            return False
         impl_prompt = (
             f"You are Codex working in TDD mode.\n"
             f"Task: {title}\n\n"
             "Implement the minimal code required to pass the existing failing tests.\n"
-            "Run `python3 tools/test.py` repeatedly until all tests pass.\n"
+            "Run `python3 tools/test.py --failed-first` repeatedly until all tests pass.\n"
             "Keep changes focused; avoid unrelated refactors.\n"
+            f"\n{context}"
         )
-        print(f"[agent] Implementing for task {task_id} (attempt {tries+1}/{max_retries+1})")
-        rc = subagent_exec(root, impl_prompt, workdir, profile, model, ask, full_auto)
-        ok = run_tests(root)
+        print(f"[agent] Implementing for task {task_id} (attempt {_attempt_label(tries, max_retries)})")
+        started = time.monotonic()
+        stats: dict = {}
+        with _trace.span("attempt", task=task_id, attempt=earlier + tries + 1) as attrs:
+            rc, early = subagent_exec_until_green(tree, impl_prompt, focus, profile, model, ask, full_auto, budget.remaining())
+            if written:
+                _checkpoint(root, task_id, "implemented", tree, attempt=earlier + tries + 1, early_green=early)
+            ok = attrs["green"] = verify(early, stats)
+            attrs["failing"] = failing = stats.get("failing")
+        report["attempts"].append({"attempt": earlier + tries + 1, "failing": failing, "sec": round(time.monotonic() - started, 1)})
         if ok:
             break
         tries += 1
+        if failing is not None and previous is not None and failing >= previous:
+            print(f"[agent] No progress on task {task_id} ({failing} failing, {previous} after the attempt before); stopping early.")
+            report["stopped"] = "no_progress"
+            break
+        if tries > max_retries and (failing is None or previous is None):
+            # Only measurable progress buys attempts beyond max_retries
+            break
+        previous = failing
 
     if not ok:
         print("Tests still failing after implementation attempts.", file=sys.stderr)
@@ -144,18 +525,35 @@ def orchestrate_task(root: Path, task_id: str, workdir: Path | None, profile: st
 
     # 3) Commit and mark done
     msg = f"feat: {title} [task:{task_id}]"
-    committed = git_commit(root, msg)
-    if not committed:
-        print("Git commit failed; please check repository state.", file=sys.stderr)
-        return False
-    # Document
-    run([sys.executable, str(root / "tools" / "document.py"), "--title", title, "--summary", f"Completed via TDD; commit message: {msg}", "--paths", str(workdir or ".")], cwd=root)
-    # Memorize key context at scope
-    run([sys.executable, str(root / "tools" / "memorize.py"), "add", "--path", str(workdir or "."), "--note", f"Completed task '{title}' via TDD; commit: {msg}"], cwd=root)
-    # Mark done
-    data["phases"][pi]["tasks"][ti]["done"] = True
-    data["phases"][pi]["tasks"][ti]["completed"] = timestamp()
-    save_tasks(root, data)
+    if not past("committed"):
+        committed = git_commit(tree, msg)
+        if not committed:
+            print("Git commit failed; please check repository state.", file=sys.stderr)
+            return False
+        _checkpoint(root, task_id, "committed", tree)
+    # Other tasks may be landing or documenting in root concurrently
+    with _worktrees.checkout_lock(root) if worktree else contextlib.nullcontext():
+        if worktree:
+            # The full suite again if the branch had to be rebased onto newer landings
+            with _trace.span("land", task=task_id, branch=worktree.branch) as attrs:
+                landed, out = _worktrees.land(root, worktree, verify=lambda: run_tests(tree, base=_task_base(root, tree)))
+                attrs["landed"] = landed
+            if not landed:
+                print(f"Could not land {worktree.branch} (kept for inspection): {out}", file=sys.stderr)
+                return False
+        with _trace.span("document", task=task_id):
+            # Document
+            call_tool("document", ["--title", title, "--summary", f"Completed via TDD; commit message: {msg}", "--paths", str(workdir or ".")], root=root)
+            # Memorize key context at scope
+            call_tool("memorize", ["add", "--path", str(workdir or "."), "--note", f"Completed task '{title}' via TDD; commit: {msg}"], root=root)
+    # Mark done (the last checkpoint goes with it: there is nothing left to resume)
+    with locked_tasks(root) as data:
+        loc = find_task(data, task_id)
+        if loc:
+            pi, ti = loc
+            set_checkpoint(data, task_id, "documented", working_tree_hash(root))
+            data["phases"][pi]["tasks"][ti]["done"] = True
+            data["phases"][pi]["tasks"][ti]["completed"] = timestamp()
     print(f"[agent] Task {task_id} complete and committed.")
     return True
 
@@ -165,30 +563,115 @@ def ingest_prd(root: Path, text: str, phase_name: str | None) -> int:
     if not steps:
         print("No tasks detected in PRD.", file=sys.stderr)
         return 1
-    data = load_tasks(root)
-    idx = add_phase(data, phase_name or "PRD Plan")
-    set_current_phase(data, idx)
-    for s in steps:
-        add_task(data, idx, s)
-    save_tasks(root, data)
+    with locked_tasks(root) as data:
+        idx = add_phase(data, phase_name or "PRD Plan")
+        set_current_phase(data, idx)
+        for s in steps:
+            add_task(data, idx, s)
     print(f"Ingested PRD into phase {idx} with {len(steps)} tasks.")
     return 0
 
 
-def run_phase(root: Path, phase_idx: int, profile: str | None, model: str | None, ask: bool, full_auto: bool, max_retries: int, workdir: Path | None) -> int:
+def _run_in_worktree(root: Path, task_id: str, *args, budget: Budget | None = None) -> bool:
+    """orchestrate_task() in a leased pool worktree; the branch of a failed task is kept."""
+    lease = _worktrees.acquire(root, task_id)
+    if lease is None:
+        return False
+    ok = False
+    try:
+        ok = orchestrate_task(root, task_id, *args, worktree=lease, budget=budget)
+    finally:
+        lease.release(delete_branch=ok)
+    return ok
+
+
+@_trace.traced(args=("phase_idx", "jobs"))
+def run_phase(root: Path, phase_idx: int, profile: str | None, model: str | None, ask: bool, full_auto: bool, max_retries: int, workdir: Path | None, jobs: int = 1, task_budget: float | None = None, phase_budget: float | None = None) -> int:
+    """Run the phase's pending tasks in dependency order, up to jobs at a time.
+
+    A task starts once all of its depends_on are done and is skipped if one of them failed,
+    was skipped, or is a pending task of another phase. With jobs > 1 every task runs in its
+    pooled git worktree and lands on the current branch when it completes; otherwise tasks run
+    in place and the first failure stops the phase (its changes are still in the tree).
+
+    Each task gets task_budget seconds, and none runs past phase_budget seconds from now;
+    once that is over, the tasks not started yet are skipped.
+    """
+    phase_deadline = time.monotonic() + phase_budget if phase_budget else None
     data = load_tasks(root)
     if phase_idx < 0 or phase_idx >= len(data.get("phases", [])):
         print(f"Phase {phase_idx} not found", file=sys.stderr)
         return 1
     ph = data["phases"][phase_idx]
-    for t in ph.get("tasks", []):
-        if t.get("done"):
-            continue
-        task_id = t.get("id")
-        ok = orchestrate_task(root, task_id, workdir, profile, model, ask, full_auto, max_retries)
-        if not ok:
-            print(f"Stopping due to failure on task {task_id}.")
-            return 2
+    everything = {t["id"]: t for p in data["phases"] for t in p.get("tasks", [])}
+    done = {tid for tid, t in everything.items() if t.get("done")}
+    pending = {t["id"]: t for t in ph.get("tasks", []) if not t.get("done")}
+    failed: set[str] = set()
+    skipped: set[str] = set()
+    running: dict = {}
+    args = (workdir, profile, model, ask, full_auto, max_retries)
+
+    def blockers(t: dict) -> list[str]:
+        # Removed tasks don't block anything
+        return [
+            d for d in task_deps(t)
+            if d in failed or d in skipped or (d in everything and d not in done and d not in pending and d not in running.values())
+        ]
+
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        while pending or running:
+            if pending and phase_deadline is not None and time.monotonic() >= phase_deadline:
+                print(f"[agent] Phase budget used up; skipping {len(pending)} task(s) not started: {', '.join(pending)}.")
+                skipped |= set(pending)
+                pending.clear()
+            dropped = True
+            while dropped:
+                dropped = False
+                for tid, t in list(pending.items()):
+                    bad = blockers(t)
+                    if bad:
+                        print(f"[agent] Skipping task {tid}: depends on {', '.join(bad)}, which did not complete.")
+                        skipped.add(tid)
+                        del pending[tid]
+                        dropped = True
+            for tid, t in list(pending.items()):
+                if len(running) >= max(1, jobs):
+                    break
+                if all(d in done or d not in everything for d in task_deps(t)):
+                    del pending[tid]
+                    # A copy of the context per task, so its spans nest under this phase
+                    ctx = contextvars.copy_context()
+                    budget = Budget(task_budget, phase_deadline)
+                    if jobs > 1:
+                        running[pool.submit(ctx.run, _run_in_worktree, root, tid, *args, budget=budget)] = tid
+                    else:
+                        running[pool.submit(ctx.run, orchestrate_task, root, tid, *args, budget=budget)] = tid
+            if not running:
+                # Whatever is left waits on itself
+                for tid in pending:
+                    print(f"[agent] Skipping task {tid}: dependency cycle.")
+                skipped |= set(pending)
+                break
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for fut in finished:
+                tid = running.pop(fut)
+                try:
+                    ok = fut.result()
+                except Exception as e:
+                    print(f"[agent] Task {tid} crashed: {e!r}", file=sys.stderr)
+                    ok = False
+                if ok:
+                    done.add(tid)
+                else:
+                    print(f"[agent] Task {tid} failed.")
+                    failed.add(tid)
+                    if jobs <= 1:
+                        print(f"Stopping due to failure on task {tid}.")
+                        skipped |= set(pending)
+                        pending.clear()
+    if failed or skipped:
+        print(f"Phase {phase_idx}: {len(failed)} task(s) failed, {len(skipped)} skipped.")
+        return 2
     print(f"Phase {phase_idx} completed.")
     return 0
 
@@ -211,6 +694,8 @@ def main(argv=None) -> int:
     p_runp.add_argument("-a", "--ask-for-approval", action="store_true", help="Require approval in Codex CLI")
     p_runp.add_argument("--full-auto", action="store_true", help="Enable full-auto mode")
     p_runp.add_argument("--max-retries", type=int, default=2, help="Max implementation retries per task")
+    p_runp.add_argument("-j", "--jobs", type=int, default=1, help="Tasks to run at once, each in its own git worktree (default: 1, in place)")
+    p_runp.add_argument("--phase-budget", type=float, metavar="SECONDS", help="Wall-clock limit for the whole phase; tasks not started by then are skipped")
 
     p_runt = sub.add_parser("run-task", help="Execute a single task by id using TDD workflow.")
     p_runt.add_argument("--id", required=True, help="Task id")
@@ -221,18 +706,32 @@ def main(argv=None) -> int:
     p_runt.add_argument("--full-auto", action="store_true", help="Enable full-auto mode")
     p_runt.add_argument("--max-retries", type=int, default=2, help="Max implementation retries")
 
+    for p in (p_runp, p_runt):
+        p.add_argument("--task-budget", type=float, metavar="SECONDS", help="Wall-clock limit per task for subagents and tests; attempts that keep cutting the failures may then go past --max-retries")
+
+    for p in (p_runp, p_runt):
+        p.add_argument("--isolate-tools", action="store_true", help="Run sub-tools (test/git/document/memorize) as separate Python processes instead of in-process")
+        p.add_argument("--trace", action="store_true", help="Record a span trace of the run to .codex/traces (Chrome trace-event JSON, for Perfetto or chrome://tracing); also CODEX_TRACE=1")
+        p.add_argument("--no-early-stop", action="store_true", help="Let implementation subagents run to the end instead of stopping them once the affected tests pass")
+
     args = parser.parse_args(argv)
     root = find_repo_root()
+    if getattr(args, "isolate_tools", False):
+        os.environ["CODEX_TOOL_ISOLATION"] = "1"
+    if getattr(args, "no_early_stop", False):
+        os.environ["CODEX_EARLY_STOP"] = "0"
+    if getattr(args, "trace", False):
+        _trace.start()
 
     if args.cmd == "ingest-prd":
         text = args.text if args.text else read_file(args.file)
         return ingest_prd(root, text, args.phase_name)
 
     if args.cmd == "run-phase":
-        return run_phase(root, args.index, args.profile, args.model, args.ask_for_approval, args.full_auto, args.max_retries, args.dir)
+        return run_phase(root, args.index, args.profile, args.model, args.ask_for_approval, args.full_auto, args.max_retries, args.dir, args.jobs, args.task_budget, args.phase_budget)
 
     if args.cmd == "run-task":
-        ok = orchestrate_task(root, args.id, args.dir, args.profile, args.model, args.ask_for_approval, args.full_auto, args.max_retries)
+        ok = orchestrate_task(root, args.id, args.dir, args.profile, args.model, args.ask_for_approval, args.full_auto, args.max_retries, budget=Budget(args.task_budget))
         return 0 if ok else 2
 
     return 1
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""End-to-end orchestrator benchmark: ingest-prd -> run-phase on synthetic repos, offline.
+
+Every size makes a scratch git repo (node:test, no dependencies) with
+filler modules and tests, and a PRD of one task per size unit, then runs
+agent.py against it with _fake_codex.py standing in for `codex` and
+--trace on. The trace gives the per-stage latencies; orchestrator overhead
+is the task time not spent inside the (fake) subagent. Results are printed
+and kept in .codex/bench/ of the repo the tools belong to.
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from _utils import ensure_codex_dir, find_repo_root, run, timestamp, write_json
+from _fake_codex import PROFILES
+from _logs import unique_stem
+
+
+TOOLS_DIR = Path(__file__).resolve().parent
+BENCH_DIR = "bench"
+# Spans reported per stage (see agent.py / _trace.py)
+STAGES = ("task", "write_tests", "confirm_red", "attempt", "subagent", "run_tests", "git_commit", "land", "document")
+
+
+def _make_repo(path: Path, tasks: int, filler: int) -> str:
+    """A synthetic repo with filler modules and their tests; returns the PRD text."""
+    (path / "src").mkdir(parents=True)
+    (path / "tests").mkdir()
+    (path / "package.json").write_text(json.dumps({"name": "bench", "private": True, "type": "module", "scripts": {"test": "node --test tests/"}}, indent=2) + "\n", encoding="utf-8")
+    (path / ".gitignore").write_text("node_modules\n.codex\n", encoding="utf-8")
+    for i in range(filler):
+        (path / "src" / f"filler_{i}.mjs").write_text(f"export function filler_{i}() {{\n  return {i};\n}}\n", encoding="utf-8")
+        (path / "tests" / f"filler_{i}.test.mjs").write_text(
+            "import { test } from 'node:test';\n"
+            "import assert from 'node:assert/strict';\n"
+            f"import {{ filler_{i} }} from '../src/filler_{i}.mjs';\n\n"
+            f"test('filler_{i}', () => assert.equal(filler_{i}(), {i}));\n",
+            encoding="utf-8",
+        )
+    for cmd in (["git", "init", "-q"], ["git", "add", "-A"], ["git", "-c", "user.name=bench", "-c", "user.email=bench@localhost", "commit", "-qm", "init"]):
+        code, _, err = run(cmd, cwd=path)
+        if code != 0:
+            raise RuntimeError(f"{' '.join(cmd)} failed: {err}")
+    return "\n".join(f"- Add feature_{i} returning {i}" for i in range(tasks)) + "\n"
+
+
+def _fake_codex_bin(path: Path) -> Path:
+    bin_dir = path / "bin"
+    bin_dir.mkdir()
+    shim = bin_dir / "codex"
+    shim.write_text(f'#!/bin/sh\nexec "{sys.executable}" "{TOOLS_DIR / "_fake_codex.py"}" "$@"\n', encoding="utf-8")
+    shim.chmod(0o755)
+    return bin_dir
+
+
+def _stage_stats(trace: dict) -> tuple[dict, dict]:
+    """(per stage {count, total_sec, mean_sec, p95_sec}, {summed task time, summed codex process time})."""
+    spans: dict[str, list[float]] = {}
+    codex = 0.0
+    for ev in trace.get("traceEvents", []):
+        if ev.get("ph") != "X":
+            continue
+        sec = ev["dur"] / 1e6
+        if ev.get("cat") == "proc" and ev["name"] == "codex":
+            codex += sec
+        elif ev.get("cat") == "agent" and ev["name"] in STAGES:
+            spans.setdefault(ev["name"], []).append(sec)
+    stats = {}
+    for name in STAGES:
+        vals = sorted(spans.get(name) or ())
+        if vals:
+            stats[name] = {
+                "count": len(vals),
+                "total_sec": round(sum(vals), 3),
+                "mean_sec": round(statistics.fmean(vals), 3),
+                "p95_sec": round(vals[min(len(vals) - 1, int(len(vals) * 0.95))], 3),
+            }
+    task_sec = sum(spans.get("task") or ())
+    return stats, {"task_sec": round(task_sec, 3), "codex_sec": round(codex, 3)}
+
+
+def bench_one(tasks: int, filler: int, profile: str, jobs: int, extra: list[str], keep: bool) -> dict:
+    work = Path(tempfile.mkdtemp(prefix=f"codex-bench-{tasks}-"))
+    repo = work / "repo"
+    traces = work / "traces"
+    try:
+        prd = _make_repo(repo, tasks, filler)
+        env = {
+            "PATH": f"{_fake_codex_bin(work)}{os.pathsep}{os.environ.get('PATH', '')}",
+            "FAKE_CODEX_PROFILE": profile,
+            "CODEX_TRACE_DIR": str(traces),
+            "GIT_AUTHOR_NAME": "bench", "GIT_AUTHOR_EMAIL": "bench@localhost",
+            "GIT_COMMITTER_NAME": "bench", "GIT_COMMITTER_EMAIL": "bench@localhost",
+        }
+        agent = [sys.executable, str(TOOLS_DIR / "agent.py")]
+        started = time.monotonic()
+        code, out, err = run([*agent, "ingest-prd", "--text", prd, "--phase-name", "bench"], cwd=repo, env=env)
+        if code != 0:
+            raise RuntimeError(f"ingest-prd failed ({code}): {err or out}")
+        phase = json.loads((repo / ".codex" / "tasks.json").read_text(encoding="utf-8"))["current_phase"]
+        run_started = time.monotonic()
+        code, out, err = run([*agent, "run-phase", "--index", str(phase), "-j", str(jobs), "--trace", *extra], cwd=repo, env=env)
+        wall = time.monotonic() - run_started
+        data = json.loads((repo / ".codex" / "tasks.json").read_text(encoding="utf-8"))
+        done = sum(1 for t in data["phases"][phase]["tasks"] if t.get("done"))
+        trace_files = sorted(traces.glob("*.json"))
+        trace = json.loads(trace_files[-1].read_text(encoding="utf-8")) if trace_files else {}
+        stages, split = _stage_stats(trace)
+        overhead = split["task_sec"] - split["codex_sec"]
+        return {
+            "tasks": tasks,
+            "filler": filler,
+            "profile": profile,
+            "jobs": jobs,
+            "code": code,
+            "done": done,
+            # A clean exit with tasks left undone (e.g. every attempt failing) is no baseline either
+            "ok": code == 0 and done == tasks,
+            "ingest_sec": round(run_started - started, 3),
+            "wall_sec": round(wall, 3),
+            "tasks_per_min": round(done / wall * 60, 2) if wall > 0 else None,
+            "subagent_sec": split["codex_sec"],
+            "overhead_sec": round(overhead, 3),
+            "overhead_per_task_sec": round(overhead / tasks, 3) if tasks else None,
+            "stages": stages,
+            "work_dir": str(work) if keep else None,
+            "stderr_tail": err[-2000:] if code != 0 or done < tasks else "",
+        }
+    finally:
+        if not keep:
+            shutil.rmtree(work, ignore_errors=True)
+
+
+def _print_result(r: dict) -> None:
+    print(
+        f"[bench] {r['tasks']} task(s), {r['filler']} filler, {r['profile']}, -j {r['jobs']}: "
+        f"{r['done']}/{r['tasks']} done in {r['wall_sec']:.1f}s ({r['tasks_per_min']} tasks/min), "
+        f"overhead {r['overhead_sec']:.1f}s ({r['overhead_per_task_sec']:.2f}s/task), subagent {r['subagent_sec']:.1f}s"
+    )
+    for name, s in r["stages"].items():
+        print(f"[bench]   {name:<12} n={s['count']:<4} mean={s['mean_sec']:.3f}s p95={s['p95_sec']:.3f}s total={s['total_sec']:.1f}s")
+    if not r["ok"]:
+        print(f"[bench]   run-phase exited {r['code']} with {r['tasks'] - r['done']} task(s) not done:\n{r['stderr_tail']}", file=sys.stderr)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark agent.py ingest-prd -> run-phase on synthetic repos with a fake codex.")
+    parser.add_argument("--sizes", default="3,10", help="Comma-separated task counts, one synthetic repo each (default: 3,10)")
+    parser.add_argument("--filler", type=int, default=10, help="Filler modules (with a test each) per task (default: 10)")
+    parser.add_argument("--profile", default="fast", choices=PROFILES, help="Fake codex behaviour (see _fake_codex.py)")
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="run-phase --jobs")
+    parser.add_argument("--agent-arg", action="append", default=[], metavar="ARG", help="Extra run-phase argument (repeatable), e.g. --agent-arg=--task-budget=60")
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch repos")
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON")
+    args = parser.parse_args(argv)
+
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    results = []
+    for n in sizes:
+        res = bench_one(n, n * args.filler, args.profile, args.jobs, args.agent_arg, args.keep)
+        results.append(res)
+        if not args.json:
+            _print_result(res)
+    report = {"ts": timestamp(), "argv": sys.argv[1:] if argv is None else argv, "results": results}
+    out = ensure_codex_dir(find_repo_root(TOOLS_DIR)) / BENCH_DIR / f"{unique_stem('bench')}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    write_json(out, report)
+    if args.json:
+        print(json.dumps(report))
+    else:
+        print(f"[bench] saved {out}")
+    return 0 if all(r["ok"] for r in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
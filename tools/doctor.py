@@ -5,6 +5,7 @@ import sys
 from pathlib import Path
 
 from _utils import find_repo_root, ensure_codex_dir, run, read_file, timestamp
+from _dispatch import call_tool
 
 
 def py_compile_all(root: Path) -> dict:
@@ -25,8 +26,9 @@ def check_node_env(root: Path) -> dict:
 
 
 def check_tests_detect(root: Path) -> dict:
-    code, out, err = run([sys.executable, str(root / "tools" / "test.py"), "--detect"], cwd=root)
-    return {"ok": code == 0, "stdout": out, "stderr": err}
+    # In a subprocess: a test.py that's broken must show up here, not take doctor down
+    res = call_tool("test", ["--detect"], root=root, isolated=True)
+    return {"ok": res["code"] == 0, "stdout": res.get("stdout", ""), "stderr": res.get("stderr", "")}
 
 
 def build_fix_prompt(root: Path, report: dict) -> str:
@@ -45,12 +47,11 @@ def build_fix_prompt(root: Path, report: dict) -> str:
     )
 
 
-def maybe_self_fix(root: Path, report: dict, profile: str | None, model: str | None, ask: bool, full_auto: bool) -> int:
+def maybe_self_fix(root: Path, report: dict, profile: str | None, model: str | None, ask: bool, full_auto: bool) -> dict:
     # Check for codex
     code, _, _ = run(["which", "codex"], cwd=root)
     if code != 0:
-        print("Codex CLI not found; cannot self-fix automatically.")
-        return 127
+        return {"code": 127, "stdout": "Codex CLI not found; cannot self-fix automatically.\n", "stderr": ""}
     prompt = build_fix_prompt(root, report)
     base = ["codex", "exec", "--cd", str(root)]
     if profile:
@@ -63,14 +64,10 @@ def maybe_self_fix(root: Path, report: dict, profile: str | None, model: str | N
         base.append("--full-auto")
     base.append(prompt)
     rc, out, err = run(base, cwd=root)
-    if out:
-        print(out, end="")
-    if err:
-        print(err, end="")
-    return rc
+    return {"code": rc, "stdout": out, "stderr": err}
 
 
-def main(argv=None) -> int:
+def build_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser(description="Diagnose and optionally self-fix the Codex tools.")
     parser.add_argument("--self-fix", action="store_true", help="Attempt to repair tools using Codex CLI")
     parser.add_argument("--profile", default="gpt5", help="Codex CLI profile")
@@ -78,8 +75,10 @@ def main(argv=None) -> int:
     parser.add_argument("-a", "--ask-for-approval", action="store_true", help="Codex CLI approval mode")
     parser.add_argument("--full-auto", action="store_true", help="Codex full-auto mode")
     parser.add_argument("--json", action="store_true", help="Emit JSON diagnostics report")
-    args = parser.parse_args(argv)
+    return parser
+
 
+def execute(args) -> dict:
     root = find_repo_root()
 
     report = {
@@ -88,14 +87,9 @@ def main(argv=None) -> int:
         "tests_detect": check_tests_detect(root),
     }
 
-    if args.json:
-        print(json.dumps(report))
-    else:
-        print("Diagnostics:")
-        print(json.dumps(report, indent=2))
-
     if args.self_fix:
-        return maybe_self_fix(root, report, args.profile, args.model, args.ask_for_approval, args.full_auto)
+        fix = maybe_self_fix(root, report, args.profile, args.model, args.ask_for_approval, args.full_auto)
+        return {"code": fix["code"], "report": report, "self_fix": fix}
 
     # Non-zero if any critical check failed
     ok = (
@@ -103,7 +97,31 @@ def main(argv=None) -> int:
         and report["node_env"]["node"]["ok"]
         and report["node_env"]["npm"]["ok"]
     )
-    return 0 if ok else 1
+    return {"code": 0 if ok else 1, "report": report, "self_fix": None}
+
+
+def invoke(argv: list[str]) -> dict:
+    """In-process entry point (see _dispatch.call_tool): {"code", "report", "self_fix"}."""
+    return execute(build_parser().parse_args(argv))
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    res = execute(args)
+
+    if args.json:
+        print(json.dumps(res["report"]))
+    else:
+        print("Diagnostics:")
+        print(json.dumps(res["report"], indent=2))
+
+    fix = res["self_fix"]
+    if fix:
+        if fix["stdout"]:
+            print(fix["stdout"], end="")
+        if fix["stderr"]:
+            print(fix["stderr"], end="")
+    return res["code"]
 
 
 if __name__ == "__main__":
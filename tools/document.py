@@ -16,14 +16,18 @@ def append_log(log_path: Path, title: str, summary: str) -> None:
         safe_append_file(log_path, header + entry)
 
 
-def main(argv=None) -> int:
+def build_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser(description="Append documentation about a finished task to LOG.md in given folders.")
     parser.add_argument("--title", required=True, help="Entry title")
     parser.add_argument("--summary", required=True, help="Summary of work done and behavior changes")
     parser.add_argument("--paths", nargs="*", default=["."], help="Directories to update (default: current)")
     parser.add_argument("--all-dirs", action="store_true", help="Append to every directory containing an AGENTS.md as well.")
-    args = parser.parse_args(argv)
+    return parser
+
 
+def invoke(argv: list[str]) -> dict:
+    """In-process entry point (see _dispatch.call_tool)."""
+    args = build_parser().parse_args(argv)
     root = find_repo_root()
     paths = [root / p for p in args.paths]
 
@@ -41,11 +45,18 @@ def main(argv=None) -> int:
             uniq_paths.append(parent)
             seen.add(parent)
 
+    updated = []
     for d in uniq_paths:
         append_log(d / "LOG.md", args.title, args.summary)
-        print(f"Updated {d / 'LOG.md'}")
+        updated.append(str(d / "LOG.md"))
+    return {"code": 0, "updated": updated}
 
-    return 0
+
+def main(argv=None) -> int:
+    res = invoke(argv)
+    for p in res["updated"]:
+        print(f"Updated {p}")
+    return res["code"]
 
 
 if __name__ == "__main__":
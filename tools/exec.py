@@ -4,27 +4,32 @@ import json
 import sys
 from pathlib import Path
 
-from _utils import find_repo_root, run, run_ex
+from _utils import find_repo_root, run, run_ex, emit_ndjson
 
 
-def main(argv=None) -> int:
+def build_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser(description="Execute a subprocess with timeouts, verbose logs, and JSON output.")
     parser.add_argument("cmd", nargs=argparse.REMAINDER, help="Command to run after '--'. Example: tools/exec.py -- npx tsc -v")
     parser.add_argument("--timeout", type=float, help="Overall timeout (seconds)")
     parser.add_argument("--idle-timeout", type=float, help="Idle (no output) timeout (seconds)")
     parser.add_argument("--json", action="store_true", help="Emit JSON result")
+    parser.add_argument("--stream", action="store_true", help="Emit NDJSON events (start, line, heartbeat, end) as they happen")
+    parser.add_argument("--heartbeat", type=float, default=5.0, help="Heartbeat interval (seconds) in --stream mode")
     parser.add_argument("--dir", type=Path, help="Working directory")
     parser.add_argument("--verbose", action="store_true", help="Echo live subprocess output")
-    args = parser.parse_args(argv)
+    return parser
+
 
+def _cmd(args) -> list[str]:
     # Allow calling without '--'
     cmd = args.cmd
     if cmd and cmd[0] == "--":
         cmd = cmd[1:]
-    if not cmd:
-        print("Usage: tools/exec.py -- <command> [args...]", file=sys.stderr)
-        return 2
+    return cmd
 
+
+def execute(args) -> dict:
+    cmd = _cmd(args)
     root = find_repo_root()
     code, out, err = run(
         cmd,
@@ -33,27 +38,56 @@ def main(argv=None) -> int:
         idle_timeout_sec=args.idle_timeout,
         verbose=args.verbose,
     )
+    return {
+        "ok": code == 0,
+        "code": code,
+        "stdout": out,
+        "stderr": err,
+        "cmd": cmd,
+        "cwd": str(args.dir or root),
+        "timeout_sec": args.timeout,
+        "idle_timeout_sec": args.idle_timeout,
+    }
+
+
+def invoke(argv: list[str]) -> dict:
+    """In-process entry point (see _dispatch.call_tool); returns the --json payload."""
+    args = build_parser().parse_args(argv)
+    if not _cmd(args):
+        return {"ok": False, "code": 2, "stdout": "", "stderr": "Usage: tools/exec.py -- <command> [args...]\n"}
+    return execute(args)
+
 
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+
+    cmd = _cmd(args)
+    if not cmd:
+        print("Usage: tools/exec.py -- <command> [args...]", file=sys.stderr)
+        return 2
+
+    if args.stream:
+        res = run_ex(
+            cmd,
+            cwd=args.dir or find_repo_root(),
+            timeout_sec=args.timeout,
+            idle_timeout_sec=args.idle_timeout,
+            on_event=emit_ndjson,
+            heartbeat_sec=args.heartbeat,
+        )
+        return res["code"]
+
+    res = execute(args)
     if args.json:
-        print(json.dumps({
-            "ok": code == 0,
-            "code": code,
-            "stdout": out,
-            "stderr": err,
-            "cmd": cmd,
-            "cwd": str(args.dir or root),
-            "timeout_sec": args.timeout,
-            "idle_timeout_sec": args.idle_timeout,
-        }))
-        return code
-
-    if out:
-        print(out, end="")
-    if err:
-        print(err, end="")
-    return code
+        print(json.dumps(res))
+        return res["code"]
+
+    if res["stdout"]:
+        print(res["stdout"], end="")
+    if res["stderr"]:
+        print(res["stderr"], end="")
+    return res["code"]
 
 
 if __name__ == "__main__":
     sys.exit(main())
-
@@ -5,40 +5,69 @@ import os
 import sys
 from pathlib import Path
 
-from _utils import find_repo_root, run
+from _utils import find_repo_root, run, run_ex, emit_ndjson
 
 
-def main(argv=None) -> int:
+def build_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser(description="Run arbitrary git commands in the repo root and return output (supports JSON).")
     parser.add_argument("git_args", nargs=argparse.REMAINDER, help="Arguments passed to git after '--'. Example: tools/git.py -- status -sb")
     parser.add_argument("--json", action="store_true", help="Emit JSON result")
-    args = parser.parse_args(argv)
+    parser.add_argument("--stream", action="store_true", help="Emit NDJSON events (start, line, heartbeat, end) as they happen")
+    parser.add_argument("--heartbeat", type=float, default=5.0, help="Heartbeat interval (seconds) in --stream mode")
+    return parser
+
 
+def _git_args(args) -> list[str]:
     # Allow `tools/git.py status -sb` without '--'
     git_args = args.git_args
     if git_args and git_args[0] == "--":
         git_args = git_args[1:]
+    return git_args
+
+
+def execute(args) -> dict:
+    git_args = _git_args(args)
+    root = find_repo_root()
+    code, out, err = run(["git", *git_args], cwd=root)
+    return {
+        "ok": code == 0,
+        "code": code,
+        "stdout": out,
+        "stderr": err,
+        "cmd": ["git", *git_args],
+        "cwd": str(root),
+    }
+
+
+def invoke(argv: list[str]) -> dict:
+    """In-process entry point (see _dispatch.call_tool); returns the --json payload."""
+    args = build_parser().parse_args(argv)
+    if not _git_args(args):
+        return {"ok": False, "code": 2, "stdout": "", "stderr": "Usage: tools/git.py -- <git-args>\n"}
+    return execute(args)
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+
+    git_args = _git_args(args)
     if not git_args:
         print("Usage: tools/git.py -- <git-args>\nExample: tools/git.py -- status -sb", file=sys.stderr)
         return 2
 
-    root = find_repo_root()
-    code, out, err = run(["git", *git_args], cwd=root)
+    if args.stream:
+        res = run_ex(["git", *git_args], cwd=find_repo_root(), on_event=emit_ndjson, heartbeat_sec=args.heartbeat)
+        return res["code"]
+
+    res = execute(args)
     if args.json:
-        print(json.dumps({
-            "ok": code == 0,
-            "code": code,
-            "stdout": out,
-            "stderr": err,
-            "cmd": ["git", *git_args],
-            "cwd": str(root),
-        }))
-        return code
-    if out:
-        print(out, end="")
-    if err:
-        print(err, end="", file=sys.stderr)
-    return code
+        print(json.dumps(res))
+        return res["code"]
+    if res["stdout"]:
+        print(res["stdout"], end="")
+    if res["stderr"]:
+        print(res["stderr"], end="", file=sys.stderr)
+    return res["code"]
 
 
 if __name__ == "__main__":
@@ -61,7 +61,7 @@ def read_memories(root: Path, scope: Path | None) -> list[str]:
     return items
 
 
-def main(argv=None) -> int:
+def build_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser(description="Read and add memories in AGENTS.md files by scope.")
     sub = parser.add_subparsers(dest="cmd", required=True)
 
@@ -71,22 +71,32 @@ def main(argv=None) -> int:
 
     p_read = sub.add_parser("read", help="Read merged memories (global -> root -> scoped)")
     p_read.add_argument("--path", type=Path, help="Optional scope directory")
+    return parser
+
 
-    args = parser.parse_args(argv)
+def invoke(argv: list[str]) -> dict:
+    """In-process entry point (see _dispatch.call_tool)."""
+    args = build_parser().parse_args(argv)
     root = find_repo_root()
 
     if args.cmd == "add":
         target = add_memory(root, args.path, args.note)
-        print(f"Added memory to {target}")
-        return 0
+        return {"code": 0, "cmd": "add", "target": str(target)}
 
     if args.cmd == "read":
-        items = read_memories(root, args.path)
-        for it in items:
-            print(f"- {it}")
-        return 0
+        return {"code": 0, "cmd": "read", "items": read_memories(root, args.path)}
+
+    return {"code": 1, "cmd": args.cmd}
 
-    return 1
+
+def main(argv=None) -> int:
+    res = invoke(argv)
+    if res.get("cmd") == "add":
+        print(f"Added memory to {res['target']}")
+    elif res.get("cmd") == "read":
+        for it in res["items"]:
+            print(f"- {it}")
+    return res["code"]
 
 
 if __name__ == "__main__":
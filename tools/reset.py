@@ -6,6 +6,7 @@ from pathlib import Path
 
 from _utils import find_repo_root, ensure_codex_dir, timestamp, run, read_file
 from task import load_tasks
+import _index
 
 
 def make_summary(root: Path, reason: str | None) -> str:
@@ -33,6 +34,11 @@ def make_summary(root: Path, reason: str | None) -> str:
                 chk = "[x]" if t.get("done") else "[ ]"
                 lines.append(f"  {chk} {t['id']}: {t['title']}")
         lines.append("")
+    # Context for what's left in the current phase
+    pending = [t["title"] for t in (data["phases"][cur].get("tasks", []) if cur is not None and cur < len(data["phases"]) else []) if not t.get("done")]
+    context = _index.context_block(root, "\n".join(pending)) if pending else ""
+    if context:
+        lines.append(context)
     return "\n".join(lines)
 
 
@@ -7,6 +7,7 @@ from pathlib import Path
 
 from _utils import find_repo_root, ensure_codex_dir, timestamp, run, read_file
 from task import load_tasks
+import _index
 
 
 def write_brief(base: Path, task_text: str, target_dir: Path | None) -> Path:
@@ -31,6 +32,9 @@ def write_brief(base: Path, task_text: str, target_dir: Path | None) -> Path:
         "- Update LOG.md and AGENTS.md memories as needed.",
         "",
     ]
+    context = _index.context_block(base.parent, task_text, str(target_dir) if target_dir else None)
+    if context:
+        content.append(context)
     brief.write_text("\n".join(content) + "\n", encoding="utf-8")
     return brief
 
@@ -1,5 +1,8 @@
 #!/usr/bin/env python3
 import argparse
+import contextlib
+import fcntl
+import os
 import sys
 import uuid
 from pathlib import Path
@@ -8,6 +11,9 @@ from _utils import find_repo_root, ensure_codex_dir, read_json, write_json, time
 
 
 TASKS_FILE = ".codex/tasks.json"
+LOCK_FILE = "tasks.lock"
+# orchestrate_task() progress, in order; a task's "checkpoint" names the last one reached
+CHECKPOINT_STAGES = ("tests_written", "red", "implemented", "green", "committed", "documented")
 
 
 def load_tasks(root: Path) -> dict:
@@ -24,7 +30,29 @@ def load_tasks(root: Path) -> dict:
 
 
 def save_tasks(root: Path, data: dict) -> None:
-    write_json(root / TASKS_FILE, data)
+    # Through a temp file: a concurrent reader never sees a half-written file
+    path = root / TASKS_FILE
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    write_json(tmp, data)
+    os.replace(tmp, path)
+
+
+@contextlib.contextmanager
+def locked_tasks(root: Path):
+    """load_tasks() under an exclusive lock, saved when the block exits cleanly.
+
+    Concurrent task runs (threads or processes) update tasks.json through this
+    so none of them overwrites another's changes.
+    """
+    lock_path = ensure_codex_dir(root) / LOCK_FILE
+    with lock_path.open("a") as fh:
+        fcntl.flock(fh, fcntl.LOCK_EX)
+        try:
+            data = load_tasks(root)
+            yield data
+            save_tasks(root, data)
+        finally:
+            fcntl.flock(fh, fcntl.LOCK_UN)
 
 
 def ensure_phase(data: dict, idx: int) -> None:
@@ -49,10 +77,12 @@ def add_phase(data: dict, name: str | None) -> int:
     return idx
 
 
-def add_task(data: dict, phase_idx: int, title: str, notes: str | None = None) -> str:
+def add_task(data: dict, phase_idx: int, title: str, notes: str | None = None, depends_on: list[str] | None = None) -> str:
     ensure_phase(data, phase_idx)
     tid = str(uuid.uuid4())[:8]
     task = {"id": tid, "title": title, "done": False, "notes": notes or "", "created": timestamp()}
+    if depends_on:
+        task["depends_on"] = list(depends_on)
     data["phases"][phase_idx]["tasks"].append(task)
     return tid
 
@@ -65,6 +95,38 @@ def find_task(data: dict, tid: str) -> tuple[int, int] | None:
     return None
 
 
+def task_deps(task: dict) -> list[str]:
+    return list(task.get("depends_on") or [])
+
+
+def check_deps(data: dict, tid: str, deps: list[str]) -> str | None:
+    """Why tid can't depend on deps (unknown id, or a cycle), or None."""
+    for dep in deps:
+        if find_task(data, dep) is None:
+            return f"Unknown task {dep}"
+    # A cycle means tid is reachable from its own dependencies
+    tasks = {t["id"]: t for ph in data["phases"] for t in ph.get("tasks", [])}
+    stack, seen = list(deps), set()
+    while stack:
+        cur = stack.pop()
+        if cur == tid:
+            return f"Dependency cycle through {tid}"
+        if cur not in seen:
+            seen.add(cur)
+            stack.extend(task_deps(tasks.get(cur, {})))
+    return None
+
+
+def set_checkpoint(data: dict, tid: str, stage: str, tree: str | None, **extra) -> bool:
+    """Record that task tid reached stage with the working tree at tree (a git tree id)."""
+    loc = find_task(data, tid)
+    if not loc:
+        return False
+    pi, ti = loc
+    data["phases"][pi]["tasks"][ti]["checkpoint"] = {"stage": stage, "tree": tree, "ts": timestamp(), **extra}
+    return True
+
+
 def cmd_list(data: dict) -> int:
     if not data["phases"]:
         print("No phases or tasks yet. Use 'add-phase' or 'add-task'.")
@@ -75,7 +137,10 @@ def cmd_list(data: dict) -> int:
         print(f"{mark} {i}: {ph['name']} (created {ph.get('created','')})")
         for t in ph.get("tasks", []):
             chk = "[x]" if t.get("done") else "[ ]"
-            print(f"    {chk} {t['id']}: {t['title']}")
+            after = f" (after {', '.join(task_deps(t))})" if task_deps(t) else ""
+            cp = t.get("checkpoint") if not t.get("done") else None
+            at = f" [at {cp['stage']}]" if cp else ""
+            print(f"    {chk} {t['id']}: {t['title']}{after}{at}")
     return 0
 
 
@@ -92,64 +157,27 @@ def cmd_current(data: dict) -> int:
     return 0
 
 
-def main(argv=None) -> int:
-    parser = argparse.ArgumentParser(description="Manage tasklist and phases.")
-    sub = parser.add_subparsers(dest="cmd", required=True)
-
-    sub.add_parser("list", help="List all phases and tasks.")
-    sub.add_parser("current", help="Show current phase and pending tasks.")
-
-    p_addp = sub.add_parser("add-phase", help="Add a new phase.")
-    p_addp.add_argument("--name", help="Phase name")
-
-    p_setp = sub.add_parser("set-phase", help="Set current phase by index.")
-    p_setp.add_argument("index", type=int, help="Phase index")
-
-    p_addt = sub.add_parser("add-task", help="Add a task to a phase (defaults to current phase).")
-    p_addt.add_argument("title", help="Task title")
-    p_addt.add_argument("--phase", type=int, help="Phase index")
-    p_addt.add_argument("--notes", help="Task notes")
-
-    p_check = sub.add_parser("check", help="Mark task as done by id.")
-    p_check.add_argument("id", help="Task id")
-
-    p_edit = sub.add_parser("edit-task", help="Edit a task title/notes by id.")
-    p_edit.add_argument("id", help="Task id")
-    p_edit.add_argument("--title", help="New title")
-    p_edit.add_argument("--notes", help="New notes")
-
-    p_rm = sub.add_parser("remove-task", help="Remove a task by id.")
-    p_rm.add_argument("id", help="Task id")
-
-    args = parser.parse_args(argv)
-    root = find_repo_root()
-    ensure_codex_dir(root)
-    data = load_tasks(root)
-
-    if args.cmd == "list":
-        return cmd_list(data)
-
-    if args.cmd == "current":
-        return cmd_current(data)
-
+def apply_edit(args, data: dict) -> int:
+    """The editing subcommands, applied to data (saved by the caller)."""
     if args.cmd == "add-phase":
         idx = add_phase(data, args.name)
         set_current_phase(data, idx)
-        save_tasks(root, data)
         print(f"Added phase {idx}: {data['phases'][idx]['name']}")
         return 0
 
     if args.cmd == "set-phase":
         set_current_phase(data, args.index)
-        save_tasks(root, data)
         print(f"Set current phase to {args.index}")
         return 0
 
     if args.cmd == "add-task":
         phase = args.phase if args.phase is not None else data.get("current_phase") or 0
         ensure_phase(data, phase)
-        tid = add_task(data, phase, args.title, args.notes)
-        save_tasks(root, data)
+        err = check_deps(data, "", args.depends_on or [])
+        if err:
+            print(err, file=sys.stderr)
+            return 1
+        tid = add_task(data, phase, args.title, args.notes, args.depends_on)
         print(f"Added task {tid} to phase {phase}")
         return 0
 
@@ -161,7 +189,6 @@ def main(argv=None) -> int:
         pi, ti = loc
         data["phases"][pi]["tasks"][ti]["done"] = True
         data["phases"][pi]["tasks"][ti]["completed"] = timestamp()
-        save_tasks(root, data)
         print(f"Checked off {args.id}")
         return 0
 
@@ -171,11 +198,16 @@ def main(argv=None) -> int:
             print("Task not found", file=sys.stderr)
             return 1
         pi, ti = loc
+        if args.depends_on is not None:
+            err = check_deps(data, args.id, args.depends_on)
+            if err:
+                print(err, file=sys.stderr)
+                return 1
+            data["phases"][pi]["tasks"][ti]["depends_on"] = args.depends_on
         if args.title is not None:
             data["phases"][pi]["tasks"][ti]["title"] = args.title
         if args.notes is not None:
             data["phases"][pi]["tasks"][ti]["notes"] = args.notes
-        save_tasks(root, data)
         print(f"Edited task {args.id}")
         return 0
 
@@ -186,13 +218,61 @@ def main(argv=None) -> int:
             return 1
         pi, ti = loc
         data["phases"][pi]["tasks"].pop(ti)
-        save_tasks(root, data)
+        for ph in data["phases"]:
+            for t in ph.get("tasks", []):
+                if args.id in task_deps(t):
+                    t["depends_on"] = [d for d in task_deps(t) if d != args.id]
         print(f"Removed task {args.id}")
         return 0
 
     return 1
 
 
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Manage tasklist and phases.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    sub.add_parser("list", help="List all phases and tasks.")
+    sub.add_parser("current", help="Show current phase and pending tasks.")
+
+    p_addp = sub.add_parser("add-phase", help="Add a new phase.")
+    p_addp.add_argument("--name", help="Phase name")
+
+    p_setp = sub.add_parser("set-phase", help="Set current phase by index.")
+    p_setp.add_argument("index", type=int, help="Phase index")
+
+    p_addt = sub.add_parser("add-task", help="Add a task to a phase (defaults to current phase).")
+    p_addt.add_argument("title", help="Task title")
+    p_addt.add_argument("--phase", type=int, help="Phase index")
+    p_addt.add_argument("--notes", help="Task notes")
+    p_addt.add_argument("--depends-on", nargs="+", metavar="ID", help="Tasks that must be done before this one")
+
+    p_check = sub.add_parser("check", help="Mark task as done by id.")
+    p_check.add_argument("id", help="Task id")
+
+    p_edit = sub.add_parser("edit-task", help="Edit a task title/notes by id.")
+    p_edit.add_argument("id", help="Task id")
+    p_edit.add_argument("--title", help="New title")
+    p_edit.add_argument("--notes", help="New notes")
+    p_edit.add_argument("--depends-on", nargs="*", metavar="ID", help="Replace the task's dependencies (none clears them)")
+
+    p_rm = sub.add_parser("remove-task", help="Remove a task by id.")
+    p_rm.add_argument("id", help="Task id")
+
+    args = parser.parse_args(argv)
+    root = find_repo_root()
+    ensure_codex_dir(root)
+
+    if args.cmd == "list":
+        return cmd_list(load_tasks(root))
+
+    if args.cmd == "current":
+        return cmd_current(load_tasks(root))
+
+    with locked_tasks(root) as data:
+        return apply_edit(args, data)
+
+
 if __name__ == "__main__":
     sys.exit(main())
 
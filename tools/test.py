@@ -1,25 +1,47 @@
 #!/usr/bin/env python3
 import argparse
+import asyncio
+import json
+import re
+import shlex
 import sys
+import time
 from pathlib import Path
 
 from _utils import (
+    ProjectContext,
     find_repo_root,
     detect_package_manager,
     detect_test_runner,
     detect_typescript,
+    package_script_cmd,
     package_script_exists,
-    run,
-    run_package_script,
+    read_file,
+    read_package_json,
+    arun_ex,
+    run_ex,
+    emit_ndjson,
+    working_tree_hash,
 )
+import _affected
+import _impact
+import _reporters
+import _shards
+import _timings
+import _typecheck
+import _verify_cache
+import _watch
 
 
-def run_all_tests(root: Path, watch: bool, timeout: float | None, idle_timeout: float | None) -> tuple[int, str, str]:
+def _skipped(code: int, err: str) -> dict:
+    return {"cmd": None, "code": code, "stdout": "", "stderr": err}
+
+
+def all_tests_cmd(root: Path, watch: bool) -> list[str] | None:
     # Try scripts first
     if package_script_exists(root, "test"):
         extra = ["--watch"] if watch else []
-        code, out, err = run_package_script(root, "test", extra_args=extra if extra else None)
-        return code, out, err
+        return package_script_cmd(root, "test", extra_args=extra if extra else None)
 
     # Try common runners
     runner = detect_test_runner(root) or "jest"
@@ -27,25 +49,24 @@ def run_all_tests(root: Path, watch: bool, timeout: float | None, idle_timeout:
         args = ["npx", "jest"]
         if watch:
             args.append("--watch")
-        return run(args, cwd=root, timeout_sec=timeout, idle_timeout_sec=idle_timeout)
+        return args
     if runner == "vitest":
         args = ["npx", "vitest", "run"]
         if watch:
             args = ["npx", "vitest"]  # watch mode
-        return run(args, cwd=root, timeout_sec=timeout, idle_timeout_sec=idle_timeout)
+        return args
     if runner == "mocha":
         args = ["npx", "mocha"]
         # If TypeScript detected, try ts-node/register automatically
         if detect_typescript(root):
             args = ["npx", "mocha", "-r", "ts-node/register"]
-        return run(args, cwd=root, timeout_sec=timeout, idle_timeout_sec=idle_timeout)
+        return args
     if runner == "node-test-runner":
-        args = ["node", "--test"]
-        return run(args, cwd=root, timeout_sec=timeout, idle_timeout_sec=idle_timeout)
-    return 127, "", f"No test script/runner detected. Please add an npm test script."
+        return ["node", "--test"]
+    return None
 
 
-def run_category(root: Path, category: str, pattern: str | None, watch: bool, timeout: float | None, idle_timeout: float | None) -> tuple[int, str, str]:
+def category_cmd(root: Path, category: str, pattern: str | None, watch: bool) -> list[str] | None:
     # Map to npm scripts like test:unit, test:integration, test:e2e
     script = f"test:{category}"
     extra = []
@@ -54,7 +75,7 @@ def run_category(root: Path, category: str, pattern: str | None, watch: bool, ti
     if pattern:
         extra.append(pattern)
     if package_script_exists(root, script):
-        return run_package_script(root, script, extra_args=extra if extra else None)
+        return package_script_cmd(root, script, extra_args=extra if extra else None)
     # Fallback to runner flags
     runner = detect_test_runner(root) or "jest"
     if runner == "jest":
@@ -63,103 +84,771 @@ def run_category(root: Path, category: str, pattern: str | None, watch: bool, ti
             args.append("--watch")
         if pattern:
             args.extend(["-t", pattern])
-        return run(args, cwd=root, timeout_sec=timeout, idle_timeout_sec=idle_timeout)
+        return args
     if runner == "vitest":
         args = ["npx", "vitest", "run"]
         if watch:
             args = ["npx", "vitest"]
         if pattern:
             args.extend(["-t", pattern])
-        return run(args, cwd=root, timeout_sec=timeout, idle_timeout_sec=idle_timeout)
+        return args
     if runner == "mocha":
         args = ["npx", "mocha"]
         if pattern:
             args.extend(["--grep", pattern])
-        return run(args, cwd=root, timeout_sec=timeout, idle_timeout_sec=idle_timeout)
+        return args
     if runner == "node-test-runner":
-        args = ["node", "--test"]
-        return run(args, cwd=root, timeout_sec=timeout, idle_timeout_sec=idle_timeout)
-    return 127, "", f"No suitable test command for category '{category}'."
+        return ["node", "--test"]
+    return None
 
 
-def run_typecheck(root: Path, timeout: float | None) -> tuple[int, str, str]:
+def typecheck_cmd(root: Path) -> list[str] | None:
     if not detect_typescript(root):
-        return 0, "", ""
+        return None
     # Prefer package script if present
     if package_script_exists(root, "typecheck"):
-        return run_package_script(root, "typecheck")
+        return package_script_cmd(root, "typecheck")
     # Fallback to tsc --noEmit
-    args = ["npx", "tsc", "--noEmit"]
-    return run(args, cwd=root, timeout_sec=timeout)
+    return ["npx", "tsc", "--noEmit"]
 
 
-def main(argv=None) -> int:
+def run_all_tests(root: Path, watch: bool, opts: dict) -> dict:
+    """Run the whole suite; opts are run_ex() keyword arguments (timeouts, capture, events)."""
+    cmd = all_tests_cmd(root, watch)
+    if cmd is None:
+        return _skipped(127, f"No test script/runner detected. Please add an npm test script.")
+    return run_ex(cmd, cwd=root, **opts)
+
+
+def run_category(root: Path, category: str, pattern: str | None, watch: bool, opts: dict) -> dict:
+    cmd = category_cmd(root, category, pattern, watch)
+    if cmd is None:
+        return _skipped(127, f"No suitable test command for category '{category}'.")
+    return run_ex(cmd, cwd=root, **opts)
+
+
+def _typecheck_opts(opts: dict) -> dict:
+    # No idle timeout: tsc is silent until it finishes
+    return {k: v for k, v in opts.items() if k != "idle_timeout_sec"}
+
+
+def run_typecheck(root: Path, opts: dict) -> dict:
+    cmd = typecheck_cmd(root)
+    if cmd is None:
+        return _skipped(0, "")
+    return run_ex(cmd, cwd=root, **_typecheck_opts(opts))
+
+
+_TYPECHECK_REF = re.compile(r"""\btsc\b|['"]typecheck['"]|run\s+(-s\s+)?typecheck""")
+
+
+def test_script_runs_typecheck(root: Path, script: str) -> bool:
+    """True when the npm script already typechecks, directly or from the test files it runs.
+
+    E.g. `node --test "tests/**/*.mjs"` where a test spawns `npm run typecheck`.
+    """
+    cmdline = read_package_json(root).get("scripts", {}).get(script, "")
+    if _TYPECHECK_REF.search(cmdline):
+        return True
+    try:
+        words = shlex.split(cmdline)
+    except ValueError:
+        return False
+    if not (len(words) >= 2 and words[0] == "node" and "--test" in words):
+        return False
+    for word in words[words.index("--test") + 1:]:
+        if word.startswith("-"):
+            continue
+        target = root / word
+        files = [target] if target.is_file() else sorted(root.glob(word)) if any(c in word for c in "*?[") else sorted(target.rglob("*.*js")) if target.is_dir() else []
+        for f in files:
+            if f.is_file() and _TYPECHECK_REF.search(read_file(f)):
+                return True
+    return False
+
+
+def _output_fields(res: dict) -> dict:
+    """stdout/stderr (tail when capped) plus where the full output was spilled."""
+    return {
+        "stdout": res.get("stdout", ""),
+        "stderr": res.get("stderr", ""),
+        "stdout_path": res.get("stdout_path"),
+        "stderr_path": res.get("stderr_path"),
+        "truncated": bool(res.get("stdout_truncated") or res.get("stderr_truncated")),
+        "duration_sec": res.get("duration_sec"),
+        "cancelled": bool(res.get("cancelled")),
+    }
+
+
+def build_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser(description="Run tests for the Node.js project (TypeScript-aware, with timeouts and JSON output).")
     parser.add_argument("--category", choices=["unit", "integration", "e2e"], help="Run a specific test category.")
     parser.add_argument("--pattern", help="Focus tests by name/pattern (mapped to runner flags).")
-    parser.add_argument("--watch", action="store_true", help="Run in watch mode if supported.")
+    parser.add_argument("--watch", action="store_true", help="Run, then rerun the affected shards whenever files change (inotify, or stat polling with CODEX_WATCH_POLL=1); changes during a run restart it.")
     parser.add_argument("--detect", action="store_true", help="Only detect and print runner and package manager.")
     parser.add_argument("--typecheck", dest="typecheck", action="store_true", help="Run TypeScript typecheck before tests if TS is detected.")
     parser.add_argument("--no-typecheck", dest="typecheck", action="store_false", help="Skip TypeScript typecheck even if TS is detected.")
     parser.set_defaults(typecheck=None)  # auto by default
+    parser.add_argument("--no-incremental", dest="incremental", action="store_false", help="Typecheck through the root typecheck script instead of per-package incremental tsc (build info in .codex/cache/tsc).")
+    parser.add_argument("--parallel", action="store_true", help="Run typecheck and tests at the same time, output prefixed by [typecheck]/[test].")
+    parser.add_argument("--fail-fast", action="store_true", help="With --parallel/--workspaces, cancel the other processes as soon as one fails.")
+    parser.add_argument("--workspaces", action="store_true", help="Run each npm workspace's test script and the root suite as separate shards, concurrently. A workspace whose tests a root test already runs (`npm run -w <workspace> <script>`) gets no shard; its tests run inside the root shard, so a root suite driving every workspace leaves just one shard.")
+    parser.add_argument("--changed", action="store_true", help="Run only the shards/test files affected by the working tree changes (implies --workspaces).")
+    parser.add_argument("--since", metavar="REF", help="With --changed, diff against REF instead of HEAD.")
+    parser.add_argument("--only-failed", action="store_true", help="Run only the tests that failed last time (by file and name); everything if none are recorded.")
+    parser.add_argument("--failed-first", action="store_true", help="Run the tests that failed last time first; stop there if they still fail, else run the normal selection.")
+    parser.add_argument("--rerun-failed", type=int, default=0, metavar="N", help="Rerun failing tests on their own up to N times; those that pass on a rerun of an unchanged working tree are reported as flaky, not failures.")
+    parser.add_argument("-j", "--jobs", type=int, help="Max concurrent shards with --workspaces (default: CPU count).")
     parser.add_argument("--timeout", type=float, help="Overall timeout (seconds) for the test process.")
     parser.add_argument("--idle-timeout", type=float, help="Idle (no output) timeout in seconds.")
+    parser.add_argument("--capture-limit", type=int, help="Keep only this many characters of output tail per stream in memory/JSON; full output is spilled to .codex/logs (default: CODEX_CAPTURE_LIMIT or unlimited).")
     parser.add_argument("--json", action="store_true", help="Emit a single-line JSON object with results.")
-    args = parser.parse_args(argv)
+    parser.add_argument("--stream", action="store_true", help="Emit NDJSON events (start, line, heartbeat, end per phase, then a summary) as they happen.")
+    parser.add_argument("--heartbeat", type=float, default=5.0, help="Heartbeat interval (seconds) in --stream mode.")
+    parser.add_argument("--no-cache", dest="cache", action="store_false", help="Always run; ignore results cached for an identical working tree.")
+    parser.add_argument("--no-report", dest="report", action="store_false", help="Don't ask the runner for a structured report (per-test results and timings).")
+    parser.add_argument("--no-impact", dest="impact", action="store_false", help="Don't record per-test-file V8 coverage (test-runner processes only) for the impact map --changed selects with (.codex/cache/impact.json).")
+    parser.add_argument("--slowest", type=int, metavar="N", help="Only print the N slowest tests recorded in .codex/timings (mean over past runs).")
+    return parser
+
+
+def _cache_command(args) -> dict:
+    """The parts of the invocation that affect the outcome (part of the cache key)."""
+    return {
+        "tool": "test.py",
+        "category": args.category,
+        "pattern": args.pattern,
+        "typecheck": args.typecheck,
+        "incremental": args.incremental,
+        "workspaces": args.workspaces,
+        "rerun_failed": args.rerun_failed,
+        "timeout": args.timeout,
+        "idle_timeout": args.idle_timeout,
+    }
+
+
+def detect(root: Path) -> dict:
+    pm = detect_package_manager(root)
+    runner = detect_test_runner(root) or "unknown"
+    return {
+        "code": 0,
+        "package_manager": pm,
+        "test_runner": runner,
+        "stdout": f"package_manager: {pm}\ntest_runner: {runner}\n",
+    }
+
+
+def slowest(root: Path, n: int) -> dict:
+    rows = _timings.slowest(root, n)
+    lines = [
+        f"{r['mean_ms']:10.1f}ms mean {r['max_ms']:10.1f}ms max {r['runs']:4d} runs {r['failures']:3d} failed  {r['id']}"
+        for r in rows
+    ]
+    return {
+        "code": 0,
+        "slowest": rows,
+        "stdout": "\n".join(lines) + "\n" if lines else "No test timings recorded yet.\n",
+    }
+
+
+def _plan_typecheck(root: Path, args) -> tuple[list[str] | None, str | None]:
+    """(command, reason it is skipped)."""
+    if args.typecheck is False:
+        return None, "disabled"
+    cmd = typecheck_cmd(root)
+    if cmd is None:
+        return None, "typescript not detected"
+    if args.typecheck is None:
+        # Auto mode: don't typecheck twice when the test script does it anyway
+        script = f"test:{args.category}" if args.category else "test"
+        if package_script_exists(root, script) and test_script_runs_typecheck(root, script):
+            return None, f"covered by the '{script}' script"
+    return cmd, None
+
+
+def _typecheck_job(root: Path, args, cmd: list[str] | None, opts: dict, fail_fast: bool) -> dict | None:
+    """The typecheck job for _start(): per-package incremental tsc where possible, else cmd."""
+    if cmd is None:
+        return None
+    units = _typecheck.plan(root) if args.incremental else None
+    if not units:
+        return {"cmd": cmd, "cwd": root, **opts}
+    max_parallel = args.jobs or _shards.default_jobs()
+    return {"cmd": [u["cmd"] for u in units], "run": lambda: _typecheck.arun(units, opts, max_parallel, fail_fast)}
+
+
+def _shard_scripts(args) -> tuple[str, ...] | None:
+    return (f"test:{args.category}",) if args.category else None
+
+
+def _plan_tests(root: Path, args, phase_opts, plan: dict | None = None) -> tuple[dict[str, dict], dict[str, tuple], str | None]:
+    """Test jobs by phase name ("test", or "test:<shard>" with --workspaces), their
+    (runner, script text) for the reporters, or an error.
+
+    With a plan (see _affected.select/failed_plan) only its shards run, narrowed to its
+    files and names; an empty plan yields no jobs and no error.
+    """
+    if plan is not None or args.workspaces:
+        shards = _shards.discover_shards(root, _shard_scripts(args))
+        if plan is not None:
+            names = plan.get("names") or {}
+            shards = [_shards.narrow(s, plan["shards"][s["name"]], names.get(s["name"])) for s in shards if s["name"] in plan["shards"]]
+        extra = ["--watch"] if args.watch else None
+        jobs = {
+            f"test:{s['name']}": _shards.shard_job(root, s, phase_opts(f"test:{s['name']}"), extra)
+            for s in shards
+        }
+        runners = {f"test:{s['name']}": (s["runner"], s["command"]) for s in shards}
+        if jobs or plan is not None:
+            return jobs, runners, None
+        return jobs, runners, "No workspace or root test scripts found."
+    if args.category:
+        cmd = category_cmd(root, args.category, args.pattern, args.watch)
+        err = f"No suitable test command for category '{args.category}'."
+    else:
+        cmd = all_tests_cmd(root, args.watch)
+        err = "No test script/runner detected. Please add an npm test script."
+    if cmd is None:
+        return {}, {}, err
+    script = f"test:{args.category}" if args.category else "test"
+    runners = {"test": (detect_test_runner(root), ProjectContext.get(root).scripts.get(script))}
+    return {"test": {"cmd": cmd, "cwd": root, **phase_opts("test")}}, runners, None
+
+
+def _attach_reporters(root: Path, jobs: dict[str, dict], runners: dict[str, tuple]) -> dict[str, tuple]:
+    """Make each job also write a structured report; returns {job name: (runner, report path)}."""
+    reports = {}
+    for name, job in jobs.items():
+        runner, script_text = runners.get(name, (None, None))
+        report = _reporters.report_path(root)
+        instrumented = _reporters.instrument(job["cmd"], runner, report, script_text)
+        if instrumented is None:
+            continue
+        job["cmd"], env = instrumented
+        if env:
+            job["env"] = {**(job.get("env") or {}), **env}
+        reports[name] = (runner, report)
+    return reports
+
+
+def _attach_coverage(root: Path, jobs: dict[str, dict], plan: dict | None) -> dict[str | None, Path]:
+    """Have each job's test-runner processes dump coverage into a fresh directory; returns {shard or None: directory}."""
+    # A shard narrowed to some test names executes only part of its files
+    partial = {f"test:{shard}" for shard, names in ((plan or {}).get("names") or {}).items() if names}
+    dirs = {}
+    for name, job in jobs.items():
+        if name in partial:
+            continue
+        cov_dir = _impact.coverage_dir(root)
+        env = job.get("env") or {}
+        job["env"] = {**env, **_impact.coverage_env(root, cov_dir, env.get("NODE_OPTIONS"))}
+        dirs[name.split(":", 1)[1] if ":" in name else None] = cov_dir
+    return dirs
+
+
+def _collect_tests(root: Path, reports: dict[str, tuple]) -> list[dict] | None:
+    """Per-test results of all reports (tagged with their shard), recorded in the timing store."""
+    tests = None
+    for name, (runner, report) in reports.items():
+        parsed = _reporters.parse(runner, report, root)
+        if parsed is None:
+            continue
+        shard = name.split(":", 1)[1] if ":" in name else None
+        tests = (tests or []) + [{**t, "shard": shard} for t in parsed]
+    if tests:
+        _timings.record(root, tests)
+        _timings.update_last_failed(root, tests)
+    return tests
+
+
+def _start(job: dict):
+    """The job's coroutine: arun_ex() keyword arguments, or {"cmd", "run"} where run() returns one."""
+    return job["run"]() if "run" in job else arun_ex(**job)
+
+
+async def _run_concurrently(jobs: dict[str, dict], fail_fast: bool, max_parallel: int | None = None) -> dict[str, dict]:
+    """Run jobs (see _start()) side by side (at most max_parallel at once); with fail_fast the first failure cancels the rest."""
+    sem = asyncio.Semaphore(max_parallel) if max_parallel else None
+
+    async def one(job: dict) -> dict:
+        if sem is None:
+            return await _start(job)
+        async with sem:
+            return await _start(job)
+
+    tasks = {asyncio.ensure_future(one(job)): name for name, job in jobs.items()}
+    results: dict[str, dict] = {}
+    pending = set(tasks)
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            failed = False
+            for t in done:
+                results[tasks[t]] = t.result()
+                failed = failed or t.result()["code"] != 0
+            if fail_fast and failed and pending:
+                for t in pending:
+                    t.cancel()
+                await asyncio.gather(*pending, return_exceptions=True)
+                for t in pending:
+                    results[tasks[t]] = {**_skipped(None, ""), "cmd": jobs[tasks[t]]["cmd"], "cancelled": True}
+                pending = set()
+    finally:
+        # Cancelled from outside (watch mode): take the children down too
+        for t in pending:
+            t.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+    return results
+
+
+def _combine_shards(results: dict[str, dict]) -> dict:
+    """One result for all shards: first failing code, outputs joined under per-shard headers."""
+    codes = [r["code"] for r in results.values() if r["code"] is not None]
+    out, err = [], []
+    for name, r in results.items():
+        header = f"==> {name} ({'cancelled' if r.get('cancelled') else 'exit ' + str(r['code'])}) <==\n"
+        out.append(header + r.get("stdout", ""))
+        if r.get("stderr"):
+            err.append(header + r["stderr"])
+    return {
+        "cmd": [r.get("cmd") for r in results.values()],
+        "code": next((c for c in codes if c != 0), 0),
+        "stdout": "".join(out),
+        "stderr": "".join(err),
+        "duration_sec": max((r.get("duration_sec") or 0 for r in results.values()), default=0),
+        "stdout_truncated": any(r.get("stdout_truncated") for r in results.values()),
+        "stderr_truncated": any(r.get("stderr_truncated") for r in results.values()),
+    }
+
+
+def _shard_entry(shard: str, res: dict, tests: list[dict] | None) -> dict:
+    mine = [t for t in tests or [] if t["shard"] == shard]
+    return {
+        "name": shard,
+        "cmd": res.get("cmd"),
+        "cwd": res.get("cwd"),
+        "code": res["code"],
+        "ok": res["code"] == 0,
+        "test_counts": _reporters.counts(mine) if mine else None,
+        **_output_fields(res),
+    }
 
+
+def execute(args, fail_fast: bool = False, on_event=None) -> dict:
+    """Typecheck (auto) then tests; returns the --json payload.
+
+    With fail_fast, tests are not started when the typecheck fails (or, with
+    --parallel, are cancelled). on_event(event, phase) receives the live
+    run_ex() events of both processes. Unless --no-cache, an identical
+    working tree/toolchain/command returns the recorded result
+    (payload["cache"]["hit"]). With --failed-first, the previous failures run
+    on their own first and a still-failing result is returned right away
+    (payload["failed_first"]["stopped"]). With --rerun-failed N, failing
+    tests get up to N reruns (payload["reruns"]); payload["quarantine"] lists
+    the tests quarantined as flaky and which of them failed.
+    """
+    root = find_repo_root()
+    # Reruns only say "flaky" about a tree that held still since the first run
+    tree = working_tree_hash(root) if args.rerun_failed else None
+    payload = _execute_failed_first(args, fail_fast, on_event)
+    flaky: set[str] = set()
+    if args.rerun_failed:
+        payload, flaky = _rerun_failures(args, payload, fail_fast, on_event, tree)
+    tests = payload.get("tests")
+    if tests is not None and not payload["cache"]["hit"]:
+        _timings.update_flaky(root, tests, flaky)
+    ids = _timings.quarantined(root)
+    payload["quarantine"] = {
+        "tests": ids,
+        "failed": [t["id"] for t in tests or [] if t["status"] == "failed" and t["id"] in ids],
+    }
+    return payload
+
+
+def _execute_failed_first(args, fail_fast: bool, on_event) -> dict:
+    if not args.failed_first or args.only_failed:
+        return _execute_once(args, fail_fast, on_event)
+    root = find_repo_root()
+    failed = _timings.last_failed(root)
+    if not failed:
+        return _execute_once(args, fail_fast, on_event)
+    # The typecheck runs once, with the normal selection
+    first = _execute_once(argparse.Namespace(**{**vars(args), "only_failed": True, "typecheck": False}), fail_fast, on_event)
+    summary = {"tests": [t["id"] for t in failed], "code": first["code"], "wall_sec": first["wall_sec"], "stopped": not first["ok"]}
+    if not first["ok"]:
+        first["failed_first"] = summary
+        return first
+    payload = _execute_once(args, fail_fast, on_event)
+    payload["failed_first"] = summary
+    return payload
+
+
+def _passed_on_rerun(test: dict, results: list[dict]) -> bool:
+    if test["name"]:
+        return any(r["id"] == test["id"] and r["status"] == "passed" for r in results)
+    # The file failed to load; it passes once it runs without failures
+    mine = [r for r in results if r["file"] == test["file"]]
+    return bool(mine) and all(r["status"] != "failed" for r in mine)
+
+
+def _rerun_failures(args, payload: dict, fail_fast: bool, on_event, tree: str | None) -> tuple[dict, set[str]]:
+    """Rerun the failing tests on their own, up to --rerun-failed times; returns (payload, flaky ids).
+
+    A test that passes on a rerun is flaky: it is marked passed (with "flaky": true), and the
+    run is ok once none is left failing and the last rerun exited cleanly. tree is the working
+    tree's id before the first run; once it differs after a rerun (someone is still editing),
+    that rerun's passes prove nothing and the reruns stop (payload["reruns"]["tree_changed"]).
+    """
+    tests = payload.get("tests")
+    failing = [t for t in tests or [] if t["status"] == "failed"]
+    if not failing or tree is None or payload["typecheck"]["code"] not in (0, None):
+        return payload, set()
+    rerun_args = argparse.Namespace(**{**vars(args), "only_failed": True, "failed_first": False, "typecheck": False, "cache": False})
+    attempts: list[dict] = []
+    flaky: set[str] = set()
+    changed = False
+    while failing and len(attempts) < args.rerun_failed:
+        res = _execute_once(rerun_args, fail_fast, on_event, rerun=failing)
+        attempts.append({"tests": [t["id"] for t in failing], "code": res["code"], "wall_sec": res["wall_sec"]})
+        if working_tree_hash(find_repo_root()) != tree:
+            changed = True
+            break
+        if res["tests"] is None:
+            break
+        passed = {t["id"] for t in failing if _passed_on_rerun(t, res["tests"])}
+        flaky |= passed
+        failing = [t for t in failing if t["id"] not in passed]
+    for t in tests:
+        if t["id"] in flaky:
+            t.update(status="passed", flaky=True)
+    payload["reruns"] = {"max": args.rerun_failed, "attempts": attempts, "flaky": sorted(flaky), "tree_changed": changed}
+    if flaky:
+        payload["test_counts"] = _reporters.counts(tests)
+    if not failing and attempts and attempts[-1]["code"] == 0:
+        payload.update(ok=True, code=0)
+    return payload, flaky
+
+
+def _prepare(args, fail_fast: bool, on_event, affected: dict | None = None, rerun: list[dict] | None = None) -> dict:
+    """Everything before the processes start: cache lookup, typecheck and test plans, reporters.
+
+    Returns {"hit": payload} on a cache hit, else the state _arun()/_finish() work on.
+    affected replaces the --changed selection (the watch engine passes one per batch of changes);
+    rerun replaces the --only-failed tests (see _rerun_failures()).
+    """
     root = find_repo_root()
+    started = time.monotonic()
+    cached = None
+    # --changed/--only-failed results depend on more than the tree (diff base, failure history), so they aren't cached
+    if args.cache and not args.watch and not args.changed and not args.only_failed:
+        cached = _verify_cache.cache_key(root, _cache_command(args))
+        if cached is not None:
+            hit = _verify_cache.lookup(root, cached[0])
+            if hit is not None:
+                return {"hit": hit}
+    opts = {"timeout_sec": args.timeout, "idle_timeout_sec": args.idle_timeout, "capture_limit": args.capture_limit}
+
+    def phase_opts(phase: str) -> dict:
+        if on_event is None:
+            return opts
+        return {**opts, "on_event": lambda ev: on_event(ev, phase), "heartbeat_sec": args.heartbeat}
+
+    t_cmd, t_skip = _plan_typecheck(root, args)
+    failed = rerun if rerun is not None else _timings.last_failed(root) if args.only_failed else []
+    nothing = None
+    if failed:
+        plan = _affected.failed_plan(root, failed, _shard_scripts(args))
+        nothing = "None of the previously failed tests exist anymore.\n"
+    elif affected is not None or args.changed:
+        plan = affected = affected or _affected.select(root, args.since, _shard_scripts(args))
+        nothing = "No tests affected by the changes.\n"
+    else:
+        plan = None
+    test_jobs, runners, test_err = _plan_tests(root, args, phase_opts, plan)
+    return {
+        "root": root,
+        "started": started,
+        "cached": cached,
+        "fail_fast": fail_fast or args.fail_fast,
+        "t_cmd": t_cmd,
+        "t_skip": t_skip,
+        "tjob": _typecheck_job(root, args, t_cmd, _typecheck_opts(phase_opts("typecheck")), fail_fast or args.fail_fast),
+        "failed": failed,
+        "plan": plan,
+        "affected": affected,
+        "nothing": nothing,
+        "test_jobs": test_jobs,
+        "test_err": test_err,
+        "reports": _attach_reporters(root, test_jobs, runners) if args.report else {},
+        "coverage": _attach_coverage(root, test_jobs, plan) if args.impact and not args.pattern else {},
+        "sharded": args.workspaces or plan is not None,
+    }
+
+
+async def _arun(prep: dict, args) -> tuple[dict, dict | None, dict | None]:
+    """Run the prepared processes: (typecheck result, test result, per-shard results)."""
+    fail_fast = prep["fail_fast"]
+    tres = _skipped(0, "")
+    res = None
+    shard_results = None
+    jobs: dict[str, dict] = {}
+    if prep["tjob"]:
+        if args.parallel:
+            jobs["typecheck"] = prep["tjob"]
+        else:
+            tres = await _start(prep["tjob"])
+    if not (fail_fast and tres["code"] != 0):
+        jobs.update(prep["test_jobs"])
+        max_parallel = (args.jobs or _shards.default_jobs()) if prep["sharded"] else None
+        results = await _run_concurrently(jobs, fail_fast, max_parallel)
+        tres = results.pop("typecheck", tres)
+        if not prep["test_jobs"]:
+            res = _skipped(127, prep["test_err"]) if prep["test_err"] else _skipped(0, prep["nothing"])
+        elif prep["sharded"]:
+            shard_results = results
+            res = _combine_shards(results)
+        else:
+            res = results["test"]
+    return tres, res, shard_results
+
+
+def _finish(prep: dict, args, tres: dict, res: dict | None, shard_results: dict | None) -> dict:
+    """Collect the reports and build (and cache) the --json payload."""
+    root = prep["root"]
+    tests = _collect_tests(root, prep["reports"])
+    _impact.collect(root, prep["coverage"], _affected.is_test_file)
+    affected, failed, cached = prep["affected"], prep["failed"], prep["cached"]
+
+    # First real failure wins (a cancelled process has code None)
+    codes = [r["code"] for r in (tres, res) if r is not None and r["code"] is not None]
+    code = next((c for c in codes if c != 0), 0)
+    tests_ran = res is not None and res.get("cmd") is not None and not res.get("cancelled")
+
+    payload = {
+        "ok": code == 0,
+        "code": code,
+        **_output_fields(res or _skipped(code, "")),
+        "tests_ran": tests_ran,
+        "typecheck": {
+            "ran": prep["t_cmd"] is not None and not tres.get("cancelled"),
+            "skipped_reason": prep["t_skip"],
+            "code": tres["code"],
+            "units": tres.get("units"),
+            **_output_fields(tres),
+        },
+        "parallel": bool(args.parallel),
+        "shards": [
+            _shard_entry(name.split(":", 1)[1], r, tests) for name, r in shard_results.items()
+        ] if shard_results is not None else None,
+        "affected": {
+            "since": affected["since"],
+            "changed": affected["changed"],
+            "full": affected["full"],
+            "shards": affected["shards"],
+            "impact": affected.get("impact"),
+            "summary": _affected.describe(affected),
+        } if affected is not None else None,
+        "only_failed": {
+            "tests": [t["id"] for t in failed],
+            "shards": prep["plan"]["shards"],
+        } if failed else None,
+        "tests": tests,
+        "test_counts": _reporters.counts(tests) if tests is not None else None,
+        "reruns": None,
+        "quarantine": None,
+        "wall_sec": round(time.monotonic() - prep["started"], 3),
+        "runner": detect_test_runner(root) or None,
+        "package_manager": detect_package_manager(root),
+        "timeout_sec": args.timeout,
+        "idle_timeout_sec": args.idle_timeout,
+        "capture_limit": args.capture_limit,
+        "cache": {"hit": False, "key": cached[0] if cached else None},
+    }
+    # A fail-fast result never ran (all) the tests, so it can't stand in for a full run
+    if cached is not None and tests_ran and not tres.get("cancelled"):
+        _verify_cache.record(root, cached[0], cached[1], payload)
+    return payload
+
+
+def _execute_once(args, fail_fast: bool, on_event, rerun: list[dict] | None = None) -> dict:
+    prep = _prepare(args, fail_fast, on_event, rerun=rerun)
+    if "hit" in prep:
+        return prep["hit"]
+    return _finish(prep, args, *asyncio.run(_arun(prep, args)))
+
 
+async def _watch_once(args, root: Path, paths: set[str] | None, on_event) -> dict:
+    """One run of the watch loop: the normal selection for paths=None, else what the paths affect."""
+    affected = None
+    if paths is not None and _watch.OVERFLOW not in paths:
+        affected = await asyncio.to_thread(_affected.select_paths, root, sorted(paths), _shard_scripts(args))
+    prep = await asyncio.to_thread(_prepare, args, False, on_event, affected)
+    try:
+        results = await _arun(prep, args)
+    except asyncio.CancelledError:
+        for _runner, report in prep["reports"].values():
+            report.unlink(missing_ok=True)
+        raise
+    return await asyncio.to_thread(_finish, prep, args, *results)
+
+
+async def _watch_loop(args, root: Path, on_event, on_result) -> None:
+    """Run once, then again for every batch of changes; a new batch cancels the run in flight."""
+    watcher = await asyncio.to_thread(_watch.open_watcher, root)
+    kind = "inotify" if watcher.fileno() is not None else f"polling every {watcher.interval:g}s"
+    print(f"[watch] watching {root} ({kind}); Ctrl-C to stop", file=sys.stderr, flush=True)
+    changes = _watch.batches(root, watcher)
+    next_batch = asyncio.ensure_future(anext(changes))
+    current = asyncio.ensure_future(_watch_once(args, root, None, on_event))
+    # Paths the current run covers; None for the normal selection
+    current_paths: set[str] | None = None
+    try:
+        while True:
+            waits = {next_batch} | ({current} if current is not None else set())
+            done, _ = await asyncio.wait(waits, return_when=asyncio.FIRST_COMPLETED)
+            if current in done:
+                try:
+                    on_result(current.result())
+                except Exception as e:
+                    print(f"[watch] run failed: {e}", file=sys.stderr, flush=True)
+                current = None
+            if next_batch in done:
+                paths = next_batch.result()
+                if current is not None:
+                    current.cancel()
+                    await asyncio.gather(current, return_exceptions=True)
+                    # The cancelled run's changes still need testing
+                    paths = None if current_paths is None else paths | current_paths
+                    print("[watch] files changed during the run; restarting", file=sys.stderr, flush=True)
+                current_paths = paths
+                current = asyncio.ensure_future(_watch_once(args, root, paths, on_event))
+                next_batch = asyncio.ensure_future(anext(changes))
+    finally:
+        pending = [t for t in (current, next_batch) if t is not None]
+        for t in pending:
+            t.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        await changes.aclose()
+        watcher.close()
+
+
+def _print_watch_result(payload: dict) -> None:
+    counts = payload.get("test_counts")
+    detail = ", ".join(f"{n} {k}" for k, n in counts.items() if n) if counts else f"exit {payload['code']}"
+    scope = payload["affected"]["summary"] if payload.get("affected") else "full run"
+    status = "PASS" if payload["ok"] else "FAIL"
+    print(f"[watch] {status} {detail} in {payload['wall_sec']:.1f}s ({scope}); waiting for changes", file=sys.stderr, flush=True)
+
+
+def watch(args, root: Path) -> int:
+    """test.py --watch: rerun on changes until interrupted (output per --json/--stream)."""
+    # The engine does the watching; runners, the cache and failed-first see plain one-off runs
+    run_args = argparse.Namespace(**{**vars(args), "watch": False, "cache": False, "failed_first": False})
+    if args.stream:
+        on_event = lambda ev, phase: emit_ndjson(ev, phase=phase)
+        on_result = lambda payload: emit_ndjson({"event": "summary", "ok": payload["ok"], "code": payload["code"], "test_counts": payload["test_counts"], "affected": payload["affected"]})
+    elif args.json:
+        on_event = None
+        on_result = lambda payload: print(json.dumps(payload), flush=True)
+    else:
+        on_event = _print_prefixed
+        on_result = _print_watch_result
+    try:
+        asyncio.run(_watch_loop(run_args, root, on_event, on_result))
+    except KeyboardInterrupt:
+        return 130
+    return 0
+
+
+def invoke(argv: list[str]) -> dict:
+    """In-process entry point (see _dispatch.call_tool); returns the --json payload."""
+    args = build_parser().parse_args(argv)
     if args.detect:
-        pm = detect_package_manager(root)
-        runner = detect_test_runner(root) or "unknown"
-        print(f"package_manager: {pm}")
-        print(f"test_runner: {runner}")
+        return detect(find_repo_root())
+    if args.slowest:
+        return slowest(find_repo_root(), args.slowest)
+    if args.watch:
+        return _skipped(2, "--watch runs until interrupted; run tools/test.py --watch directly.\n")
+    return execute(args)
+
+
+def _print_prefixed(event: dict, phase: str) -> None:
+    if event["event"] == "line":
+        stream = sys.stdout if event["stream"] == "stdout" else sys.stderr
+        print(f"[{phase}] {event['line']}", file=stream, flush=True)
+
+
+def _print_flaky(payload: dict) -> None:
+    flaky = (payload.get("reruns") or {}).get("flaky")
+    if flaky:
+        print(f"[test] flaky (passed on a rerun): {', '.join(flaky)}", file=sys.stderr)
+    quarantined = (payload.get("quarantine") or {}).get("failed")
+    if quarantined:
+        print(f"[test] failing but quarantined as flaky: {', '.join(quarantined)}", file=sys.stderr)
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    root = find_repo_root()
+
+    if args.detect:
+        print(detect(root)["stdout"], end="")
         return 0
 
-    # Auto decide typecheck: default True if TS detected and not explicitly disabled
-    do_typecheck = detect_typescript(root) if args.typecheck is None else args.typecheck
-    t_code = 0
-    t_out = ""
-    t_err = ""
-    if do_typecheck:
-        t_code, t_out, t_err = run_typecheck(root, args.timeout)
-        if t_out:
-            print(t_out, end="")
-        if t_err:
-            print(t_err, end="")
-        if t_code != 0 and not args.json:
-            # Return early on type errors if not JSON (JSON will include both)
-            return t_code
+    if args.slowest:
+        report = slowest(root, args.slowest)
+        print(json.dumps(report) if args.json else report["stdout"], end="\n" if args.json else "")
+        return 0
 
-    if args.category:
-        code, out, err = run_category(root, args.category, args.pattern, args.watch, args.timeout, args.idle_timeout)
-    else:
-        code, out, err = run_all_tests(root, args.watch, args.timeout, args.idle_timeout)
+    if args.watch:
+        return watch(args, root)
+
+    if args.stream:
+        # NDJSON events tagged with "phase" (typecheck/test), then one summary event
+        payload = execute(args, fail_fast=True, on_event=lambda ev, phase: emit_ndjson(ev, phase=phase))
+        if payload["tests_ran"] is False and payload["stderr"]:
+            emit_ndjson({"event": "line", "stream": "stderr", "line": payload["stderr"]}, phase="test")
+        emit_ndjson({
+            "event": "summary",
+            "ok": payload["ok"],
+            "code": payload["code"],
+            "typecheck": {k: payload["typecheck"][k] for k in ("ran", "skipped_reason", "code")},
+            "tests": {"ran": payload["tests_ran"], "code": payload["code"] if payload["tests_ran"] else None},
+            "runner": payload["runner"],
+            "cache": payload["cache"],
+        })
+        return payload["code"]
 
     if args.json:
-        payload = {
-            "ok": code == 0,
-            "code": code,
-            "stdout": out,
-            "stderr": err,
-            "typecheck": {
-                "ran": do_typecheck,
-                "code": t_code,
-                "stdout": t_out,
-                "stderr": t_err,
-            },
-            "runner": detect_test_runner(root) or None,
-            "package_manager": detect_package_manager(root),
-            "timeout_sec": args.timeout,
-            "idle_timeout_sec": args.idle_timeout,
-        }
+        payload = execute(args)
         print(json.dumps(payload))
-        return code
+        return payload["code"]
+
+    if args.parallel or args.workspaces or args.changed:
+        # Live, prefixed output from concurrent processes
+        payload = execute(args, on_event=_print_prefixed)
+        if payload["affected"]:
+            print(f"[test] {payload['affected']['summary']}", file=sys.stderr)
+        _print_flaky(payload)
+        if payload["cache"]["hit"]:
+            print(f"[test] cached result for tree {payload['cache']['tree']} (recorded {payload['cache']['recorded']}); use --no-cache to rerun", file=sys.stderr)
+        return payload["code"]
 
-    if out:
-        print(out, end="")
-    if err:
-        print(err, end="")
+    # Return early on type errors if not JSON (JSON will include both)
+    payload = execute(args, fail_fast=True)
+    code = payload["code"]
+    if payload["cache"]["hit"]:
+        print(f"[test] cached result for tree {payload['cache']['tree']} (recorded {payload['cache']['recorded']}); use --no-cache to rerun", file=sys.stderr)
+    _print_flaky(payload)
+    tc = payload["typecheck"]
+    for res in (tc, payload):
+        if res["stdout"]:
+            print(res["stdout"], end="")
+        if res["stderr"]:
+            print(res["stderr"], end="")
+        if res["truncated"]:
+            print(f"[test] output truncated; full logs: {res['stdout_path']} {res['stderr_path']}", file=sys.stderr)
     return code
 
 
@@ -0,0 +1,97 @@
+"""Affected-test selection from a git diff (_affected.py)."""
+import json
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+
+TOOLS = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(TOOLS))
+
+import _affected  # noqa: E402
+
+
+def _write(path: Path, text: str) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text, encoding="utf-8")
+
+
+def _git(cwd: Path, *args: str) -> None:
+    subprocess.run(["git", "-c", "user.name=test", "-c", "user.email=test@localhost", *args], cwd=cwd, check=True, capture_output=True)
+
+
+class AffectedTest(unittest.TestCase):
+    def setUp(self):
+        self.root = Path(tempfile.mkdtemp(prefix="codex-affected-"))
+        self.addCleanup(shutil.rmtree, self.root, True)
+        root = self.root
+        _write(root / ".gitignore", ".codex\n")
+        _write(root / "README.md", "# monorepo\n")
+        _write(root / "package.json", json.dumps({"name": "m", "workspaces": ["packages/*"], "scripts": {"test": "node --test tests/"}}))
+        _write(root / "tests" / "build.test.mjs", "import path from 'node:path';\nconst dir = path.join(root, 'packages', 'web');\n")
+        for name in ("api", "web"):
+            _write(root / "packages" / name / "package.json", json.dumps({"name": f"@s/{name}", "scripts": {"test": "node --test"}}))
+        _write(root / "packages" / "api" / "src" / "util.ts", "export const util = 1;\n")
+        _write(root / "packages" / "api" / "src" / "other.ts", "export const other = 2;\n")
+        _write(root / "packages" / "api" / "tests" / "util.test.ts", "import { util } from '../src/util.js';\n")
+        _write(root / "packages" / "api" / "tests" / "other.test.ts", "import { other } from '../src/other';\n")
+        _write(root / "packages" / "web" / "src" / "view.ts", "import { util } from '@s/api/src/util';\n")
+        _write(root / "packages" / "web" / "tests" / "view.test.ts", "import '../src/view';\n")
+        _git(root, "init", "-q")
+        _git(root, "add", "-A")
+        _git(root, "commit", "-qm", "init")
+
+    def shards(self, *paths: str) -> dict:
+        return _affected.select_paths(self.root, list(paths))["shards"]
+
+    def test_changed_paths(self):
+        (self.root / "packages" / "api" / "src" / "util.ts").write_text("export const util = 3;\n", encoding="utf-8")
+        _write(self.root / "packages" / "api" / "src" / "new.ts", "\n")
+        _write(self.root / "node_modules" / "dep" / "index.js", "\n")
+        self.assertEqual(_affected.changed_paths(self.root), ["packages/api/src/new.ts", "packages/api/src/util.ts"])
+        self.assertIsNone(_affected.changed_paths(self.root, "no-such-ref"))
+
+    def test_import_graph_across_workspaces(self):
+        self.assertEqual(self.shards("packages/api/src/util.ts"), {"@s/api": ["tests/util.test.ts"], "@s/web": ["tests/view.test.ts"]})
+        # Importers of the package depend on all of it, not just the file they name
+        self.assertEqual(self.shards("packages/api/src/other.ts"), {"@s/api": ["tests/other.test.ts"], "@s/web": ["tests/view.test.ts"]})
+        self.assertEqual(self.shards("tests/build.test.mjs"), {"root": ["tests/build.test.mjs"]})
+
+    def test_workspace_config_runs_the_workspace_and_root_tests_naming_it(self):
+        self.assertEqual(self.shards("packages/web/package.json"), {"root": ["tests/build.test.mjs"], "@s/web": None})
+
+    def test_deleted_file_runs_its_workspace(self):
+        self.assertEqual(self.shards("packages/api/src/gone.ts"), {"@s/api": None})
+
+    def test_inert_root_config_and_unknown(self):
+        plan = _affected.select_paths(self.root, ["README.md"], since="HEAD")
+        self.assertEqual(plan["shards"], {})
+        self.assertEqual(_affected.describe(plan), "1 changed path(s) since HEAD; no tests affected")
+        plan = _affected.select_paths(self.root, ["README.md", "package-lock.json"])
+        self.assertTrue(plan["full"])
+        self.assertEqual(plan["shards"], {"root": None, "@s/api": None, "@s/web": None})
+        plan = _affected.select_paths(self.root, None)
+        self.assertEqual(plan["shards"], {"root": None, "@s/api": None, "@s/web": None})
+        self.assertEqual(_affected.describe(plan), "changes unknown; running every shard")
+
+    def test_failed_plan(self):
+        plan = _affected.failed_plan(self.root, [
+            {"file": "packages/api/tests/util.test.ts", "name": "util > adds"},
+            {"file": "packages/api/tests/other.test.ts", "name": "other"},
+            {"file": "tests/build.test.mjs", "name": ""},
+            {"file": "packages/web/tests/gone.test.ts", "name": "gone"},
+        ])
+        self.assertEqual(plan["shards"], {"@s/api": ["tests/other.test.ts", "tests/util.test.ts"], "root": ["tests/build.test.mjs"]})
+        # A file that failed as a whole runs without a name filter
+        self.assertEqual(plan["names"], {"@s/api": ["other", "util > adds"], "root": None})
+
+    def test_failed_plan_without_a_file_runs_the_shard(self):
+        plan = _affected.failed_plan(self.root, [{"shard": "@s/web", "name": "x"}, {"shard": "nope", "name": "y"}])
+        self.assertEqual(plan["shards"], {"@s/web": None, "root": None})
+
+
+if __name__ == "__main__":
+    unittest.main()
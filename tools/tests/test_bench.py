@@ -0,0 +1,30 @@
+"""End-to-end smoke run of the orchestrator benchmark (bench.py with _fake_codex.py)."""
+import shutil
+import sys
+import unittest
+from pathlib import Path
+
+
+TOOLS = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(TOOLS))
+
+import bench  # noqa: E402
+
+
+@unittest.skipUnless(shutil.which("node") and shutil.which("git"), "node and git are required")
+class BenchSmokeTest(unittest.TestCase):
+    def test_fast_profile_finishes_every_task(self):
+        res = bench.bench_one(1, 1, "fast", 1, [], False)
+        self.assertEqual(res["done"], 1, res["stderr_tail"])
+        self.assertTrue(res["ok"])
+        self.assertEqual(res["stages"]["task"]["count"], 1)
+        self.assertGreater(res["stages"]["subagent"]["count"], 0)
+
+    def test_failing_subagent_is_not_ok(self):
+        res = bench.bench_one(1, 1, "failing", 1, ["--max-retries=0"], False)
+        self.assertEqual(res["done"], 0)
+        self.assertFalse(res["ok"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,53 @@
+"""Wall-clock budgets for task runs (agent.Budget) and how attempts are counted against them."""
+import sys
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+
+TOOLS = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(TOOLS))
+
+import agent  # noqa: E402
+
+
+class BudgetTest(unittest.TestCase):
+    def test_unlimited(self):
+        budget = agent.Budget()
+        self.assertIsNone(budget.deadline)
+        self.assertIsNone(budget.remaining())
+        self.assertFalse(budget.exhausted())
+        self.assertEqual(budget.status()["limit_sec"], None)
+
+    def test_the_earlier_of_its_seconds_and_the_phase_deadline(self):
+        now = time.monotonic()
+        self.assertAlmostEqual(agent.Budget(60, now + 10).remaining(), 10, delta=1)
+        self.assertAlmostEqual(agent.Budget(5, now + 10).remaining(), 5, delta=1)
+        self.assertAlmostEqual(agent.Budget(None, now + 10).remaining(), 10, delta=1)
+        self.assertEqual(agent.Budget(60).status()["limit_sec"], 60)
+
+    def test_runs_out(self):
+        with mock.patch.object(agent.time, "monotonic", return_value=100.0):
+            budget = agent.Budget(30)
+        with mock.patch.object(agent.time, "monotonic", return_value=129.0):
+            self.assertEqual(budget.remaining(), 1.0)
+            self.assertFalse(budget.exhausted())
+        with mock.patch.object(agent.time, "monotonic", return_value=140.0):
+            self.assertEqual(budget.remaining(), 0.0)
+            self.assertTrue(budget.exhausted())
+            self.assertEqual(budget.status(), {"limit_sec": 30.0, "used_sec": 40.0, "exhausted": True})
+
+
+class AttemptLabelTest(unittest.TestCase):
+    def test_within_max_retries(self):
+        self.assertEqual(agent._attempt_label(0, 2), "1/3")
+        self.assertEqual(agent._attempt_label(2, 2), "3/3")
+
+    def test_never_past_its_maximum(self):
+        self.assertTrue(agent._attempt_label(3, 2).startswith("4/4,"))
+        self.assertTrue(agent._attempt_label(5, 0).startswith("6/6,"))
+
+
+if __name__ == "__main__":
+    unittest.main()
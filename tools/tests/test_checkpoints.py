@@ -0,0 +1,142 @@
+"""Checkpoint/resume of orchestrate_task stages (task.set_checkpoint, agent._resume_point)."""
+import io
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+from contextlib import redirect_stderr, redirect_stdout
+from pathlib import Path
+from unittest import mock
+
+
+TOOLS = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(TOOLS))
+
+import agent  # noqa: E402
+import task  # noqa: E402
+
+
+def _git(cwd: Path, *args: str) -> None:
+    subprocess.run(["git", "-c", "user.name=test", "-c", "user.email=test@localhost", *args], cwd=cwd, check=True, capture_output=True)
+
+
+class Crash(Exception):
+    pass
+
+
+class ResumeTest(unittest.TestCase):
+    def setUp(self):
+        self.root = Path(tempfile.mkdtemp(prefix="codex-checkpoint-"))
+        self.addCleanup(shutil.rmtree, self.root, True)
+        (self.root / ".gitignore").write_text(".codex\n", encoding="utf-8")
+        (self.root / "a.txt").write_text("a\n", encoding="utf-8")
+        _git(self.root, "init", "-q")
+        _git(self.root, "add", "-A")
+        _git(self.root, "commit", "-qm", "init")
+        with task.locked_tasks(self.root) as data:
+            self.tid = task.add_task(data, 0, "add a feature")
+        self.calls: list[str] = []
+        # The red check fails, then retries check the failed/affected tests and the full suite
+        self.test_results = [False, True, True]
+        self.crash_at: str | None = None
+
+    def step(self, name: str):
+        self.calls.append(name)
+        if name == self.crash_at:
+            raise Crash(name)
+
+    def run_tests(self, tree, **kw) -> bool:
+        self.step("tests")
+        return self.test_results.pop(0)
+
+    def orchestrate(self) -> bool:
+        def subagent(tree, prompt, *args):
+            self.step("write_tests")
+            return 0
+
+        def until_green(tree, prompt, *args):
+            self.step("implement")
+            return 0, None
+
+        def commit(tree, msg):
+            self.step("commit")
+            return True
+
+        patches = [
+            mock.patch.object(agent, "subagent_exec", subagent),
+            mock.patch.object(agent, "subagent_exec_until_green", until_green),
+            mock.patch.object(agent, "run_tests", self.run_tests),
+            mock.patch.object(agent, "git_commit", commit),
+            mock.patch.object(agent, "call_tool", lambda name, argv, root=None: {"code": 0}),
+        ]
+        for p in patches:
+            p.start()
+        try:
+            with redirect_stdout(io.StringIO()), redirect_stderr(io.StringIO()):
+                return agent.orchestrate_task(self.root, self.tid, None, None, None, False, False, 1)
+        finally:
+            for p in patches:
+                p.stop()
+
+    def record(self) -> dict:
+        return next(t for ph in task.load_tasks(self.root)["phases"] for t in ph["tasks"] if t["id"] == self.tid)
+
+    def crash(self, at: str) -> None:
+        self.crash_at = at
+        with self.assertRaises(Crash):
+            self.orchestrate()
+        self.crash_at = None
+        self.calls.clear()
+
+    def test_full_run_ends_documented(self):
+        self.assertTrue(self.orchestrate())
+        self.assertEqual(self.calls, ["write_tests", "tests", "implement", "tests", "tests", "commit"])
+        rec = self.record()
+        self.assertTrue(rec["done"])
+        self.assertEqual(rec["checkpoint"]["stage"], "documented")
+
+    def test_resumes_after_the_tests_were_written(self):
+        self.crash("tests")
+        self.assertEqual(self.record()["checkpoint"]["stage"], "tests_written")
+        self.assertTrue(self.orchestrate())
+        self.assertEqual(self.calls, ["tests", "implement", "tests", "tests", "commit"])
+
+    def test_green_goes_straight_to_the_commit(self):
+        self.crash("commit")
+        self.assertEqual((self.record()["checkpoint"]["stage"], self.test_results), ("green", []))
+        self.assertTrue(self.orchestrate())
+        self.assertEqual(self.calls, ["commit"])
+
+    def test_interrupted_attempt_is_checked_before_a_new_one(self):
+        with task.locked_tasks(self.root) as data:
+            task.set_checkpoint(data, self.tid, "implemented", agent.working_tree_hash(self.root), attempt=1, early_green=None)
+        self.assertTrue(self.orchestrate())
+        # The first attempt's tree fails, the next attempt is numbered after it
+        self.assertEqual(self.calls, ["tests", "implement", "tests", "tests", "commit"])
+        self.assertEqual([a["attempt"] for a in self.record()["budget"]["attempts"]], [2])
+
+    def test_changed_tree_starts_over(self):
+        self.crash("tests")
+        (self.root / "a.txt").write_text("edited by hand\n", encoding="utf-8")
+        self.assertTrue(self.orchestrate())
+        self.assertEqual(self.calls[0], "write_tests")
+
+    def test_resume_point(self):
+        tree = agent.working_tree_hash(self.root)
+        with redirect_stdout(io.StringIO()):
+            self.assertEqual(agent._resume_point(self.root, self.tid, {"checkpoint": {"stage": "red", "tree": tree}}, self.root, None)["stage"], "red")
+            self.assertEqual(agent._resume_point(self.root, self.tid, {"checkpoint": {"stage": "bogus", "tree": tree}}, self.root, None), {})
+            with task.locked_tasks(self.root) as data:
+                task.set_checkpoint(data, self.tid, "red", "0" * 40)
+            self.assertEqual(agent._resume_point(self.root, self.tid, self.record(), self.root, None), {})
+        self.assertNotIn("checkpoint", self.record())
+        # A fresh worktree checkout has nothing of the old one
+        fresh = mock.Mock(resumed=False)
+        with redirect_stdout(io.StringIO()):
+            self.assertEqual(agent._resume_point(self.root, self.tid, {"checkpoint": {"stage": "red", "tree": tree}}, self.root, fresh), {})
+        fresh.reset.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+"""Repo root discovery and the cached ProjectContext (_utils.py)."""
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+
+TOOLS = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(TOOLS))
+
+import _utils  # noqa: E402
+
+
+def _write(path: Path, text: str) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text, encoding="utf-8")
+
+
+class FindRepoRootTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = Path(tempfile.mkdtemp(prefix="codex-root-")).resolve()
+        self.addCleanup(shutil.rmtree, self.tmp, True)
+        cwd = os.getcwd()
+        self.addCleanup(os.chdir, cwd)
+
+    def test_relative_start_follows_chdir(self):
+        for name in ("one", "two"):
+            _write(self.tmp / name / "package.json", "{}")
+            (self.tmp / name / "src").mkdir()
+        os.chdir(self.tmp / "one" / "src")
+        self.assertEqual(_utils.find_repo_root(Path(".")), self.tmp / "one")
+        os.chdir(self.tmp / "two" / "src")
+        self.assertEqual(_utils.find_repo_root(Path(".")), self.tmp / "two")
+        self.assertEqual(_utils.find_repo_root(), self.tmp / "two")
+
+    def test_override_and_removed_markers(self):
+        _write(self.tmp / "outer" / "package.json", "{}")
+        _write(self.tmp / "outer" / "inner" / "package.json", "{}")
+        inner = self.tmp / "outer" / "inner"
+        self.assertEqual(_utils.find_repo_root(inner), inner)
+        (inner / "package.json").unlink()
+        self.assertEqual(_utils.find_repo_root(inner), self.tmp / "outer")
+        os.chdir(inner)
+        with _utils.repo_root_override(self.tmp):
+            self.assertEqual(_utils.find_repo_root(), self.tmp)
+        self.assertEqual(_utils.find_repo_root(), self.tmp / "outer")
+
+
+class ProjectContextTest(unittest.TestCase):
+    def setUp(self):
+        self.root = Path(tempfile.mkdtemp(prefix="codex-ctx-"))
+        self.addCleanup(shutil.rmtree, self.root, True)
+        _write(self.root / "package.json", json.dumps({
+            "name": "ctx",
+            "workspaces": ["packages/*"],
+            "devDependencies": {"typescript": "^5"},
+            "scripts": {"test": "node --test tests/"},
+        }))
+        _write(self.root / "pnpm-lock.yaml", "")
+        _write(self.root / "packages" / "api" / "package.json", json.dumps({"name": "@ctx/api", "scripts": {"test": "vitest run"}}))
+
+    def test_derived_fields(self):
+        ctx = _utils.ProjectContext.get(self.root)
+        self.assertEqual((ctx.package_manager, ctx.lockfile, ctx.typescript), ("pnpm", "pnpm-lock.yaml", True))
+        self.assertEqual(ctx.test_runner, "node-test-runner")
+        self.assertEqual([(ws["name"], ws["rel"], ws["test_runner"]) for ws in ctx.workspaces], [("@ctx/api", "packages/api", "vitest")])
+        self.assertIs(ctx.workspace_for(Path("packages/api/src/x.ts")), ctx.workspaces[0])
+        self.assertIs(ctx.workspace_for(self.root / "packages" / "api"), ctx.workspaces[0])
+        self.assertIsNone(ctx.workspace_for(Path("packages/apiary/x.ts")))
+
+    def test_cached_until_a_source_changes(self):
+        ctx = _utils.ProjectContext.get(self.root)
+        self.assertIs(_utils.ProjectContext.get(self.root), ctx)
+        _write(self.root / "packages" / "web" / "package.json", json.dumps({"name": "@ctx/web"}))
+        fresh = _utils.ProjectContext.get(self.root)
+        self.assertIsNot(fresh, ctx)
+        self.assertEqual([ws["name"] for ws in fresh.workspaces], ["@ctx/api", "@ctx/web"])
+        _write(self.root / "package.json", json.dumps({"name": "ctx", "scripts": {"test": "jest"}, "extra": "x" * 10}))
+        self.assertEqual(_utils.ProjectContext.get(self.root).test_runner, "jest")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+"""In-process tool dispatch (_dispatch.call_tool) and the tools that lean on it."""
+import shutil
+import sys
+import tempfile
+import textwrap
+import unittest
+from pathlib import Path
+from unittest import mock
+
+
+TOOLS = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(TOOLS))
+
+import _dispatch  # noqa: E402
+import doctor  # noqa: E402
+
+
+class CallToolTest(unittest.TestCase):
+    def setUp(self):
+        self.tools = Path(tempfile.mkdtemp(prefix="codex-dispatch-"))
+        self.addCleanup(shutil.rmtree, self.tools, True)
+        for patcher in (mock.patch.object(_dispatch, "TOOLS_DIR", self.tools), mock.patch.dict(_dispatch._modules, clear=True)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tool(self, name: str, source: str) -> None:
+        (self.tools / f"{name}.py").write_text(textwrap.dedent(source), encoding="utf-8")
+
+    def call(self, name: str, argv: list[str], **kw) -> dict:
+        return _dispatch.call_tool(name, argv, root=self.tools, **kw)
+
+    def test_invoke_result_in_process(self):
+        self.tool("echo", """\
+            import os
+
+            def invoke(argv):
+                return {"code": 0, "argv": argv, "pid": os.getpid()}
+            """)
+        res = self.call("echo", ["a", "b"])
+        self.assertEqual(res, {"code": 0, "argv": ["a", "b"], "pid": __import__("os").getpid()})
+
+    def test_tool_that_fails_to_import_is_a_failed_call(self):
+        self.tool("broken", "def invoke(argv)\n    return {}\n")
+        res = self.call("broken", [])
+        self.assertEqual(res["code"], 1)
+        self.assertIn("SyntaxError", res["stderr"])
+
+        self.tool("missing_dep", "import codex_no_such_module\n")
+        res = self.call("missing_dep", [])
+        self.assertEqual(res["code"], 1)
+        self.assertIn("ModuleNotFoundError", res["stderr"])
+
+    def test_usage_errors_keep_their_exit_code(self):
+        self.tool("usage", """\
+            import argparse
+
+            def invoke(argv):
+                argparse.ArgumentParser(prog="usage").parse_args(argv)
+                return {"code": 0}
+            """)
+        self.assertEqual(self.call("usage", ["--nope"])["code"], 2)
+
+    def test_isolated_call_parses_the_json_output(self):
+        self.tool("isolated", """\
+            import json
+            print(json.dumps({"ok": True, "code": 5}))
+            raise SystemExit(3)
+            """)
+        res = self.call("isolated", [], isolated=True)
+        self.assertEqual(res["code"], 3)
+        self.assertTrue(res["ok"])
+
+    def test_doctor_survives_a_broken_test_tool(self):
+        self.tool("test", "raise SystemExit(3)\n")
+        res = doctor.check_tests_detect(self.tools)
+        self.assertFalse(res["ok"])
+
+
+if __name__ == "__main__":
+    unittest.main()
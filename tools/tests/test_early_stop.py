@@ -0,0 +1,101 @@
+"""Early test-pass detection while the subagent runs (agent._exec_watching)."""
+import asyncio
+import shutil
+import subprocess
+import sys
+import tempfile
+import textwrap
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+
+TOOLS = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(TOOLS))
+
+import agent  # noqa: E402
+from _utils import working_tree_hash  # noqa: E402
+
+
+def _git(cwd: Path, *args: str) -> None:
+    subprocess.run(["git", "-c", "user.name=test", "-c", "user.email=test@localhost", *args], cwd=cwd, check=True, capture_output=True)
+
+
+class ExecWatchingTest(unittest.TestCase):
+    def setUp(self):
+        self.root = Path(tempfile.mkdtemp(prefix="codex-early-"))
+        self.addCleanup(shutil.rmtree, self.root, True)
+        (self.root / ".gitignore").write_text(".codex\n", encoding="utf-8")
+        (self.root / "impl.txt").write_text("0\n", encoding="utf-8")
+        _git(self.root, "init", "-q")
+        _git(self.root, "add", "-A")
+        _git(self.root, "commit", "-qm", "init")
+        for name, value in (("EARLY_CHECK_SETTLE_SEC", 0.2), ("EARLY_STOP_GRACE_SEC", 1.0)):
+            patcher = mock.patch.object(agent, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.checked: list[str] = []
+
+    def subagent(self, body: str) -> list[str]:
+        script = self.root.parent / f"{self.root.name}-subagent.py"
+        script.write_text(textwrap.dedent(body), encoding="utf-8")
+        self.addCleanup(script.unlink)
+        return [sys.executable, str(script)]
+
+    def early_check(self, delay: float = 0.0):
+        def check(root: Path, timeout_sec: float | None) -> str | None:
+            tree = working_tree_hash(root)
+            self.checked.append(tree)
+            time.sleep(delay)
+            return tree
+        return mock.patch.object(agent, "_early_check", check)
+
+    def test_stops_the_subagent_once_the_checked_tree_holds(self):
+        cmd = self.subagent("""\
+            import time
+            open("impl.txt", "w").write("1\\n")
+            print("implemented", flush=True)
+            time.sleep(60)
+            """)
+        started = time.monotonic()
+        with self.early_check():
+            res, green = asyncio.run(agent._exec_watching(self.root, cmd, None))
+        self.assertLess(time.monotonic() - started, 30)
+        self.assertNotEqual(res["code"], 0)
+        self.assertEqual(green, working_tree_hash(self.root))
+        self.assertIn("implemented", res["stdout"])
+
+    def test_keeps_going_while_the_tree_moves_under_the_check(self):
+        # Each check outlasts the settle time, so the next edit lands while it runs
+        cmd = self.subagent("""\
+            import time
+            for i in range(1, 4):
+                open("impl.txt", "w").write(f"{i}\\n")
+                time.sleep(0.6)
+            time.sleep(60)
+            """)
+        with self.early_check(delay=0.5):
+            res, green = asyncio.run(agent._exec_watching(self.root, cmd, None))
+        self.assertEqual((self.root / "impl.txt").read_text(encoding="utf-8"), "3\n")
+        self.assertEqual(green, working_tree_hash(self.root))
+
+    def test_a_subagent_ignoring_sigterm_is_killed_with_its_output(self):
+        cmd = self.subagent("""\
+            import signal, time
+            signal.signal(signal.SIGTERM, lambda *_: print("ignoring SIGTERM", flush=True))
+            open("impl.txt", "w").write("1\\n")
+            print("implemented", flush=True)
+            while True:
+                time.sleep(60)
+            """)
+        with self.early_check():
+            res, green = asyncio.run(agent._exec_watching(self.root, cmd, None))
+        self.assertIsNotNone(green)
+        self.assertEqual(res["code"], -9)
+        self.assertIn("implemented", res["stdout"])
+        self.assertIn("ignoring SIGTERM", res["stdout"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,106 @@
+"""Last-failed tracking (_timings.py) and test.py --only-failed/--failed-first."""
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import textwrap
+import unittest
+from pathlib import Path
+
+
+TOOLS = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(TOOLS))
+
+import _timings  # noqa: E402
+
+
+def _result(file: str, name: str, status: str) -> dict:
+    return {"id": f"{file}::{name}" if name else file, "file": file, "name": name, "shard": "root", "status": status, "duration_ms": 1.0}
+
+
+class LastFailedTest(unittest.TestCase):
+    def setUp(self):
+        self.root = Path(tempfile.mkdtemp(prefix="codex-failed-"))
+        self.addCleanup(shutil.rmtree, self.root, True)
+
+    def ids(self) -> list[str]:
+        return sorted(t["id"] for t in _timings.last_failed(self.root))
+
+    def test_failures_stay_until_they_pass(self):
+        self.assertEqual(_timings.last_failed(self.root), [])
+        _timings.update_last_failed(self.root, [_result("a.test.mjs", "x", "failed"), _result("a.test.mjs", "y", "failed"), _result("a.test.mjs", "z", "passed")])
+        self.assertEqual(self.ids(), ["a.test.mjs::x", "a.test.mjs::y"])
+        # A narrowed run that didn't execute y leaves it alone
+        _timings.update_last_failed(self.root, [_result("a.test.mjs", "x", "passed")])
+        self.assertEqual(self.ids(), ["a.test.mjs::y"])
+        _timings.update_last_failed(self.root, [_result("a.test.mjs", "y", "skipped")])
+        self.assertEqual(self.ids(), ["a.test.mjs::y"])
+
+    def test_file_failure_clears_once_a_test_in_it_passes(self):
+        _timings.update_last_failed(self.root, [_result("b.test.mjs", "", "failed")])
+        self.assertEqual(self.ids(), ["b.test.mjs"])
+        _timings.update_last_failed(self.root, [_result("b.test.mjs", "works", "passed")])
+        self.assertEqual(self.ids(), [])
+
+
+@unittest.skipUnless(shutil.which("node"), "node is required")
+class TestPyFailedTest(unittest.TestCase):
+    def setUp(self):
+        self.repo = Path(tempfile.mkdtemp(prefix="codex-failed-"))
+        self.addCleanup(shutil.rmtree, self.repo, True)
+        (self.repo / "package.json").write_text(json.dumps({"name": "f", "type": "module", "scripts": {"test": "node --test tests/"}}), encoding="utf-8")
+        (self.repo / ".gitignore").write_text(".codex\n", encoding="utf-8")
+        (self.repo / "tests").mkdir()
+        (self.repo / "tests" / "a.test.mjs").write_text(textwrap.dedent("""\
+            import test from 'node:test';
+            test('a one', () => {});
+            test('a two', () => {});
+            """), encoding="utf-8")
+        (self.repo / "tests" / "b.test.mjs").write_text(textwrap.dedent("""\
+            import test from 'node:test';
+            test('b ok', () => {});
+            test('b flips', () => { if (process.env.FAIL_B) throw new Error('b'); });
+            """), encoding="utf-8")
+        subprocess.run(["git", "init", "-q"], cwd=self.repo, check=True)
+
+    def run_tool(self, *args: str, fail: bool) -> dict:
+        env = {k: v for k, v in os.environ.items() if not k.startswith("CODEX_") and k != "FAIL_B"}
+        if fail:
+            env["FAIL_B"] = "1"
+        res = subprocess.run([sys.executable, str(TOOLS / "test.py"), "--json", "--no-typecheck", "--no-cache", *args],
+                             cwd=self.repo, env=env, capture_output=True, text=True, timeout=120)
+        return json.loads(res.stdout)
+
+    @staticmethod
+    def ran(payload: dict) -> list[str]:
+        # node reports the tests a name pattern filters out as skipped
+        return sorted(t["id"] for t in payload["tests"] if t["status"] != "skipped")
+
+    def test_only_failed(self):
+        # Nothing recorded yet: everything runs
+        self.assertEqual(len(self.run_tool("--only-failed", fail=True)["tests"]), 4)
+        payload = self.run_tool("--only-failed", fail=True)
+        self.assertEqual(self.ran(payload), ["tests/b.test.mjs::b flips"])
+        self.assertEqual(payload["only_failed"]["tests"], ["tests/b.test.mjs::b flips"])
+        self.assertTrue(self.run_tool("--only-failed", fail=False)["ok"])
+        self.assertEqual(_timings.last_failed(self.repo), [])
+
+    def test_failed_first(self):
+        self.run_tool(fail=True)
+        payload = self.run_tool("--failed-first", fail=True)
+        self.assertFalse(payload["ok"])
+        self.assertTrue(payload["failed_first"]["stopped"])
+        self.assertEqual(self.ran(payload), ["tests/b.test.mjs::b flips"])
+
+        payload = self.run_tool("--failed-first", fail=False)
+        self.assertTrue(payload["ok"])
+        self.assertFalse(payload["failed_first"]["stopped"])
+        self.assertEqual(payload["failed_first"]["tests"], ["tests/b.test.mjs::b flips"])
+        # Then the normal selection
+        self.assertEqual(len(payload["tests"]), 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,136 @@
+"""Flaky-test reruns and quarantine (_timings.update_flaky, test.py --rerun-failed, agent.run_tests)."""
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import textwrap
+import unittest
+from contextlib import redirect_stdout
+from pathlib import Path
+
+
+TOOLS = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(TOOLS))
+
+import _timings  # noqa: E402
+import agent  # noqa: E402
+
+
+def _result(name: str, status: str) -> dict:
+    return {"id": f"t.test.mjs::{name}", "file": "t.test.mjs", "name": name, "shard": "root", "status": status, "duration_ms": 1.0}
+
+
+def _git(cwd: Path, *args: str) -> None:
+    subprocess.run(["git", "-c", "user.name=test", "-c", "user.email=test@localhost", *args], cwd=cwd, check=True, capture_output=True)
+
+
+class FlakyHistoryTest(unittest.TestCase):
+    def setUp(self):
+        self.root = Path(tempfile.mkdtemp(prefix="codex-flaky-"))
+        self.addCleanup(shutil.rmtree, self.root, True)
+
+    def run_once(self, flaky: bool, status: str = "passed") -> None:
+        _timings.update_flaky(self.root, [_result("x", status), _result("steady", "passed")], {"t.test.mjs::x"} if flaky else set())
+
+    def test_quarantine_and_release(self):
+        self.run_once(flaky=True)
+        entry = _timings.flaky_state(self.root)["t.test.mjs::x"]
+        self.assertEqual((entry["flaky"], entry["quarantined"]), (1, False))
+        # Tests that were never flaky aren't tracked
+        self.assertEqual(list(_timings.flaky_state(self.root)), ["t.test.mjs::x"])
+        for _ in range(_timings.QUARANTINE_AFTER - 1):
+            self.run_once(flaky=True)
+        self.assertEqual(_timings.quarantined(self.root), ["t.test.mjs::x"])
+
+        for _ in range(_timings.RELEASE_AFTER - 1):
+            self.run_once(flaky=False)
+        # A real failure restarts the clean streak
+        self.run_once(flaky=False, status="failed")
+        self.assertEqual(_timings.flaky_state(self.root)["t.test.mjs::x"]["clean"], 0)
+        for _ in range(_timings.RELEASE_AFTER - 1):
+            self.run_once(flaky=False)
+        self.assertEqual(_timings.quarantined(self.root), ["t.test.mjs::x"])
+        self.run_once(flaky=False)
+        self.assertEqual(_timings.flaky_state(self.root), {})
+
+
+@unittest.skipUnless(shutil.which("node"), "node is required")
+class RerunTest(unittest.TestCase):
+    def setUp(self):
+        self.repo = Path(tempfile.mkdtemp(prefix="codex-flaky-"))
+        self.addCleanup(shutil.rmtree, self.repo, True)
+        # Outside the repo, so counting attempts doesn't change the working tree
+        self.counter = Path(tempfile.mkdtemp(prefix="codex-flaky-count-")) / "n"
+        self.addCleanup(shutil.rmtree, self.counter.parent, True)
+        (self.repo / "package.json").write_text(json.dumps({"name": "f", "type": "module", "scripts": {"test": "node --test tests/"}}), encoding="utf-8")
+        (self.repo / ".gitignore").write_text(".codex\n", encoding="utf-8")
+        (self.repo / "tests").mkdir()
+        (self.repo / "tests" / "a.test.mjs").write_text(textwrap.dedent(f"""\
+            import test from 'node:test';
+            import fs from 'node:fs';
+            const counter = {json.dumps(str(self.counter))};
+            test('steady', () => {{}});
+            test('flaky', () => {{
+              const n = fs.existsSync(counter) ? Number(fs.readFileSync(counter, 'utf8')) : 0;
+              fs.writeFileSync(counter, String(n + 1));
+              if (n % 2 === 0) throw new Error('first try fails');
+            }});
+            test('broken', () => {{ if (process.env.BROKEN) throw new Error('always'); }});
+            """), encoding="utf-8")
+        _git(self.repo, "init", "-q")
+        _git(self.repo, "add", "-A")
+        _git(self.repo, "commit", "-qm", "init")
+        self.env = {k: v for k, v in os.environ.items() if not k.startswith("CODEX_") and k != "BROKEN"}
+
+    def run_tool(self, *args: str) -> dict:
+        res = subprocess.run([sys.executable, str(TOOLS / "test.py"), "--json", "--no-typecheck", "--no-cache", *args],
+                             cwd=self.repo, env=self.env, capture_output=True, text=True, timeout=120)
+        return json.loads(res.stdout)
+
+    def test_flaky_test_passes_on_a_rerun(self):
+        payload = self.run_tool("--rerun-failed", "2")
+        self.assertTrue(payload["ok"])
+        self.assertEqual(payload["reruns"]["flaky"], ["tests/a.test.mjs::flaky"])
+        self.assertEqual(len(payload["reruns"]["attempts"]), 1)
+        flaky = next(t for t in payload["tests"] if t["name"] == "flaky")
+        self.assertEqual((flaky["status"], flaky["flaky"]), ("passed", True))
+        self.assertEqual(payload["quarantine"]["tests"], [])
+        payload = self.run_tool("--rerun-failed", "2")
+        self.assertEqual(payload["quarantine"]["tests"], ["tests/a.test.mjs::flaky"])
+
+    def test_real_failure_uses_every_rerun(self):
+        self.env["BROKEN"] = "1"
+        payload = self.run_tool("--rerun-failed", "2")
+        self.assertFalse(payload["ok"])
+        self.assertEqual(payload["reruns"]["flaky"], ["tests/a.test.mjs::flaky"])
+        self.assertEqual([a["tests"] for a in payload["reruns"]["attempts"]], [
+            ["tests/a.test.mjs::flaky", "tests/a.test.mjs::broken"],
+            ["tests/a.test.mjs::broken"],
+        ])
+        self.assertEqual(payload["test_counts"]["failed"], 1)
+
+    def test_agent_excuses_quarantined_failures_unless_the_task_touches_them(self):
+        _timings.update_flaky(self.repo, [{**_result("broken", "failed"), "id": "tests/a.test.mjs::broken"}], {"tests/a.test.mjs::broken"})
+        state = _timings.flaky_state(self.repo)
+        state["tests/a.test.mjs::broken"]["quarantined"] = True
+        (self.repo / ".codex" / "timings" / _timings.FLAKY_FILE).write_text(json.dumps({"tests": state}), encoding="utf-8")
+        self.counter.write_text("1", encoding="utf-8")
+        saved = {k: os.environ.pop(k) for k in list(os.environ) if k.startswith("CODEX_")}
+        self.addCleanup(os.environ.update, saved)
+        os.environ["BROKEN"] = "1"
+        self.addCleanup(os.environ.pop, "BROKEN", None)
+        with redirect_stdout(io.StringIO()) as out:
+            self.assertTrue(agent.run_tests(self.repo))
+        self.assertIn("only quarantined tests fail", out.getvalue())
+        with open(self.repo / "tests" / "a.test.mjs", "a", encoding="utf-8") as f:
+            f.write("// the task's own change\n")
+        self.counter.write_text("1", encoding="utf-8")
+        with redirect_stdout(io.StringIO()):
+            self.assertFalse(agent.run_tests(self.repo))
+
+
+if __name__ == "__main__":
+    unittest.main()
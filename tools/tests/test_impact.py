@@ -0,0 +1,202 @@
+"""Coverage attribution for the impact map (_impact.py, _coverage_preload.cjs) through tools/test.py."""
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import textwrap
+import unittest
+from pathlib import Path
+
+
+TOOLS = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(TOOLS))
+
+import _impact  # noqa: E402
+
+# Stands in for vitest's forks pool: one forked worker (vitest/dist/workers/forks.js) per
+# test file, ended with SIGTERM once it reports back, as tinypool does
+FAKE_VITEST = """\
+#!/usr/bin/env node
+import { fork } from 'node:child_process';
+import fs from 'node:fs';
+import path from 'node:path';
+import { fileURLToPath } from 'node:url';
+
+const worker = path.join(path.dirname(fileURLToPath(import.meta.url)), 'dist', 'workers', 'forks.js');
+const files = fs.readdirSync('src').filter((f) => f.endsWith('.test.mjs')).map((f) => path.resolve('src', f));
+let failed = false;
+for (const file of files) {
+  await new Promise((resolve) => {
+    const child = fork(worker, [file]);
+    child.on('message', (msg) => {
+      failed ||= !msg.ok;
+      child.kill('SIGTERM');
+    });
+    child.on('exit', resolve);
+  });
+}
+process.exit(failed ? 1 : 0);
+"""
+
+FAKE_VITEST_WORKER = """\
+import { pathToFileURL } from 'node:url';
+
+const mod = await import(pathToFileURL(process.argv[2]).href);
+let ok = true;
+try {
+  await mod.default();
+} catch {
+  ok = false;
+}
+process.send({ ok });
+setInterval(() => {}, 1000);
+"""
+
+
+def _write(path: Path, text: str) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(textwrap.dedent(text), encoding="utf-8")
+
+
+def _git(cwd: Path, *args: str) -> None:
+    subprocess.run(["git", "-c", "user.name=test", "-c", "user.email=test@localhost", *args], cwd=cwd, check=True, capture_output=True)
+
+
+@unittest.skipUnless(shutil.which("node") and shutil.which("npm"), "node and npm are required")
+class VitestAttributionTest(unittest.TestCase):
+    def setUp(self):
+        self.repo = Path(tempfile.mkdtemp(prefix="codex-impact-"))
+        self.addCleanup(shutil.rmtree, self.repo, True)
+        repo = self.repo
+        _write(repo / "package.json", json.dumps({"name": "impact", "private": True, "workspaces": ["packages/*"]}))
+        _write(repo / ".gitignore", "node_modules\n.codex\n")
+        lib = repo / "packages" / "lib"
+        _write(lib / "package.json", json.dumps({"name": "@impact/lib", "private": True, "type": "module", "scripts": {"test": "vitest run"}}))
+        _write(lib / "src" / "a.mjs", "export const a = () => 1;\n")
+        _write(lib / "src" / "b.mjs", "export const b = () => 2;\n")
+        _write(lib / "src" / "helper.mjs", "console.log('helper');\n")
+        _write(lib / "src" / "a.test.mjs", """\
+            import { spawnSync } from 'node:child_process';
+            import { fileURLToPath } from 'node:url';
+            import { a } from './a.mjs';
+
+            export default function () {
+              // Processes a test starts (npm, tsc, builds) aren't test runners
+              spawnSync('node', [fileURLToPath(new URL('./helper.mjs', import.meta.url))]);
+              if (a() !== 1) throw new Error('a');
+            }
+            """)
+        _write(lib / "src" / "b.test.mjs", """\
+            import { b } from './b.mjs';
+
+            export default function () {
+              if (b() !== 2) throw new Error('b');
+            }
+            """)
+        vitest = repo / "node_modules" / "vitest"
+        _write(vitest / "package.json", json.dumps({"name": "vitest", "type": "module", "bin": {"vitest": "vitest.mjs"}}))
+        _write(vitest / "vitest.mjs", FAKE_VITEST)
+        _write(vitest / "dist" / "workers" / "forks.js", FAKE_VITEST_WORKER)
+        (vitest / "vitest.mjs").chmod(0o755)
+        (repo / "node_modules" / ".bin").mkdir()
+        (repo / "node_modules" / ".bin" / "vitest").symlink_to("../vitest/vitest.mjs")
+        _git(repo, "init", "-q")
+        _git(repo, "add", "-A")
+        _git(repo, "commit", "-qm", "init")
+
+    def test_fork_workers_are_attributed_per_test_file(self):
+        env = {k: v for k, v in os.environ.items() if not k.startswith("CODEX_")}
+        res = subprocess.run(
+            [sys.executable, str(TOOLS / "test.py"), "--workspaces", "--json", "--no-cache", "--no-typecheck"],
+            cwd=self.repo, env=env, capture_output=True, text=True, timeout=120,
+        )
+        payload = json.loads(res.stdout)
+        self.assertTrue(payload["ok"], payload["stderr"])
+        self.assertEqual([s["name"] for s in payload["shards"]], ["@impact/lib"])
+
+        impact = json.loads((self.repo / ".codex" / "cache" / "impact.json").read_text(encoding="utf-8"))
+        files = {test: set(entry["files"]) for test, entry in impact["tests"].items()}
+        self.assertEqual(set(files), {"packages/lib/src/a.test.mjs", "packages/lib/src/b.test.mjs"})
+        self.assertIn("packages/lib/src/a.mjs", files["packages/lib/src/a.test.mjs"])
+        self.assertNotIn("packages/lib/src/b.mjs", files["packages/lib/src/a.test.mjs"])
+        self.assertIn("packages/lib/src/b.mjs", files["packages/lib/src/b.test.mjs"])
+        self.assertNotIn("packages/lib/src/a.mjs", files["packages/lib/src/b.test.mjs"])
+        self.assertFalse(any("packages/lib/src/helper.mjs" in f for f in files.values()))
+
+    def test_only_runner_processes_dump(self):
+        cov_dir = self.repo / "cov"
+        env = {**os.environ, **_impact.coverage_env(self.repo, cov_dir)}
+        src = self.repo / "packages" / "lib" / "src"
+        subprocess.run(["node", str(src / "helper.mjs")], env=env, check=True, capture_output=True)
+        subprocess.run(["npm", "--version"], env=env, check=True, capture_output=True)
+        self.assertFalse(cov_dir.exists())
+        subprocess.run(["node", str(src / "b.test.mjs")], env=env, check=True, capture_output=True)
+        self.assertFalse(cov_dir.exists())
+        # The `node --test <file>` parent has no inspector; only its file subprocess records
+        subprocess.run(["node", "--test", str(src / "b.test.mjs")], env=env, check=True, capture_output=True)
+        dumps = list(cov_dir.glob("coverage-*.json"))
+        self.assertEqual(len(dumps), 1)
+        urls = {s["url"] for s in json.loads(dumps[0].read_text(encoding="utf-8"))["result"]}
+        self.assertEqual({u.rsplit("/", 1)[-1] for u in urls}, {"b.test.mjs", "b.mjs"})
+
+
+@unittest.skipUnless(shutil.which("node"), "node is required")
+class NodeTestRunnerTest(unittest.TestCase):
+    """node:test runs narrowed to files, where `node --test <file>...` runs with the coverage preload."""
+
+    def setUp(self):
+        self.repo = Path(tempfile.mkdtemp(prefix="codex-impact-"))
+        self.addCleanup(shutil.rmtree, self.repo, True)
+        repo = self.repo
+        _write(repo / "package.json", json.dumps({"name": "impact", "private": True, "type": "module", "scripts": {"test": "node --test tests/"}}))
+        _write(repo / ".gitignore", "node_modules\n.codex\n")
+        _write(repo / "src" / "a.mjs", "export const a = () => 1;\n")
+        _write(repo / "tests" / "a.test.mjs", """\
+            import test from 'node:test';
+            import assert from 'node:assert';
+            import { a } from '../src/a.mjs';
+
+            test('a', () => assert.equal(a(), 1));
+            """)
+        _write(repo / "tests" / "b.test.mjs", """\
+            import test from 'node:test';
+
+            test('b', () => {});
+            """)
+        _git(repo, "init", "-q")
+        _git(repo, "add", "-A")
+        _git(repo, "commit", "-qm", "init")
+
+    def run_tests(self, *args: str) -> dict:
+        env = {k: v for k, v in os.environ.items() if not k.startswith("CODEX_")}
+        res = subprocess.run(
+            [sys.executable, str(TOOLS / "test.py"), "--json", "--no-cache", "--no-typecheck", *args],
+            cwd=self.repo, env=env, capture_output=True, text=True, timeout=120,
+        )
+        return json.loads(res.stdout)
+
+    def impact(self) -> dict[str, list[str]]:
+        impact = json.loads((self.repo / ".codex" / "cache" / "impact.json").read_text(encoding="utf-8"))
+        return {test: entry["files"] for test, entry in impact["tests"].items()}
+
+    def test_only_failed(self):
+        # A file that fails to load has no test names, so the rerun can't be narrowed by name
+        _write(self.repo / "tests" / "b.test.mjs", "throw new Error('b');\n")
+        self.assertFalse(self.run_tests()["ok"])
+        _git(self.repo, "checkout", "--", "tests/b.test.mjs")
+        payload = self.run_tests("--only-failed")
+        self.assertTrue(payload["ok"], [s["stderr"] for s in payload["shards"]])
+        self.assertEqual([s["cmd"] for s in payload["shards"]], [["node", "--test", "tests/b.test.mjs"]])
+        self.assertIn("tests/b.test.mjs", self.impact())
+
+    def test_changed(self):
+        _write(self.repo / "src" / "a.mjs", "export const a = () => 1; // changed\n")
+        payload = self.run_tests("--changed")
+        self.assertTrue(payload["ok"], [s["stderr"] for s in payload["shards"]])
+        self.assertEqual([s["cmd"] for s in payload["shards"]], [["node", "--test", "tests/a.test.mjs"]])
+        self.assertIn("src/a.mjs", self.impact()["tests/a.test.mjs"])
+
+if __name__ == "__main__":
+    unittest.main()
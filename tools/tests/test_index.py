@@ -0,0 +1,97 @@
+"""The repository index behind the prompts' context blocks (_index.py)."""
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+
+TOOLS = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(TOOLS))
+
+import _index  # noqa: E402
+
+
+def _write(path: Path, text: str) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text, encoding="utf-8")
+
+
+class IndexTest(unittest.TestCase):
+    def setUp(self):
+        self.root = Path(tempfile.mkdtemp(prefix="codex-index-"))
+        self.addCleanup(shutil.rmtree, self.root, True)
+        _write(self.root / ".gitignore", ".codex\nnode_modules\n")
+        subprocess.run(["git", "init", "-q"], cwd=self.root, check=True)
+
+    def repo(self, workspaces: bool) -> None:
+        root = self.root
+        manifest = {"name": "idx", "private": True}
+        if workspaces:
+            manifest["workspaces"] = ["packages/*"]
+            _write(root / "packages" / "config" / "package.json", json.dumps({"name": "@idx/config", "scripts": {"test": "vitest run"}}))
+            _write(root / "packages" / "config" / "src" / "parseConfig.ts", "export function parseConfig(text: string) {}\nexport const DEFAULTS = {};\n")
+            _write(root / "packages" / "config" / "src" / "parseConfig.test.ts", "import { parseConfig } from './parseConfig';\n")
+            _write(root / "packages" / "config" / "LOG.md", "## Parser\n- handles comments\n")
+        _write(root / "package.json", json.dumps(manifest))
+        _write(root / "src" / "server.mjs", "const a = 1, b = 2;\nexport { a, b as listenPort };\nexport default class Server {}\n")
+
+    def test_entries(self):
+        self.repo(workspaces=True)
+        files = _index.update(self.root)["files"]
+        self.assertEqual(files["packages/config/src/parseConfig.ts"]["symbols"], ["DEFAULTS", "parseConfig"])
+        self.assertEqual(files["packages/config/src/parseConfig.ts"]["package"], "@idx/config")
+        self.assertTrue(files["packages/config/src/parseConfig.test.ts"]["test"])
+        self.assertEqual(files["src/server.mjs"]["symbols"], ["Server", "a", "listenPort"])
+        self.assertIsNone(files["src/server.mjs"]["package"])
+        self.assertEqual(files["packages/config/LOG.md"]["log"], ["Parser: handles comments"])
+        self.assertFalse(any(rel.startswith(".codex/") for rel in files))
+
+    def test_update_reparses_changed_files_only(self):
+        self.repo(workspaces=False)
+        _index.update(self.root)
+        server = self.root / "src" / "server.mjs"
+        st = server.stat()
+        os.utime(server, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+        _write(self.root / "src" / "extra.mjs", "export const extra = 1;\n")
+        with mock.patch.object(_index, "_parse", wraps=_index._parse) as parse:
+            files = _index.update(self.root)["files"]
+        # Touched but unchanged: restamped without a re-parse
+        self.assertEqual([c.args[0] for c in parse.call_args_list], ["src/extra.mjs"])
+        self.assertEqual(files["src/server.mjs"]["stamp"][0], server.stat().st_mtime_ns)
+
+        (self.root / "src" / "extra.mjs").unlink()
+        self.assertNotIn("src/extra.mjs", _index.update(self.root)["files"])
+        self.assertNotIn("src/extra.mjs", _index.load(self.root)["files"])
+
+    def test_relevant_ranks_paths_and_symbols(self):
+        self.repo(workspaces=True)
+        index = _index.update(self.root)
+        ranked = [rel for rel, _ in _index.relevant(index, "Fix parseConfig defaults")]
+        self.assertEqual(ranked[0], "packages/config/src/parseConfig.ts")
+        self.assertNotIn("src/server.mjs", ranked)
+        self.assertEqual(_index.relevant(index, "the and for"), [])
+
+    def test_context_block(self):
+        self.repo(workspaces=True)
+        block = _index.context_block(self.root, "parse config comments")
+        lines = block.splitlines()
+        self.assertEqual(lines[:2], ["## Repository context", ""])
+        self.assertIn("Packages: @idx/config (packages/config, vitest)", lines)
+        self.assertIn("- packages/config/src/parseConfig.ts [@idx/config] exports: DEFAULTS, parseConfig", lines)
+        self.assertIn("Recent packages/config/LOG.md:", lines)
+        self.assertEqual(_index.context_block(self.root, "parse config comments", max_chars=120).splitlines()[-1], "- ...")
+
+    def test_no_context_block_when_nothing_matches(self):
+        self.repo(workspaces=False)
+        self.assertEqual(_index.context_block(self.root, "unrelated words entirely"), "")
+        _write(self.root / "LOG.md", "## Setup\n")
+        self.assertEqual(_index.context_block(self.root, "unrelated words entirely"), "## Repository context\n\nRecent LOG.md:\n- Setup\n")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+"""Buffered, rotating JSONL logs and one-off reports (_logs.py)."""
+import json
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+
+TOOLS = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(TOOLS))
+
+import _logs  # noqa: E402
+
+
+class JsonlLogTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = Path(tempfile.mkdtemp(prefix="codex-logs-"))
+        self.addCleanup(shutil.rmtree, self.dir, True)
+        self.path = self.dir / "tools.log"
+
+    def log(self, **kw) -> _logs.JsonlLog:
+        log = _logs.JsonlLog(self.path, **{"max_bytes": 0, "backups": 3, "flush_bytes": 1 << 20, "flush_sec": 60, **kw})
+        self.addCleanup(log.close)
+        return log
+
+    def test_buffered_until_flushed(self):
+        log = self.log()
+        log.write({"n": 1})
+        self.assertFalse(self.path.exists())
+        log.flush()
+        self.assertEqual(list(_logs.iter_jsonl(self.path)), [{"n": 1}])
+
+    def test_flushes_once_enough_is_pending(self):
+        log = self.log(flush_bytes=100)
+        for n in range(10):
+            log.write({"n": n, "pad": "x" * 20})
+        self.assertGreaterEqual(len(self.path.read_text(encoding="utf-8").splitlines()), 3)
+
+    def test_flushes_after_flush_sec(self):
+        log = self.log(flush_sec=0.2)
+        log.write({"n": 1})
+        deadline = time.monotonic() + 5
+        while not self.path.exists() and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self.assertEqual(list(_logs.iter_jsonl(self.path)), [{"n": 1}])
+
+    def test_rotation_keeps_backups_gzipped_and_readable_in_order(self):
+        log = self.log(max_bytes=200, flush_bytes=0)
+        for n in range(60):
+            log.write({"n": n, "pad": "x" * 30})
+        log.flush()
+        segments = _logs.rotated_segments(self.path)
+        self.assertEqual([p.name for p in segments if p.suffix == ".gz"], ["tools.log.3.gz", "tools.log.2.gz", "tools.log.1.gz"])
+        self.assertFalse((self.dir / "tools.log.4.gz").exists())
+        numbers = [r["n"] for r in _logs.iter_jsonl(self.path)]
+        # Oldest segments were dropped; what's left is contiguous and in order
+        self.assertEqual(numbers, list(range(numbers[0], 60)))
+        self.assertGreater(numbers[0], 0)
+
+    def test_processes_append_to_one_file(self):
+        script = (
+            f"import sys; sys.path.insert(0, {str(TOOLS)!r})\n"
+            "import _logs\n"
+            f"log = _logs.get_log(__import__('pathlib').Path({str(self.path)!r}))\n"
+            "for n in range(200): log.write({'pid': sys.argv[1], 'n': n})\n"
+        )
+        procs = [subprocess.Popen([sys.executable, "-c", script, str(i)]) for i in range(3)]
+        for p in procs:
+            self.assertEqual(p.wait(timeout=60), 0)
+        records = list(_logs.iter_jsonl(self.path))
+        self.assertEqual(len(records), 600)
+        for i in range(3):
+            self.assertEqual([r["n"] for r in records if r["pid"] == str(i)], list(range(200)))
+
+    def test_get_log_is_shared_per_path(self):
+        self.assertIs(_logs.get_log(self.path), _logs.get_log(self.dir / "." / "tools.log"))
+
+
+class ReportTest(unittest.TestCase):
+    def test_reports_never_overwrite_each_other(self):
+        log_dir = Path(tempfile.mkdtemp(prefix="codex-logs-"))
+        self.addCleanup(shutil.rmtree, log_dir, True)
+        paths = [_logs.write_report(log_dir, "hang", {"n": n}) for n in range(5)]
+        self.assertEqual(len(set(paths)), 5)
+        self.assertEqual([json.loads(p.read_text(encoding="utf-8"))["n"] for p in paths], list(range(5)))
+        self.assertTrue(all(p.name.startswith("hang_") for p in paths))
+
+
+if __name__ == "__main__":
+    unittest.main()
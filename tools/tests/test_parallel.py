@@ -0,0 +1,101 @@
+"""Typecheck and tests side by side in test.py (--parallel, --fail-fast, auto typecheck)."""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import textwrap
+import unittest
+from pathlib import Path
+
+
+TOOLS = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(TOOLS))
+
+from _dispatch import load_tool  # noqa: E402
+
+test_tool = load_tool("test")
+
+
+def _write(path: Path, text: str) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(textwrap.dedent(text), encoding="utf-8")
+
+
+class AutoTypecheckTest(unittest.TestCase):
+    def setUp(self):
+        self.root = Path(tempfile.mkdtemp(prefix="codex-parallel-"))
+        self.addCleanup(shutil.rmtree, self.root, True)
+        _write(self.root / "tsconfig.json", "{}")
+
+    def manifest(self, test_script: str) -> None:
+        _write(self.root / "package.json", json.dumps({"name": "p", "scripts": {"test": test_script, "typecheck": "tsc --noEmit"}}))
+
+    def plan(self, typecheck=None):
+        return test_tool._plan_typecheck(self.root, argparse.Namespace(typecheck=typecheck, category=None))
+
+    def test_script_that_typechecks_itself(self):
+        self.manifest("tsc --noEmit && vitest run")
+        self.assertTrue(test_tool.test_script_runs_typecheck(self.root, "test"))
+        self.assertEqual(self.plan(), (None, "covered by the 'test' script"))
+        # Asked for explicitly, it runs anyway
+        self.assertEqual(self.plan(True)[1], None)
+
+    def test_node_test_files_that_typecheck(self):
+        self.manifest('node --test "tests/**/*.mjs"')
+        _write(self.root / "tests" / "a.test.mjs", "test('a', () => {});\n")
+        self.assertFalse(test_tool.test_script_runs_typecheck(self.root, "test"))
+        self.assertEqual(self.plan(), (["npm", "run", "typecheck"], None))
+        _write(self.root / "tests" / "tooling.test.mjs", "spawnSync('npm', ['run', '-s', 'typecheck']);\n")
+        self.assertTrue(test_tool.test_script_runs_typecheck(self.root, "test"))
+
+    def test_disabled_or_not_typescript(self):
+        self.manifest("vitest run")
+        self.assertEqual(self.plan(False), (None, "disabled"))
+        (self.root / "tsconfig.json").unlink()
+        self.assertEqual(self.plan(), (None, "typescript not detected"))
+
+
+@unittest.skipUnless(shutil.which("node") and shutil.which("npm"), "node and npm are required")
+class ParallelRunTest(unittest.TestCase):
+    def setUp(self):
+        self.repo = Path(tempfile.mkdtemp(prefix="codex-parallel-"))
+        self.addCleanup(shutil.rmtree, self.repo, True)
+        _write(self.repo / "tsconfig.json", "{}")
+        _write(self.repo / ".gitignore", ".codex\n")
+        _write(self.repo / "tests" / "slow.test.mjs", """\
+            import test from 'node:test';
+            test('slow', async () => { await new Promise((r) => setTimeout(r, Number(process.env.SLOW_MS || 1500))); });
+            """)
+        subprocess.run(["git", "init", "-q"], cwd=self.repo, check=True)
+
+    def run_tests(self, typecheck: str, *args: str, slow_ms: int = 1500) -> dict:
+        _write(self.repo / "package.json", json.dumps({"name": "p", "type": "module", "scripts": {"test": "node --test tests/", "typecheck": typecheck}}))
+        env = {**{k: v for k, v in os.environ.items() if not k.startswith("CODEX_")}, "SLOW_MS": str(slow_ms)}
+        res = subprocess.run(
+            [sys.executable, str(TOOLS / "test.py"), "--json", "--no-cache", "--typecheck", "--no-incremental", "--parallel", *args],
+            cwd=self.repo, env=env, capture_output=True, text=True, timeout=120,
+        )
+        return json.loads(res.stdout)
+
+    def test_side_by_side(self):
+        payload = self.run_tests("node -e \"setTimeout(() => {}, 1500)\"")
+        self.assertTrue(payload["ok"])
+        self.assertEqual(payload["typecheck"]["code"], 0)
+        busy = payload["typecheck"]["duration_sec"] + payload["duration_sec"]
+        self.assertGreater(busy, 2.8)
+        self.assertLess(payload["wall_sec"], busy - 0.8)
+
+    def test_fail_fast_cancels_the_tests(self):
+        payload = self.run_tests("node -e \"process.exit(2)\"", "--fail-fast", slow_ms=20000)
+        self.assertFalse(payload["ok"])
+        self.assertEqual(payload["typecheck"]["code"], 2)
+        self.assertLess(payload["wall_sec"], 15)
+        self.assertTrue(payload["cancelled"])
+        self.assertFalse(payload["tests_ran"])
+
+
+if __name__ == "__main__":
+    unittest.main()
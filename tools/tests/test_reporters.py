@@ -0,0 +1,162 @@
+"""Structured test reports (_reporters.py) and the timing history (_timings.py)."""
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import textwrap
+import unittest
+from pathlib import Path
+
+
+TOOLS = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(TOOLS))
+
+import _reporters  # noqa: E402
+import _timings  # noqa: E402
+
+
+class InstrumentTest(unittest.TestCase):
+    report = Path("/tmp/r.json")
+
+    def test_script_runners_get_a_separator(self):
+        cmd, env = _reporters.instrument(["npm", "run", "test"], "vitest", self.report)
+        self.assertEqual(cmd, ["npm", "run", "test", "--", "--reporter=default", "--reporter=json", f"--outputFile.json={self.report}"])
+        self.assertEqual(env, {})
+        cmd, _ = _reporters.instrument(["npm", "run", "test", "--", "a.test.ts"], "jest", self.report)
+        self.assertEqual(cmd, ["npm", "run", "test", "--", "a.test.ts", "--json", f"--outputFile={self.report}"])
+
+    def test_keeps_the_scripts_own_reporter(self):
+        cmd, _ = _reporters.instrument(["npx", "vitest", "run"], "vitest", self.report, "vitest run --reporter=dot")
+        self.assertNotIn("--reporter=default", cmd)
+
+    def test_unsupported_runner(self):
+        self.assertIsNone(_reporters.instrument(["npm", "test"], "ava", self.report))
+        self.assertIsNone(_reporters.instrument(["npm", "test"], None, self.report))
+
+    @unittest.skipUnless(shutil.which("node"), "node is required")
+    def test_node_goes_through_node_options(self):
+        cmd, env = _reporters.instrument(["node", "--test", "tests/"], "node-test-runner", self.report)
+        self.assertEqual(cmd, ["node", "--test", "tests/"])
+        self.assertIn(f'--test-reporter="{_reporters.NODE_REPORTER}"', env["NODE_OPTIONS"])
+
+
+class ParseTest(unittest.TestCase):
+    def setUp(self):
+        self.root = Path(tempfile.mkdtemp(prefix="codex-reporters-"))
+        self.addCleanup(shutil.rmtree, self.root, True)
+        self.report = self.root / "report.json"
+
+    def parse(self, runner: str, data) -> list[dict] | None:
+        self.report.write_text(data if isinstance(data, str) else json.dumps(data), encoding="utf-8")
+        tests = _reporters.parse(runner, self.report, self.root)
+        self.assertFalse(self.report.exists())
+        return tests
+
+    def test_jest_like(self):
+        tests = self.parse("vitest", {"testResults": [
+            {"name": str(self.root / "src" / "a.test.ts"), "assertionResults": [
+                {"ancestorTitles": ["math"], "title": "adds", "status": "passed", "duration": 1.23456},
+                {"ancestorTitles": [], "title": "breaks", "status": "failed", "duration": 2, "failureMessages": ["x" * 600]},
+                {"ancestorTitles": [], "title": "later", "status": "todo"},
+            ]},
+            {"name": str(self.root / "src" / "b.test.ts"), "status": "failed", "message": "SyntaxError", "assertionResults": []},
+        ]})
+        self.assertEqual([(t["id"], t["status"]) for t in tests], [
+            ("src/a.test.ts::math > adds", "passed"),
+            ("src/a.test.ts::breaks", "failed"),
+            ("src/a.test.ts::later", "skipped"),
+            ("src/b.test.ts", "failed"),
+        ])
+        self.assertEqual(tests[0]["duration_ms"], 1.235)
+        self.assertEqual(len(tests[1]["message"]), _reporters.MESSAGE_CHARS)
+        self.assertEqual((tests[3]["name"], tests[3]["message"]), ("", "SyntaxError"))
+        self.assertEqual(_reporters.counts(tests), {"passed": 1, "failed": 2, "skipped": 1})
+
+    def test_mocha(self):
+        tests = self.parse("mocha", {
+            "tests": [
+                {"file": "test/a.js", "fullTitle": "a works", "duration": 3},
+                {"file": "test/a.js", "fullTitle": "a fails", "duration": 1, "err": {"message": "boom"}},
+                {"file": "test/a.js", "fullTitle": "a later"},
+            ],
+            "pending": [{"fullTitle": "a later"}],
+        })
+        self.assertEqual([(t["id"], t["status"], t["message"]) for t in tests], [
+            ("test/a.js::a works", "passed", None),
+            ("test/a.js::a fails", "failed", "boom"),
+            ("test/a.js::a later", "skipped", None),
+        ])
+
+    def test_node_lines(self):
+        line = {"file": str(self.root / "t.test.mjs"), "name": "s > c", "status": "passed", "duration_ms": 0.5, "message": None}
+        self.assertEqual(self.parse("node-test-runner", json.dumps(line) + "\n\n")[0]["id"], "t.test.mjs::s > c")
+
+    def test_missing_or_broken_report(self):
+        self.assertIsNone(_reporters.parse("vitest", self.report, self.root))
+        self.assertIsNone(self.parse("jest", "{not json"))
+        self.assertIsNone(self.parse("ava", "{}"))
+
+
+class TimingsTest(unittest.TestCase):
+    def setUp(self):
+        self.root = Path(tempfile.mkdtemp(prefix="codex-timings-"))
+        self.addCleanup(shutil.rmtree, self.root, True)
+
+    @staticmethod
+    def result(id: str, status: str, ms: float | None) -> dict:
+        file, _, name = id.partition("::")
+        return {"id": id, "file": file, "name": name, "shard": "root", "status": status, "duration_ms": ms}
+
+    def test_slowest_ranks_by_mean(self):
+        self.assertEqual(_timings.slowest(self.root, 5), [])
+        _timings.record(self.root, [self.result("a::fast", "passed", 1), self.result("a::slow", "passed", 100), self.result("a::skip", "skipped", 500)])
+        _timings.record(self.root, [self.result("a::fast", "failed", 3), self.result("a::slow", "passed", 50), self.result("a::none", "passed", None)])
+        rows = _timings.slowest(self.root, 5)
+        self.assertEqual([(r["id"], r["runs"], r["failures"], r["mean_ms"], r["max_ms"], r["last_ms"]) for r in rows], [
+            ("a::slow", 2, 0, 75.0, 100, 50),
+            ("a::fast", 2, 1, 2.0, 3, 3),
+        ])
+        self.assertEqual(len(_timings.slowest(self.root, 1)), 1)
+
+
+@unittest.skipUnless(shutil.which("node"), "node is required")
+class TestPyResultsTest(unittest.TestCase):
+    def setUp(self):
+        self.repo = Path(tempfile.mkdtemp(prefix="codex-reporters-"))
+        self.addCleanup(shutil.rmtree, self.repo, True)
+        (self.repo / "package.json").write_text(json.dumps({"name": "r", "type": "module", "scripts": {"test": "node --test tests/"}}), encoding="utf-8")
+        (self.repo / ".gitignore").write_text(".codex\n", encoding="utf-8")
+        (self.repo / "tests").mkdir()
+        (self.repo / "tests" / "a.test.mjs").write_text(textwrap.dedent("""\
+            import test, { describe } from 'node:test';
+            describe('suite', () => {
+              test('passes', () => {});
+              test('fails', () => { throw new Error('nope'); });
+            });
+            test('skipped', { skip: true }, () => {});
+            """), encoding="utf-8")
+        subprocess.run(["git", "init", "-q"], cwd=self.repo, check=True)
+
+    def run_tool(self, *args: str) -> dict:
+        env = {k: v for k, v in os.environ.items() if not k.startswith("CODEX_")}
+        res = subprocess.run([sys.executable, str(TOOLS / "test.py"), "--json", *args], cwd=self.repo, env=env, capture_output=True, text=True, timeout=120)
+        return json.loads(res.stdout)
+
+    def test_per_test_results_and_history(self):
+        payload = self.run_tool("--no-typecheck", "--no-cache")
+        self.assertFalse(payload["ok"])
+        by_id = {t["id"]: t for t in payload["tests"]}
+        self.assertEqual(by_id["tests/a.test.mjs::suite > passes"]["status"], "passed")
+        self.assertEqual(by_id["tests/a.test.mjs::suite > fails"]["message"], "nope")
+        self.assertEqual(by_id["tests/a.test.mjs::skipped"]["status"], "skipped")
+        self.assertEqual(payload["test_counts"], {"passed": 1, "failed": 1, "skipped": 1})
+        # Human-readable output is still there
+        self.assertIn("not ok", payload["stdout"])
+        slowest = self.run_tool("--slowest", "5")["slowest"]
+        self.assertEqual({r["id"] for r in slowest}, {"tests/a.test.mjs::suite > passes", "tests/a.test.mjs::suite > fails"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,176 @@
+"""The subprocess runner behind every tool (_utils.run_ex/arun_ex)."""
+import asyncio
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+
+TOOLS = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(TOOLS))
+
+import _utils  # noqa: E402
+from _logs import get_log, iter_jsonl  # noqa: E402
+
+
+def _py(code: str) -> list[str]:
+    return [sys.executable, "-c", code]
+
+
+def _dead(pid: int, wait: float = 2.0) -> bool:
+    """Whether pid is gone or a zombie within wait seconds."""
+    deadline = time.monotonic() + wait
+    while time.monotonic() < deadline:
+        try:
+            with open(f"/proc/{pid}/stat", "rb") as f:
+                state = f.read().rsplit(b")", 1)[1].split()[0]
+        except OSError:
+            return True
+        if state == b"Z":
+            return True
+        time.sleep(0.05)
+    return False
+
+
+class RunTest(unittest.TestCase):
+    def setUp(self):
+        self.logs = Path(tempfile.mkdtemp(prefix="codex-run-"))
+        self.addCleanup(shutil.rmtree, self.logs, True)
+        patcher = mock.patch.dict(os.environ, {"CODEX_LOG_DIR": str(self.logs)})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_run_returns_code_and_output(self):
+        code, out, err = _utils.run(_py("import sys; print('out'); print('err', file=sys.stderr); sys.exit(3)"), cwd=self.logs)
+        self.assertEqual((code, out, err), (3, "out\n", "err\n"))
+
+    def test_missing_executable(self):
+        code, _, err = _utils.run(["codex-no-such-binary"], cwd=self.logs)
+        self.assertEqual(code, 127)
+        self.assertIn("Executable not found", err)
+
+    def test_timeout_kills_and_reports_the_hang(self):
+        started = time.monotonic()
+        res = _utils.run_ex(_py("import time; print('working', flush=True); time.sleep(30)"), cwd=self.logs, timeout_sec=0.5)
+        self.assertLess(time.monotonic() - started, 10)
+        self.assertEqual((res["code"], res["timed_out"]), (124, True))
+        self.assertEqual(res["stdout"], "working\n")
+        hang = json.loads(next(self.logs.glob("hang_*.json")).read_text(encoding="utf-8"))
+        self.assertEqual((hang["type"], hang["stdout_tail"]), ("timeout", "working\n"))
+
+    def test_idle_timeout_is_reset_by_output(self):
+        chatty = "import time\nfor i in range(8):\n    print(i, flush=True)\n    time.sleep(0.2)"
+        self.assertEqual(_utils.run_ex(_py(chatty), cwd=self.logs, idle_timeout_sec=0.6)["code"], 0)
+        res = _utils.run_ex(_py("import time; time.sleep(30)"), cwd=self.logs, idle_timeout_sec=0.5)
+        self.assertEqual((res["code"], res["idle_timed_out"], res["timed_out"]), (124, True, False))
+
+    def test_grandchild_holding_the_pipes_does_not_block(self):
+        code = "import subprocess, sys; subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(5)']); print('parent done')"
+        started = time.monotonic()
+        res = _utils.run_ex(_py(code), cwd=self.logs)
+        self.assertLess(time.monotonic() - started, 4)
+        self.assertEqual((res["code"], res["stdout"]), (0, "parent done\n"))
+
+    def test_run_many_runs_concurrently_in_job_order(self):
+        jobs = [{"cmd": _py(f"import time; time.sleep(0.5); print({i})"), "cwd": self.logs} for i in range(4)]
+        started = time.monotonic()
+        results = _utils.run_many(jobs)
+        self.assertLess(time.monotonic() - started, 1.8)
+        self.assertEqual([r["stdout"] for r in results], ["0\n", "1\n", "2\n", "3\n"])
+        started = time.monotonic()
+        _utils.run_many(jobs[:2], max_parallel=1)
+        self.assertGreaterEqual(time.monotonic() - started, 1.0)
+
+    @unittest.skipUnless(os.path.isdir("/proc"), "needs /proc")
+    def test_cancelling_kills_the_child(self):
+        pids = []
+
+        async def main():
+            task = asyncio.ensure_future(_utils.arun_ex(
+                _py("import time; time.sleep(30)"), cwd=self.logs,
+                on_event=lambda e: e["event"] == "start" and pids.append(e["pid"]),
+            ))
+            await asyncio.sleep(0.3)
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+        asyncio.run(main())
+        self.assertTrue(_dead(pids[0]))
+
+    def test_events_and_tools_log(self):
+        events = list(_utils.iter_run(_py("print('a'); print('b')"), cwd=self.logs))
+        self.assertEqual([e["event"] for e in events], ["start", "line", "line", "end"])
+        self.assertEqual([e["line"] for e in events if e["event"] == "line"], ["a", "b"])
+        self.assertEqual(events[-1]["code"], 0)
+        get_log(self.logs / "tools.log").flush()
+        logged = [r["event"] for r in iter_jsonl(self.logs / "tools.log")]
+        self.assertEqual(logged[-2:], ["proc_start", "proc_end"])
+
+    def test_heartbeats_while_quiet(self):
+        beats = []
+        _utils.run_ex(_py("import time; time.sleep(0.7)"), cwd=self.logs, heartbeat_sec=0.2, on_event=lambda e: e["event"] == "heartbeat" and beats.append(e))
+        self.assertGreaterEqual(len(beats), 2)
+
+    def test_capture_limit_keeps_the_tail_and_spills_the_rest(self):
+        res = _utils.run_ex(_py("for i in range(1000): print(i)"), cwd=self.logs, capture_limit=100)
+        self.assertEqual(res["code"], 0)
+        self.assertTrue(res["stdout_truncated"])
+        self.assertLessEqual(len(res["stdout"]), 100)
+        self.assertTrue(res["stdout"].endswith("998\n999\n"))
+        self.assertEqual(Path(res["stdout_path"]).read_text(encoding="utf-8"), "".join(f"{i}\n" for i in range(1000)))
+        self.assertEqual(res["stdout_chars"], len("".join(f"{i}\n" for i in range(1000))))
+        self.assertIsNone(res["stderr_path"])
+
+    def test_output_under_the_limit_is_not_spilled(self):
+        res = _utils.run_ex(_py("print('hi')"), cwd=self.logs, capture_limit=100)
+        self.assertEqual((res["stdout"], res["stdout_truncated"], res["stdout_path"]), ("hi\n", False, None))
+        self.assertEqual(list(self.logs.glob("run_*.log")), [])
+
+    def test_only_the_newest_spills_are_kept(self):
+        with mock.patch.dict(os.environ, {"CODEX_SPILL_KEEP": "3"}):
+            paths = [_utils.run_ex(_py(f"print('{i}' * 500)"), cwd=self.logs, capture_limit=100)["stdout_path"] for i in range(5)]
+        self.assertEqual(sorted(self.logs.glob("run_*.log")), sorted(Path(p) for p in paths[-3:]))
+        self.assertTrue(Path(paths[-1]).read_text(encoding="utf-8").startswith("4" * 500))
+
+
+class ResourcesTest(unittest.TestCase):
+    def setUp(self):
+        self.logs = Path(tempfile.mkdtemp(prefix="codex-run-"))
+        self.addCleanup(shutil.rmtree, self.logs, True)
+        patcher = mock.patch.dict(os.environ, {"CODEX_LOG_DIR": str(self.logs), "CODEX_PROC_SAMPLE_SEC": "0.05"})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @unittest.skipUnless(os.path.isdir("/proc"), "needs /proc")
+    def test_tree_peaks_include_grandchildren(self):
+        code = "import subprocess, sys; subprocess.run([sys.executable, '-c', 'import time; x = bytearray(64 << 20); time.sleep(0.5)'])"
+        res = _utils.run_ex(_py(code), cwd=self.logs)
+        resources = res["resources"]
+        self.assertEqual(resources["tree_peak_procs"], 2)
+        self.assertGreater(resources["tree_peak_rss_kb"], 64 << 10)
+        self.assertGreater(resources["max_rss_kb"], 0)
+
+    @unittest.skipUnless(os.path.isdir("/proc"), "needs /proc")
+    def test_slow_proc_scans_do_not_hold_up_output(self):
+        real = _utils._scan_proc
+
+        def slow_scan():
+            time.sleep(0.5)
+            return real()
+
+        times = []
+        code = "import time\nfor i in range(20):\n    print(i, flush=True)\n    time.sleep(0.05)"
+        with mock.patch.object(_utils, "_scan_proc", slow_scan):
+            res = _utils.run_ex(_py(code), cwd=self.logs, on_event=lambda e: e["event"] == "line" and times.append(e["t"]))
+        self.assertEqual(res["code"], 0)
+        self.assertEqual(len(times), 20)
+        self.assertLess(max(b - a for a, b in zip(times, times[1:])), 0.3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,149 @@
+"""Task dependencies (task.py depends_on) and the run-phase scheduler (agent.run_phase)."""
+import io
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from contextlib import redirect_stdout
+from pathlib import Path
+from unittest import mock
+
+
+TOOLS = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(TOOLS))
+
+import agent  # noqa: E402
+import task  # noqa: E402
+from _utils import ensure_codex_dir  # noqa: E402
+
+
+class DepsTest(unittest.TestCase):
+    def setUp(self):
+        self.data = {"phases": [], "current_phase": None}
+        self.a = task.add_task(self.data, 0, "a")
+        self.b = task.add_task(self.data, 0, "b", depends_on=[self.a])
+        self.c = task.add_task(self.data, 1, "c", depends_on=[self.b])
+
+    def test_check_deps(self):
+        self.assertIsNone(task.check_deps(self.data, "", [self.a, self.c]))
+        self.assertEqual(task.check_deps(self.data, self.b, ["nope"]), "Unknown task nope")
+        self.assertEqual(task.check_deps(self.data, self.a, [self.c]), f"Dependency cycle through {self.a}")
+        self.assertEqual(task.check_deps(self.data, self.a, [self.a]), f"Dependency cycle through {self.a}")
+
+    def cli(self, root: Path, *argv: str) -> subprocess.CompletedProcess:
+        env = {k: v for k, v in os.environ.items() if not k.startswith("CODEX_")}
+        return subprocess.run([sys.executable, str(TOOLS / "task.py"), *argv], cwd=root, env=env, capture_output=True, text=True, timeout=60)
+
+    def test_cli(self):
+        root = Path(tempfile.mkdtemp(prefix="codex-deps-"))
+        self.addCleanup(shutil.rmtree, root, True)
+        subprocess.run(["git", "init", "-q"], cwd=root, check=True)
+        self.cli(root, "add-phase")
+        self.cli(root, "add-task", "first")
+        first = task.load_tasks(root)["phases"][0]["tasks"][0]["id"]
+        res = self.cli(root, "add-task", "second", "--depends-on", first)
+        self.assertEqual(res.returncode, 0)
+        second = task.load_tasks(root)["phases"][0]["tasks"][1]["id"]
+        self.assertIn(f"(after {first})", self.cli(root, "list").stdout)
+
+        res = self.cli(root, "edit-task", first, "--depends-on", second)
+        self.assertEqual((res.returncode, res.stderr.strip()), (1, f"Dependency cycle through {first}"))
+        self.assertEqual(self.cli(root, "add-task", "third", "--depends-on", "missing").returncode, 1)
+
+        self.cli(root, "remove-task", first)
+        self.assertEqual(task.task_deps(task.load_tasks(root)["phases"][0]["tasks"][0]), [])
+
+
+class RunPhaseTest(unittest.TestCase):
+    def setUp(self):
+        self.root = Path(tempfile.mkdtemp(prefix="codex-sched-"))
+        self.addCleanup(shutil.rmtree, self.root, True)
+        self.data = {"phases": [], "current_phase": None}
+        self.lock = threading.Lock()
+        self.log: list[tuple[str, str, float]] = []
+
+    def add(self, title: str, *deps: str, phase: int = 0) -> str:
+        return task.add_task(self.data, phase, title, depends_on=list(deps))
+
+    def run_phase(self, jobs: int, fail: set[str] = frozenset(), sleep: float = 0.3) -> tuple[int, str]:
+        ensure_codex_dir(self.root)
+        task.save_tasks(self.root, self.data)
+        titles = {t["id"]: t["title"] for ph in self.data["phases"] for t in ph["tasks"]}
+
+        def orchestrate(root, tid, *args, **kw):
+            with self.lock:
+                self.log.append(("start", titles[tid], time.monotonic()))
+            time.sleep(sleep)
+            with self.lock:
+                self.log.append(("end", titles[tid], time.monotonic()))
+            return titles[tid] not in fail
+
+        out = io.StringIO()
+        with mock.patch.object(agent, "orchestrate_task", orchestrate), \
+                mock.patch.object(agent, "_run_in_worktree", lambda root, tid, *a, **kw: orchestrate(root, tid)), \
+                redirect_stdout(out):
+            code = agent.run_phase(self.root, 0, None, None, False, False, 0, None, jobs=jobs)
+        return code, out.getvalue()
+
+    def started(self) -> list[str]:
+        return [title for ev, title, _ in self.log if ev == "start"]
+
+    def at(self, ev: str, title: str) -> float:
+        return next(t for e, name, t in self.log if e == ev and name == title)
+
+    def test_dependencies_run_first_and_independent_tasks_overlap(self):
+        a = self.add("a")
+        self.add("b", a)
+        self.add("c", a)
+        self.add("d")
+        code, _ = self.run_phase(jobs=3)
+        self.assertEqual(code, 0)
+        self.assertEqual(sorted(self.started()), ["a", "b", "c", "d"])
+        for dependent in ("b", "c"):
+            self.assertGreaterEqual(self.at("start", dependent), self.at("end", "a"))
+        self.assertLess(self.at("start", "d"), self.at("end", "a"))
+        self.assertLess(self.at("start", "c"), self.at("end", "b"))
+
+    def test_dependents_of_a_failed_task_are_skipped(self):
+        a = self.add("a")
+        b = self.add("b", a)
+        self.add("c", b)
+        self.add("d")
+        code, out = self.run_phase(jobs=2, fail={"a"})
+        self.assertEqual(code, 2)
+        self.assertEqual(sorted(self.started()), ["a", "d"])
+        self.assertIn(f"Skipping task {b}: depends on {a}", out)
+        self.assertIn("1 task(s) failed, 2 skipped", out)
+
+    def test_sequential_run_stops_at_the_first_failure(self):
+        self.add("a")
+        self.add("b")
+        code, out = self.run_phase(jobs=1, fail={"a"}, sleep=0)
+        self.assertEqual((code, self.started()), (2, ["a"]))
+        self.assertIn("1 task(s) failed, 1 skipped", out)
+
+    def test_pending_task_of_another_phase_blocks(self):
+        later = self.add("later", phase=1)
+        self.add("a", later)
+        self.add("b")
+        code, out = self.run_phase(jobs=2, sleep=0)
+        self.assertEqual((code, self.started()), (2, ["b"]))
+        self.assertIn(f"depends on {later}", out)
+
+    def test_cycle_is_skipped(self):
+        a = self.add("a")
+        b = self.add("b", a)
+        # Written around check_deps, as a hand-edited tasks.json could be
+        self.data["phases"][0]["tasks"][0]["depends_on"] = [b]
+        self.add("c")
+        code, out = self.run_phase(jobs=2, sleep=0)
+        self.assertEqual((code, self.started()), (2, ["c"]))
+        self.assertIn("dependency cycle", out)
+
+
+if __name__ == "__main__":
+    unittest.main()
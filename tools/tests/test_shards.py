@@ -0,0 +1,100 @@
+"""Test shards per npm workspace (_shards.py)."""
+import json
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+
+TOOLS = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(TOOLS))
+
+import _shards  # noqa: E402
+
+
+def _write(path: Path, text: str) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text, encoding="utf-8")
+
+
+class DiscoverShardsTest(unittest.TestCase):
+    def setUp(self):
+        self.root = Path(tempfile.mkdtemp(prefix="codex-shards-"))
+        self.addCleanup(shutil.rmtree, self.root, True)
+        root = self.root
+        _write(root / "package.json", json.dumps({
+            "name": "shards",
+            "workspaces": ["packages/*"],
+            "scripts": {"test": 'node --test "tests/**/*.mjs"', "test:unit": "node --test tests/unit"},
+        }))
+        _write(root / "packages" / "api" / "package.json", json.dumps({"name": "@s/api", "scripts": {"test:unit": "vitest run"}}))
+        _write(root / "packages" / "web" / "package.json", json.dumps({"name": "@s/web", "scripts": {"test": "jest", "test:unit": "jest unit"}}))
+        _write(root / "packages" / "docs" / "package.json", json.dumps({"name": "@s/docs", "scripts": {"build": "vite build"}}))
+        _write(root / "tests" / "smoke.test.mjs", "import test from 'node:test';\n")
+        subprocess.run(["git", "init", "-q"], cwd=root, check=True)
+
+    def shards(self, scripts=None) -> dict[str, dict]:
+        return {s["name"]: s for s in _shards.discover_shards(self.root, scripts)}
+
+    def test_root_and_every_workspace_with_tests(self):
+        shards = self.shards()
+        self.assertEqual(list(shards), ["root", "@s/api", "@s/web"])
+        self.assertEqual((shards["root"]["kind"], shards["root"]["runner"], shards["root"]["covers"]), ("root", "node-test-runner", {}))
+        self.assertEqual((shards["@s/api"]["script"], shards["@s/api"]["runner"], shards["@s/api"]["rel"]), ("test:unit", "vitest", "packages/api"))
+        self.assertEqual((shards["@s/web"]["script"], shards["@s/web"]["command"]), ("test", "jest"))
+
+    def test_script_override(self):
+        shards = self.shards(("test:unit",))
+        self.assertEqual(shards["root"]["command"], "node --test tests/unit")
+        self.assertEqual(shards["@s/web"]["command"], "jest unit")
+
+    def test_workspaces_the_root_suite_runs_get_no_shard(self):
+        _write(self.root / "tests" / "vitest.setup.test.mjs", """\
+import { spawnSync } from 'node:child_process';
+spawnSync('npm', ['run', '-w', '@s/api', '-s', 'test:unit'], { cwd: root });
+spawnSync('npm', ['run', '-w', '@s/web', '-s', 'build'], { cwd: root });
+""")
+        shards = self.shards()
+        self.assertEqual(list(shards), ["root", "@s/web"])
+        self.assertEqual(shards["root"]["covers"], {"@s/api": ["tests/vitest.setup.test.mjs"]})
+
+    def test_runs_workspace_script(self):
+        ws = {"name": "@s/api", "rel": "packages/api"}
+        runs = _shards._runs_workspace_script
+        self.assertTrue(runs("execSync('npm run -w @s/api test:unit')", ws, "test:unit"))
+        self.assertTrue(runs("npm run --workspace=packages/api -s test:unit", ws, "test:unit"))
+        self.assertTrue(runs("spawnSync('npm', ['run', '--workspace', './packages/api', 'test:unit'])", ws, "test:unit"))
+        self.assertFalse(runs("npm run -w @s/api test:unit:watch", ws, "test:unit"))
+        self.assertFalse(runs("npm run -w @s/api-client test:unit", ws, "test:unit"))
+        self.assertFalse(runs("npm run -w @s/web test:unit", ws, "test:unit"))
+
+
+class ShardCmdTest(unittest.TestCase):
+    def setUp(self):
+        self.root = Path(tempfile.mkdtemp(prefix="codex-shards-"))
+        self.addCleanup(shutil.rmtree, self.root, True)
+        _write(self.root / "package.json", "{}")
+
+    def shard(self, runner: str, files=None, names=None) -> dict:
+        base = {"name": "x", "script": "test", "runner": runner, "cwd": self.root}
+        return _shards.narrow(base, files, names)
+
+    def test_whole_shard_runs_its_script(self):
+        self.assertEqual(_shards.shard_cmd(self.root, self.shard("vitest")), ["npm", "run", "test"])
+        self.assertEqual(_shards.shard_cmd(self.root, self.shard("vitest"), ["--reporter=json"]), ["npm", "run", "test", "--", "--reporter=json"])
+
+    def test_node_test_runner_is_called_directly(self):
+        cmd = _shards.shard_cmd(self.root, self.shard("node-test-runner", ["tests/a.test.mjs"], ["suite > case"]))
+        self.assertEqual(cmd, ["node", "--test", "--test-name-pattern=^(?:case|suite)$", "tests/a.test.mjs"])
+
+    def test_vitest_and_mocha_filters(self):
+        cmd = _shards.shard_cmd(self.root, self.shard("vitest", ["src/a.test.ts"], ["suite > a.b"]))
+        self.assertEqual(cmd, ["npm", "run", "test", "--", "src/a.test.ts", "-t", r"^(?:suite\ a\.b)$"])
+        cmd = _shards.shard_cmd(self.root, self.shard("mocha", ["test/a.js"], ["x"]))
+        self.assertEqual(cmd, ["npm", "run", "test", "--", "--grep", "^(?:x)$"])
+
+
+if __name__ == "__main__":
+    unittest.main()
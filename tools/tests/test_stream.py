@@ -0,0 +1,64 @@
+"""--stream NDJSON events from exec.py, git.py and test.py."""
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import textwrap
+import unittest
+from pathlib import Path
+
+
+TOOLS = Path(__file__).resolve().parents[1]
+
+
+def _stream(repo: Path, tool: str, *argv: str) -> tuple[int, list[dict]]:
+    env = {k: v for k, v in os.environ.items() if not k.startswith("CODEX_")}
+    res = subprocess.run([sys.executable, str(TOOLS / tool), *argv], cwd=repo, env=env, capture_output=True, text=True, timeout=120)
+    return res.returncode, [json.loads(line) for line in res.stdout.splitlines()]
+
+
+class StreamTest(unittest.TestCase):
+    def setUp(self):
+        self.repo = Path(tempfile.mkdtemp(prefix="codex-stream-"))
+        self.addCleanup(shutil.rmtree, self.repo, True)
+        (self.repo / ".gitignore").write_text(".codex\n", encoding="utf-8")
+        subprocess.run(["git", "init", "-q"], cwd=self.repo, check=True)
+
+    def test_exec(self):
+        code, events = _stream(self.repo, "exec.py", "--stream", "--heartbeat", "0.2", "--", sys.executable, "-c",
+                               "import sys, time; print('one', flush=True); time.sleep(0.7); print('two', file=sys.stderr); sys.exit(4)")
+        self.assertEqual(code, 4)
+        kinds = [e["event"] for e in events]
+        self.assertEqual((kinds[0], kinds[-1]), ("start", "end"))
+        self.assertIn("heartbeat", kinds)
+        lines = [(e["stream"], e["line"]) for e in events if e["event"] == "line"]
+        self.assertEqual(lines, [("stdout", "one"), ("stderr", "two")])
+        self.assertEqual(events[-1]["code"], 4)
+        self.assertTrue(all(isinstance(e["t"], float) for e in events))
+        self.assertEqual([e["t"] for e in events], sorted(e["t"] for e in events))
+
+    def test_git(self):
+        code, events = _stream(self.repo, "git.py", "--stream", "--", "status", "--porcelain")
+        self.assertEqual(code, 0)
+        self.assertEqual([(e["event"], e.get("line")) for e in events], [("start", None), ("line", "?? .gitignore"), ("end", None)])
+
+    @unittest.skipUnless(shutil.which("node"), "node is required")
+    def test_test_phases_then_summary(self):
+        (self.repo / "package.json").write_text(json.dumps({"name": "s", "type": "module", "scripts": {"test": "node --test tests/"}}), encoding="utf-8")
+        (self.repo / "tests").mkdir()
+        (self.repo / "tests" / "a.test.mjs").write_text(textwrap.dedent("""\
+            import test from 'node:test';
+            test('a', () => {});
+            """), encoding="utf-8")
+        code, events = _stream(self.repo, "test.py", "--stream", "--no-typecheck", "--no-cache")
+        self.assertEqual(code, 0)
+        self.assertEqual(events[-1]["event"], "summary")
+        self.assertEqual((events[-1]["ok"], events[-1]["tests"]["ran"], events[-1]["typecheck"]["ran"]), (True, True, False))
+        self.assertTrue(all(e["phase"] == "test" for e in events[:-1]))
+        self.assertEqual([e["event"] for e in events[:-1] if e["event"] != "line"], ["start", "end"])
+
+
+if __name__ == "__main__":
+    unittest.main()
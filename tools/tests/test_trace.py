@@ -0,0 +1,128 @@
+"""Span tracing and the Chrome trace-event export (_trace.py)."""
+import asyncio
+import contextvars
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import unittest
+from contextlib import redirect_stderr
+from pathlib import Path
+from unittest import mock
+
+
+TOOLS = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(TOOLS))
+
+import _trace  # noqa: E402
+
+
+class SpanTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = Path(tempfile.mkdtemp(prefix="codex-trace-"))
+        self.addCleanup(shutil.rmtree, self.dir, True)
+        self.tracer = _trace._Tracer(self.dir)
+        for name, value in (("_tracer", self.tracer), ("_env_checked", True)):
+            patcher = mock.patch.object(_trace, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def spans(self) -> dict[str, dict]:
+        return {e["name"]: e for e in self.tracer.events if e["ph"] == "X"}
+
+    def test_nested_spans_share_a_track(self):
+        with _trace.span("outer", task="t1") as attrs:
+            with _trace.span("inner", cat="tool"):
+                pass
+            attrs["ok"] = True
+        spans = self.spans()
+        self.assertEqual(spans["outer"]["tid"], spans["inner"]["tid"])
+        self.assertEqual(spans["outer"]["args"], {"task": "t1", "ok": True})
+        self.assertEqual(spans["inner"]["cat"], "tool")
+        self.assertLessEqual(spans["outer"]["ts"], spans["inner"]["ts"])
+        self.assertGreaterEqual(spans["outer"]["ts"] + spans["outer"]["dur"], spans["inner"]["ts"] + spans["inner"]["dur"])
+
+    def test_overlapping_siblings_get_tracks_of_their_own(self):
+        both = threading.Barrier(2)
+
+        def work(name: str) -> None:
+            with _trace.span(name):
+                both.wait(5)
+
+        with _trace.span("phase"):
+            threads = [threading.Thread(target=contextvars.copy_context().run, args=(work, f"task{i}")) for i in range(2)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        spans = self.spans()
+        self.assertNotEqual(spans["task0"]["tid"], spans["task1"]["tid"])
+        # The first one to start stays on the phase's track
+        second = [n for n in ("task0", "task1") if spans[n]["tid"] != spans["phase"]["tid"]]
+        self.assertEqual(len(second), 1)
+        names = {e["tid"]: e["args"]["name"] for e in self.tracer.events if e["name"] == "thread_name"}
+        self.assertEqual(names[spans[second[0]]["tid"]], second[0])
+
+    def test_asyncio_tasks_nest_under_their_parent(self):
+        async def child():
+            with _trace.span("child"):
+                await asyncio.sleep(0)
+
+        async def main():
+            with _trace.span("parent"):
+                await asyncio.create_task(child())
+
+        asyncio.run(main())
+        spans = self.spans()
+        self.assertEqual(spans["parent"]["tid"], spans["child"]["tid"])
+
+    def test_errors_and_attribute_values(self):
+        with self.assertRaises(ValueError):
+            with _trace.span("failing", path=Path("/x"), n=None):
+                raise ValueError("boom")
+        self.assertEqual(self.spans()["failing"]["args"], {"path": "/x", "n": None, "error": "ValueError('boom')"})
+
+    def test_traced(self):
+        @_trace.traced(args=("a",))
+        def add(a, b=2):
+            return a + b
+
+        self.assertEqual(add(1), 3)
+        self.assertEqual(self.spans()["add"]["args"], {"a": 1, "result": 3})
+
+    def test_write(self):
+        with _trace.span("one"):
+            pass
+        with redirect_stderr(io.StringIO()):
+            path = _trace.write()
+            self.assertIsNone(_trace.write())
+        data = json.loads(path.read_text(encoding="utf-8"))
+        self.assertEqual(path.parent, self.dir)
+        self.assertEqual(data["traceEvents"][0]["name"], "process_name")
+        self.assertIn("one", [e["name"] for e in data["traceEvents"]])
+
+    def test_disabled_records_nothing(self):
+        with mock.patch.object(_trace, "_tracer", None):
+            with _trace.span("nothing") as attrs:
+                attrs["x"] = 1
+            self.assertFalse(_trace.enabled())
+        self.assertEqual(self.tracer.events, [])
+
+
+class EnvTest(unittest.TestCase):
+    def test_codex_trace_writes_at_exit(self):
+        out = Path(tempfile.mkdtemp(prefix="codex-trace-"))
+        self.addCleanup(shutil.rmtree, out, True)
+        script = f"import sys; sys.path.insert(0, {str(TOOLS)!r})\nimport _trace\nwith _trace.span('work'): pass\n"
+        env = {k: v for k, v in os.environ.items() if not k.startswith("CODEX_")}
+        for extra, count in (({}, 0), ({"CODEX_TRACE": "1", "CODEX_TRACE_DIR": str(out)}, 1)):
+            subprocess.run([sys.executable, "-c", script], env={**env, **extra}, check=True, capture_output=True, timeout=60)
+            self.assertEqual(len(list(out.glob("trace_*.json"))), count)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,112 @@
+"""Incremental per-package typechecking (_typecheck.py)."""
+import asyncio
+import json
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+
+TOOLS = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(TOOLS))
+
+import _typecheck  # noqa: E402
+
+
+def _write(path: Path, text: str) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text, encoding="utf-8")
+
+
+class TsconfigTest(unittest.TestCase):
+    def test_strip_jsonc(self):
+        text = '{\n  // comment\n  "a": "http://x/*y*/", /* block */\n  "b": [1, 2,],\n}\n'
+        self.assertEqual(json.loads(_typecheck._strip_jsonc(text)), {"a": "http://x/*y*/", "b": [1, 2]})
+
+    def test_extends_and_paths(self):
+        root = Path(tempfile.mkdtemp(prefix="codex-tsc-"))
+        self.addCleanup(shutil.rmtree, root, True)
+        _write(root / "tsconfig.base.json", '{"compilerOptions": {"strict": true, "target": "es2020"}, "exclude": ["dist"]}')
+        _write(root / "pkg" / "tsconfig.json", '{"extends": "../tsconfig.base", "compilerOptions": {"target": "es2022"}, "include": ["src"], "references": [{"path": "../other"}]}')
+        cfg = _typecheck.read_tsconfig(root / "pkg" / "tsconfig.json", root)
+        self.assertEqual(cfg["compilerOptions"], {"strict": True, "target": "es2022"})
+        self.assertEqual((cfg["include"], cfg["exclude"]), (["pkg/src"], ["dist"]))
+        self.assertEqual(cfg["references"], [root / "pkg" / ".." / "other"])
+        covers = _typecheck._covers(cfg, root)
+        self.assertTrue(covers("pkg/src/deep/a.ts"))
+        self.assertFalse(covers("pkg/test/a.ts"))
+
+
+class PlanTest(unittest.TestCase):
+    def setUp(self):
+        self.root = Path(tempfile.mkdtemp(prefix="codex-tsc-"))
+        self.addCleanup(shutil.rmtree, self.root, True)
+        root = self.root
+        _write(root / ".gitignore", ".codex\n")
+        self.manifest("tsc -p tsconfig.json --noEmit --pretty false")
+        _write(root / "tsconfig.json", '{"compilerOptions": {"strict": true}, "include": ["packages", "scripts"]}')
+        _write(root / "scripts" / "build.ts", "export {};\n")
+        for name, extra in (("core", {}), ("api", {"dependencies": {"@m/core": "*"}}), ("web", {})):
+            _write(root / "packages" / name / "package.json", json.dumps({"name": f"@m/{name}", **extra}))
+            _write(root / "packages" / name / "src" / "index.ts", "export {};\n")
+        _write(root / "packages" / "core" / "tsconfig.json", '{"extends": "../../tsconfig.json", "include": ["src"], "compilerOptions": {"composite": true}}')
+        _write(root / "packages" / "api" / "tsconfig.json", '{"include": ["src"]}')
+        _write(root / "packages" / "web" / "tsconfig.json", '{"include": ["src"], "references": [{"path": "../api"}]}')
+        subprocess.run(["git", "init", "-q"], cwd=root, check=True)
+
+    def manifest(self, typecheck: str) -> None:
+        _write(self.root / "package.json", json.dumps({"name": "m", "workspaces": ["packages/*"], "scripts": {"typecheck": typecheck}}))
+
+    def test_units_in_dependency_levels(self):
+        units = _typecheck.plan(self.root)
+        self.assertEqual([(u["name"], u["level"], u["deps"]) for u in units], [
+            ("@m/core", 0, []),
+            ("@m/api", 1, ["@m/core"]),
+            ("@m/web", 2, ["@m/api"]),
+            ("root", 3, ["@m/api", "@m/core", "@m/web"]),
+        ])
+        core = units[0]
+        self.assertEqual(core["buildinfo"], _typecheck.cache_dir(self.root) / "m_core.tsbuildinfo")
+        self.assertEqual(core["cmd"][-10:], [
+            "-p", str(self.root / "packages" / "core" / "tsconfig.json"), "--noEmit", "--incremental",
+            "--tsBuildInfoFile", str(core["buildinfo"]), "--composite", "false", "--pretty", "false",
+        ])
+        # The script's own flags carry over, its -p and --noEmit don't repeat
+        self.assertEqual(units[1]["cmd"][-2:], ["--pretty", "false"])
+        self.assertEqual(units[1]["cmd"].count("--noEmit"), 1)
+
+    def test_root_unit_checks_only_what_no_package_covers(self):
+        generated = json.loads(Path(_typecheck.plan(self.root)[-1]["tsconfig"]).read_text(encoding="utf-8"))
+        self.assertEqual(generated["files"], [str((self.root / "scripts" / "build.ts").resolve())])
+        (self.root / "scripts" / "build.ts").unlink()
+        self.assertEqual([u["name"] for u in _typecheck.plan(self.root)], ["@m/core", "@m/api", "@m/web"])
+
+    def test_scripts_that_are_more_than_tsc(self):
+        self.manifest("tsc -p tsconfig.json && eslint .")
+        self.assertIsNone(_typecheck.plan(self.root))
+        self.manifest("vue-tsc --noEmit")
+        self.assertIsNone(_typecheck.plan(self.root))
+
+
+class ArunTest(unittest.TestCase):
+    @staticmethod
+    def unit(name: str, level: int, code: int) -> dict:
+        cmd = [sys.executable, "-c", f"import sys, time; time.sleep(0.6); print({name!r}); sys.exit({code})"]
+        return {"name": name, "level": level, "cmd": cmd, "cwd": Path.cwd()}
+
+    def test_levels_run_in_order_and_fail_fast_stops(self):
+        units = [self.unit("a", 0, 0), self.unit("b", 0, 2), self.unit("c", 1, 0)]
+        res = asyncio.run(_typecheck.arun(units, {}))
+        self.assertEqual(res["code"], 2)
+        self.assertEqual([(u["name"], u["code"]) for u in res["units"]], [("a", 0), ("b", 2), ("c", 0)])
+        # One level runs its units side by side
+        self.assertLess(res["duration_sec"], 1.6)
+        self.assertEqual(res["stdout"], "==> a (exit 0) <==\na\n==> b (exit 2) <==\nb\n==> c (exit 0) <==\nc\n")
+        res = asyncio.run(_typecheck.arun(units, {}, fail_fast=True))
+        self.assertEqual([u["code"] for u in res["units"]], [0, 2, None])
+
+
+if __name__ == "__main__":
+    unittest.main()
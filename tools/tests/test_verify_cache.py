@@ -0,0 +1,114 @@
+"""The tree-hash keyed verification ledger (_verify_cache.py) and test.py's use of it."""
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import textwrap
+import unittest
+from pathlib import Path
+from unittest import mock
+
+
+TOOLS = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(TOOLS))
+
+import _verify_cache  # noqa: E402
+
+
+def _git(cwd: Path, *args: str) -> None:
+    subprocess.run(["git", "-c", "user.name=test", "-c", "user.email=test@localhost", *args], cwd=cwd, check=True, capture_output=True)
+
+
+class LedgerTest(unittest.TestCase):
+    def setUp(self):
+        self.root = Path(tempfile.mkdtemp(prefix="codex-verify-"))
+        self.addCleanup(shutil.rmtree, self.root, True)
+        (self.root / ".gitignore").write_text(".codex\n", encoding="utf-8")
+        (self.root / "a.txt").write_text("a\n", encoding="utf-8")
+        _git(self.root, "init", "-q")
+        _git(self.root, "add", "-A")
+        _git(self.root, "commit", "-qm", "init")
+
+    def test_key_follows_tree_and_command(self):
+        key, tree = _verify_cache.cache_key(self.root, {"tool": "test.py"})
+        self.assertEqual(_verify_cache.cache_key(self.root, {"tool": "test.py"}), (key, tree))
+        self.assertNotEqual(_verify_cache.cache_key(self.root, {"tool": "test.py", "pattern": "x"})[0], key)
+        (self.root / "new.txt").write_text("untracked counts too\n", encoding="utf-8")
+        changed = _verify_cache.cache_key(self.root, {"tool": "test.py"})
+        self.assertNotEqual(changed[1], tree)
+        (self.root / "new.txt").unlink()
+        self.assertEqual(_verify_cache.cache_key(self.root, {"tool": "test.py"}), (key, tree))
+
+    def test_record_and_lookup(self):
+        key, tree = _verify_cache.cache_key(self.root, {"tool": "test.py"})
+        self.assertIsNone(_verify_cache.lookup(self.root, key))
+        payload = {"ok": True, "code": 0, "stdout": "x" * 10000, "typecheck": {"code": 0, "stderr": "y" * 10000}, "cache": {"hit": False}}
+        _verify_cache.record(self.root, key, tree, payload)
+        hit = _verify_cache.lookup(self.root, key)
+        self.assertEqual((hit["ok"], hit["code"]), (True, 0))
+        self.assertEqual((hit["cache"]["hit"], hit["cache"]["tree"]), (True, tree))
+        self.assertEqual(len(hit["stdout"]), _verify_cache.TAIL_CHARS)
+        self.assertEqual(len(hit["typecheck"]["stderr"]), _verify_cache.TAIL_CHARS)
+
+    def test_timeouts_and_missing_tools_are_not_recorded(self):
+        for code in _verify_cache.UNCACHEABLE_CODES:
+            _verify_cache.record(self.root, f"k{code}", "t", {"ok": False, "code": code})
+            self.assertIsNone(_verify_cache.lookup(self.root, f"k{code}"))
+
+    def test_bounded(self):
+        with mock.patch.object(_verify_cache, "MAX_ENTRIES", 3):
+            for i in range(5):
+                _verify_cache.record(self.root, f"k{i}", "t", {"ok": True, "code": 0})
+        self.assertIsNone(_verify_cache.lookup(self.root, "k1"))
+        self.assertIsNotNone(_verify_cache.lookup(self.root, "k2"))
+        self.assertIsNotNone(_verify_cache.lookup(self.root, "k4"))
+
+
+@unittest.skipUnless(shutil.which("node"), "node is required")
+class TestPyCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.repo = Path(tempfile.mkdtemp(prefix="codex-verify-"))
+        self.addCleanup(shutil.rmtree, self.repo, True)
+        self.runs = Path(tempfile.mkdtemp(prefix="codex-verify-runs-")) / "runs.txt"
+        self.addCleanup(shutil.rmtree, self.runs.parent, True)
+        (self.repo / "package.json").write_text(json.dumps({"name": "v", "type": "module", "scripts": {"test": "node --test tests/"}}), encoding="utf-8")
+        (self.repo / ".gitignore").write_text(".codex\n", encoding="utf-8")
+        (self.repo / "tests").mkdir()
+        (self.repo / "tests" / "a.test.mjs").write_text(textwrap.dedent(f"""\
+            import test from 'node:test';
+            import fs from 'node:fs';
+            test('a', () => fs.appendFileSync({json.dumps(str(self.runs))}, 'run\\n'));
+            """), encoding="utf-8")
+        _git(self.repo, "init", "-q")
+        _git(self.repo, "add", "-A")
+        _git(self.repo, "commit", "-qm", "init")
+
+    def run_tests(self, *args: str) -> dict:
+        env = {k: v for k, v in os.environ.items() if not k.startswith("CODEX_")}
+        res = subprocess.run([sys.executable, str(TOOLS / "test.py"), "--json", "--no-typecheck", *args], cwd=self.repo, env=env, capture_output=True, text=True, timeout=120)
+        return json.loads(res.stdout)
+
+    def executions(self) -> int:
+        return len(self.runs.read_text(encoding="utf-8").splitlines()) if self.runs.exists() else 0
+
+    def test_unchanged_tree_skips_the_run(self):
+        first = self.run_tests()
+        self.assertTrue(first["ok"])
+        self.assertFalse((first.get("cache") or {}).get("hit"))
+        second = self.run_tests()
+        self.assertTrue(second["cache"]["hit"])
+        self.assertTrue(second["ok"])
+        self.assertEqual(self.executions(), 1)
+
+        (self.repo / "notes.md").write_text("changed\n", encoding="utf-8")
+        self.assertFalse((self.run_tests().get("cache") or {}).get("hit"))
+        self.assertEqual(self.executions(), 2)
+
+        self.run_tests("--no-cache")
+        self.assertEqual(self.executions(), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,136 @@
+"""File watching (_watch.py) and the test.py --watch engine."""
+import asyncio
+import json
+import os
+import queue
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import textwrap
+import threading
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+
+TOOLS = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(TOOLS))
+
+import _watch  # noqa: E402
+
+
+def _write(path: Path, text: str) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text, encoding="utf-8")
+
+
+class WatcherTest(unittest.TestCase):
+    def setUp(self):
+        self.root = Path(tempfile.mkdtemp(prefix="codex-watch-"))
+        self.addCleanup(shutil.rmtree, self.root, True)
+        _write(self.root / ".gitignore", "build/\n*.log\n")
+        _write(self.root / "src" / "a.ts", "a\n")
+        _write(self.root / "src" / "deep" / "b.ts", "b\n")
+        _write(self.root / "build" / "out.js", "x\n")
+        _write(self.root / "node_modules" / "dep" / "index.js", "x\n")
+        subprocess.run(["git", "init", "-q"], cwd=self.root, check=True)
+
+    def test_watched_dirs_skip_ignored_trees(self):
+        self.assertEqual(_watch.watched_dirs(self.root), {"", "src", "src/deep"})
+
+    def test_drop_ignored(self):
+        self.assertEqual(_watch.drop_ignored(self.root, {"src/a.ts", "debug.log", _watch.OVERFLOW}), {"src/a.ts", _watch.OVERFLOW})
+
+    def changes(self, watcher, want: int = 1) -> set[str]:
+        found: set[str] = set()
+        deadline = time.monotonic() + 5
+        while len(found) < want and time.monotonic() < deadline:
+            found |= watcher.changes()
+            time.sleep(0.05)
+        return found
+
+    def check(self, watcher) -> None:
+        self.addCleanup(watcher.close)
+        self.assertEqual(watcher.changes(), set())
+        _write(self.root / "src" / "a.ts", "changed, and longer\n")
+        self.assertEqual(self.changes(watcher), {"src/a.ts"})
+        (self.root / "src" / "deep" / "b.ts").unlink()
+        self.assertEqual(self.changes(watcher), {"src/deep/b.ts"})
+        # Files in a directory created after the watch started are seen too
+        _write(self.root / "src" / "new" / "c.ts", "c\n")
+        self.assertIn("src/new/c.ts", self.changes(watcher))
+        _write(self.root / "src" / "new" / "c.ts", "c, changed\n")
+        self.assertIn("src/new/c.ts", self.changes(watcher))
+
+    def test_inotify(self):
+        watcher = _watch.open_watcher(self.root)
+        if not isinstance(watcher, _watch.InotifyWatcher):
+            watcher.close()
+            self.skipTest("inotify is not available")
+        self.check(watcher)
+
+    def test_polling(self):
+        with mock.patch.dict(os.environ, {"CODEX_WATCH_POLL": "1"}):
+            watcher = _watch.open_watcher(self.root)
+        self.assertIsInstance(watcher, _watch.PollingWatcher)
+        self.assertIsNone(watcher.fileno())
+        self.check(watcher)
+
+    def test_batches_are_debounced_and_drop_ignored_paths(self):
+        async def main() -> set[str]:
+            watcher = await asyncio.to_thread(_watch.PollingWatcher, self.root, 0.05)
+            changes = _watch.batches(self.root, watcher, debounce_sec=0.3)
+            try:
+                nxt = asyncio.ensure_future(anext(changes))
+                for name in ("a.ts", "x.ts", "debug.log"):
+                    await asyncio.sleep(0.1)
+                    await asyncio.to_thread(_write, self.root / "src" / name, "new contents\n")
+                return await asyncio.wait_for(nxt, 10)
+            finally:
+                await changes.aclose()
+                watcher.close()
+
+        self.assertEqual(asyncio.run(main()), {"src/a.ts", "src/x.ts"})
+
+
+@unittest.skipUnless(shutil.which("node"), "node is required")
+class TestPyWatchTest(unittest.TestCase):
+    def setUp(self):
+        self.repo = Path(tempfile.mkdtemp(prefix="codex-watch-"))
+        self.addCleanup(shutil.rmtree, self.repo, True)
+        _write(self.repo / "package.json", json.dumps({"name": "w", "type": "module", "scripts": {"test": "node --test tests/"}}))
+        _write(self.repo / ".gitignore", ".codex\n")
+        for name in ("a", "b"):
+            _write(self.repo / "tests" / f"{name}.test.mjs", textwrap.dedent(f"""\
+                import test from 'node:test';
+                test('{name}', () => {{}});
+                """))
+        subprocess.run(["git", "init", "-q"], cwd=self.repo, check=True)
+        subprocess.run(["git", "-c", "user.name=t", "-c", "user.email=t@localhost", "commit", "-qm", "init", "--allow-empty"], cwd=self.repo, check=True)
+
+    def test_reruns_what_changed(self):
+        env = {k: v for k, v in os.environ.items() if not k.startswith("CODEX_")}
+        proc = subprocess.Popen([sys.executable, str(TOOLS / "test.py"), "--watch", "--json", "--no-typecheck"],
+                                cwd=self.repo, env=env, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+        self.addCleanup(proc.wait, 30)
+        self.addCleanup(proc.send_signal, signal.SIGINT)
+        lines: queue.Queue = queue.Queue()
+        threading.Thread(target=lambda: [lines.put(line) for line in proc.stdout], daemon=True).start()
+
+        first = json.loads(lines.get(timeout=60))
+        self.assertTrue(first["ok"])
+        self.assertIsNone(first["affected"])
+        self.assertEqual(first["test_counts"]["passed"], 2)
+
+        _write(self.repo / "tests" / "b.test.mjs", "import test from 'node:test';\ntest('b', () => { throw new Error('no'); });\n")
+        second = json.loads(lines.get(timeout=60))
+        self.assertFalse(second["ok"])
+        self.assertEqual(second["affected"]["changed"], ["tests/b.test.mjs"])
+        self.assertEqual([t["id"] for t in second["tests"]], ["tests/b.test.mjs::b"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,116 @@
+"""The worktree pool (_worktrees.py): slot reuse, the per-slot node_modules and snapshots."""
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+
+TOOLS = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(TOOLS))
+
+import _worktrees  # noqa: E402
+from _utils import working_tree_hash  # noqa: E402
+
+
+def _git(cwd: Path, *args: str) -> str:
+    res = subprocess.run(["git", "-c", "user.name=test", "-c", "user.email=test@localhost", *args], cwd=cwd, check=True, capture_output=True, text=True)
+    return res.stdout
+
+
+class PoolTest(unittest.TestCase):
+    def setUp(self):
+        self.root = Path(tempfile.mkdtemp(prefix="codex-worktrees-"))
+        self.addCleanup(shutil.rmtree, self.root, True)
+        root = self.root
+        (root / "package.json").write_text(json.dumps({"name": "pool", "private": True, "workspaces": ["packages/*"]}), encoding="utf-8")
+        (root / ".gitignore").write_text("node_modules\n.codex\n", encoding="utf-8")
+        (root / "packages" / "lib" / "src").mkdir(parents=True)
+        (root / "packages" / "lib" / "package.json").write_text(json.dumps({"name": "@pool/lib", "type": "module"}), encoding="utf-8")
+        (root / "packages" / "lib" / "src" / "index.mjs").write_text("export const lib = 1;\n", encoding="utf-8")
+        _git(root, "init", "-q")
+        _git(root, "add", "-A")
+        _git(root, "commit", "-qm", "init")
+
+    def lease(self, name: str) -> _worktrees.Lease:
+        lease = _worktrees.acquire(self.root, name)
+        self.assertIsNotNone(lease)
+        self.addCleanup(lease.release, False)
+        return lease
+
+    def test_failed_tasks_slot_survives_other_tasks(self):
+        failed = self.lease("failed")
+        (failed.tree / "src").mkdir()
+        (failed.tree / "src" / "feature_0.mjs").write_text("export const x = 1;\n", encoding="utf-8")
+        failed.release(delete_branch=False)
+
+        other = self.lease("other")
+        self.assertNotEqual(other.tree, failed.tree)
+        self.assertTrue((failed.tree / "src" / "feature_0.mjs").exists())
+        other.release(delete_branch=True)
+
+        again = self.lease("failed")
+        self.assertEqual(again.tree, failed.tree)
+        self.assertTrue(again.resumed)
+        self.assertTrue((again.tree / "src" / "feature_0.mjs").exists())
+
+    def test_committed_work_is_kept_too(self):
+        failed = self.lease("failed")
+        (failed.tree / "feature.mjs").write_text("export const x = 1;\n", encoding="utf-8")
+        _git(failed.tree, "add", "-A")
+        _git(failed.tree, "commit", "-qm", "feature")
+        failed.release(delete_branch=False)
+        self.assertNotEqual(self.lease("other").tree, failed.tree)
+
+    def test_finished_slots_are_reused(self):
+        first = self.lease("first")
+        first.release(delete_branch=True)
+        clean = self.lease("clean")
+        clean.release(delete_branch=False)
+        # Left on its branch, but with nothing on it
+        self.assertEqual(self.lease("next").tree, first.tree)
+
+    def test_node_modules_link_packages_but_not_workspaces_or_caches(self):
+        nm = self.root / "node_modules"
+        (nm / "left-pad").mkdir(parents=True)
+        (nm / "left-pad" / "index.js").write_text("module.exports = 1;\n", encoding="utf-8")
+        (nm / ".vite" / "vitest").mkdir(parents=True)
+        (nm / "@pool").mkdir()
+        (nm / "@pool" / "lib").symlink_to("../../packages/lib", target_is_directory=True)
+
+        tree = self.lease("task").tree
+        mirrored = tree / "node_modules"
+        self.assertTrue(mirrored.is_dir() and not mirrored.is_symlink())
+        self.assertEqual((mirrored / "left-pad").resolve(), (nm / "left-pad").resolve())
+        self.assertFalse(os.path.lexists(mirrored / ".vite"))
+        self.assertEqual((mirrored / "@pool" / "lib").resolve(), (tree / "packages" / "lib").resolve())
+
+    def test_snapshot_holds_the_tree_as_it_was(self):
+        root = self.root
+        (root / ".codex").mkdir()
+        (root / ".codex" / "last_failed.json").write_text("{}", encoding="utf-8")
+        (root / "packages" / "lib" / "src" / "index.mjs").write_text("export const lib = 2;\n", encoding="utf-8")
+        (root / "packages" / "lib" / "src" / "new.test.mjs").write_text("// new\n", encoding="utf-8")
+        tree_id = working_tree_hash(root)
+        with _worktrees.snapshot(root, tree_id) as snap:
+            self.assertIsNotNone(snap)
+            # The subagent keeps editing while the check runs
+            (root / "packages" / "lib" / "src" / "index.mjs").write_text("export const lib = 3;\n", encoding="utf-8")
+            self.assertEqual((snap / "packages" / "lib" / "src" / "index.mjs").read_text(encoding="utf-8"), "export const lib = 2;\n")
+            self.assertEqual(set(_git(snap, "diff", "HEAD", "--name-only").split()), {"packages/lib/src/index.mjs", "packages/lib/src/new.test.mjs"})
+            self.assertFalse((snap / ".codex" / "last_failed.json").exists())
+            (snap / "packages" / "lib" / "src" / "stray.mjs").write_text("", encoding="utf-8")
+            with _worktrees.snapshot(root, tree_id) as busy:
+                self.assertIsNone(busy)
+
+        (root / "packages" / "lib" / "src" / "new.test.mjs").unlink()
+        with _worktrees.snapshot(root, working_tree_hash(root)) as again:
+            self.assertEqual(again, snap)
+            self.assertEqual(_git(again, "status", "--porcelain", "--untracked-files=all", "--", "packages"), "M  packages/lib/src/index.mjs\n")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -22,7 +22,7 @@ def main(argv=None) -> int:
     if args.dry_run:
         print("Would run: git restore --staged . && git checkout -- .")
         if args.include_untracked:
-            print("Would run: git clean -fd")
+            print("Would run: git clean -fd -e /.codex/")
         return 0
 
     code1, out1, err1 = run(["git", "restore", "--staged", "."], cwd=root)
@@ -31,7 +31,8 @@ def main(argv=None) -> int:
     err = (err1 or "") + (err2 or "")
     rc = max(code1, code2)
     if args.include_untracked:
-        code3, out3, err3 = run(["git", "clean", "-fd"], cwd=root)
+        # .codex holds the task list, caches and the task worktrees, not work to undo
+        code3, out3, err3 = run(["git", "clean", "-fd", "-e", "/.codex/"], cwd=root)
         out += out3 or ""
         err += err3 or ""
         rc = max(rc, code3)